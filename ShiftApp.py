@@ -1,78 +1,28 @@
 import sys
 import os
-import csv
-from datetime import datetime, timedelta
-from PyQt5.QtWidgets import QAction, QApplication, QMainWindow, QFileDialog, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget, QInputDialog, QMessageBox, QDialog, QFormLayout, QLineEdit, QDialogButtonBox, QCheckBox, QPushButton
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtWidgets import QProgressDialog
-from PyQt5.QtCore import QUrl, Qt
+import threading
+from PyQt5.QtWidgets import QAction, QApplication, QMainWindow, QFileDialog, QHeaderView, QTableView, QVBoxLayout, QWidget, QInputDialog, QMessageBox, QDialog, QFormLayout, QLineEdit, QDialogButtonBox, QCheckBox, QPushButton, QProgressDialog, QPlainTextEdit
+from PyQt5.QtCore import QAbstractTableModel, QCoreApplication, QModelIndex, QObject, QRunnable, QThreadPool, QUrl, Qt, pyqtSignal
 from PyQt5.QtGui import QIcon
-import folium
-
-
-def get_exif(filename):
-    from PIL import Image
-    from PIL.ExifTags import TAGS, GPSTAGS
-    image = Image.open(filename)
-    exif_data = {}
-    if hasattr(image, '_getexif'):
-        exif = image._getexif()
-        if exif is not None:
-            for tag_id, value in exif.items():
-                tag = TAGS.get(tag_id, tag_id)
-                if tag == "GPSInfo":
-                    gps_data = {}
-                    for gps_tag in value:
-                        sub_tag = GPSTAGS.get(gps_tag, gps_tag)
-                        gps_data[sub_tag] = value[gps_tag]
-                    exif_data[tag] = gps_data
-                else:
-                    exif_data[tag] = value
-    return exif_data, image.filename
-
-def analyze_images(folder_path, min_time_diff):
-    image_data = []
-    for root, dirs, files in os.walk(folder_path):
-        for filename in files:
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                full_path = os.path.join(root, filename)
-                try:
-                    exif_data, full_filename = get_exif(full_path)
-                    date, time = exif_data.get('DateTimeOriginal', ' ').split()
-                    gps_info = exif_data.get('GPSInfo', {})
-                    latitude = gps_info.get('GPSLatitude', (0, 0, 0))
-                    longitude = gps_info.get('GPSLongitude', (0, 0, 0))
-                    altitude = gps_info.get('GPSAltitude', 0)
-                    image_data.append([full_filename, latitude, longitude, altitude, date, time])
-                except Exception as e:
-                    print(f"Error processing {full_path}: {e}")
 
-    image_data.sort(key=lambda x: datetime.strptime(x[4] + ' ' + x[5], '%Y:%m:%d %H:%M:%S'))
-    sets = []
-    current_set = []
-    last_time = None
-
-    for data in image_data:
-        current_time = datetime.strptime(data[4] + ' ' + data[5], '%Y:%m:%d %H:%M:%S')
-        if last_time is None or (current_time - last_time) <= timedelta(minutes=min_time_diff):
-            current_set.append(data)
-        else:
-            sets.append(current_set)
-            current_set = [data]
-        last_time = current_time
-    if current_set:
-        sets.append(current_set)
+from shiftcore.cache import MetadataCache
+from shiftcore.exif_writer import write_geotags_exif
+from shiftcore.instrument import measure, new_profile_path, setup_logging
+from shiftcore.interpolation import describe_flags
+from shiftcore.mapview import render_map
+from shiftcore.pipeline import MissionOptions, TimeMismatch, export_geotag_file, export_set_file, geotag_columns, image_windows, load_corrections, load_images, match_corrections, set_positions
+from shiftcore.ppk import load_ppk
+from shiftcore.progress import Cancelled, Throttle
+from shiftcore.project import Project, process_project
+from shiftcore.sets import ImageTable, SetTable
+from shiftcore.timestamps import format_timestamp
+
+# Save dialog filters of the export formats; the selected one supplies a missing extension
+EXPORT_FILTERS = (
+    "CSV Files (*.csv);;NumPy Archives (*.npz);;Parquet Files (*.parquet);;Feather Files (*.feather);;"
+    "GeoJSON Files (*.geojson);;GeoPackages (*.gpkg)"
+)
 
-    return sets
-
-def dms_to_decimal(d, m, s):
-    """Convert degrees, minutes, seconds to decimal."""
-    return d + m / 60.0 + s / 3600.0
-
-def format_coords(coord_tuple):
-    """Format coordinates from tuple to string with degrees, minutes, and seconds."""
-    degrees, minutes, seconds = coord_tuple
-    return f"{degrees:.0f}° {minutes:.0f}' {seconds:.2f}\""
 
 class CorrectionDialog(QDialog):
     def __init__(self, current_lat=0.0, current_lon=0.0, current_alt=0.0, parent=None):
@@ -118,14 +68,222 @@ class ExportSelectionDialog(QDialog):
     def get_selected_indices(self):
         return [i for i, chk in enumerate(self.checkbox_list) if chk.isChecked()]
 
+class SetTableModel(QAbstractTableModel):
+    """Read-only view of a SetTable; cells are formatted from its arrays only when painted."""
+    HEADERS = [
+        'Set', 'Start Time', 'End Time', 'Number of Images', 'Delta Latitude', 'Delta Longitude', 'Delta Altitude',
+        'Duration', 'Extent (m)', 'Mean Altitude', 'PPK Coverage', 'PPK Flagged',
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.table = None
+
+    def set_table(self, table):
+        self.beginResetModel()
+        self.table = table
+        self.endResetModel()
+
+    def shifts_changed(self, first=0, last=None):
+        """Repaint the delta columns of rows first..last after the SetTable's shifts changed."""
+        if self.table is not None and len(self.table):
+            last = len(self.table) - 1 if last is None else last
+            self.dataChanged.emit(self.index(first, 4), self.index(last, 6))
+
+    def coverage_changed(self):
+        """Repaint the PPK coverage and flagged columns after SetTable.set_coverage."""
+        if self.table is not None and len(self.table):
+            self.dataChanged.emit(self.index(0, 10), self.index(len(self.table) - 1, 11))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.table is None else len(self.table)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return self.HEADERS[section] if orientation == Qt.Horizontal else str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.UserRole):
+            return None
+        row, column = index.row(), index.column()
+        table = self.table
+        if column == 0:
+            value = row + 1
+        elif column == 1:
+            value = float(table.start[row])
+        elif column == 2:
+            value = float(table.end[row])
+        elif column == 3:
+            value = int(table.count[row])
+        elif column <= 6:
+            value = float(table.shifts[row, column - 4])
+        elif column == 7:
+            value = float(table.duration[row])
+        elif column == 8:
+            value = (float(table.width[row]), float(table.depth[row]))
+        elif column == 9:
+            value = float(table.mean_alt[row])
+        elif column == 10:
+            value = float(table.coverage[row])
+        else:
+            value = float(table.flagged[row])
+        if role == Qt.UserRole:
+            return value
+        if column in (1, 2):
+            return format_timestamp(value)
+        if column in (4, 5):
+            return f"{value:.9f}"
+        if column == 6:
+            return f"{value:.6f}"
+        if column == 7:
+            minutes, seconds = divmod(round(value), 60)
+            return f"{minutes}:{seconds:02d}"
+        if column == 8:
+            return f"{value[0]:.0f} x {value[1]:.0f}"
+        if column == 9:
+            return f"{value:.1f}"
+        if column == 10:
+            return "-" if value != value else f"{value:.0%}"  # NaN until PPK is loaded
+        if column == 11:
+            return "-" if value != value else f"{value:.0f}"
+        return str(value)
+
+class ImageTableModel(QAbstractTableModel):
+    """Read-only per-image view of an ImageTable, showing positions with their set's shift applied."""
+    HEADERS = ['Set', 'Image', 'Time', 'Latitude', 'Longitude', 'Altitude', 'PPK']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.table = None
+
+    def set_table(self, table):
+        self.beginResetModel()
+        self.table = table
+        self.endResetModel()
+
+    def shifts_changed(self):
+        if self.table is not None and len(self.table):
+            self.dataChanged.emit(self.index(0, 3), self.index(len(self.table) - 1, 5))
+
+    def coverage_changed(self):
+        if self.table is not None and len(self.table):
+            self.dataChanged.emit(self.index(0, 6), self.index(len(self.table) - 1, 6))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.table is None else len(self.table)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return self.HEADERS[section] if orientation == Qt.Horizontal else str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.UserRole):
+            return None
+        row, column = index.row(), index.column()
+        table = self.table
+        if column == 0:
+            value = int(table.set_index[row]) + 1
+        elif column == 1:
+            value = table.names[row]
+        elif column == 2:
+            value = float(table.timestamp[row])
+        elif column <= 5:
+            value = float(table.corrected(row)[column - 3])
+        else:
+            value = table.flags(row)
+        if role == Qt.UserRole:
+            return value
+        if column == 1:
+            return os.path.basename(value)
+        if column == 2:
+            return format_timestamp(value)
+        if column in (3, 4):
+            return f"{value:.9f}"
+        if column == 5:
+            return f"{value:.3f}"
+        if column == 6:
+            return "-" if value is None else describe_flags(value)  # None until PPK is loaded
+        return str(value)
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    cancelled = pyqtSignal()
+    measured = pyqtSignal(object)
+
+class Worker(QRunnable):
+    """Run a processing stage on the thread pool and report back through Qt signals.
+
+    Stages that accept ``progress``/``cancelled`` keywords get throttled
+    progress reporting and stop early when cancelled; for the others a
+    cancel only discards the result. The run is measured as ``stage`` and its
+    StageStats are emitted through ``measured`` however it ends.
+    """
+    def __init__(self, stage, fn, *args, hooks=True, profile_path=None, **kwargs):
+        super().__init__()
+        self.stage = stage
+        self.profile_path = profile_path
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.hooks = hooks
+        self.signals = WorkerSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        kwargs = dict(self.kwargs)
+        if self.hooks:
+            kwargs['progress'] = Throttle(self.signals.progress.emit)
+            kwargs['cancelled'] = self._cancel.is_set
+        stats = None
+        try:
+            with measure(self.stage, self.profile_path) as stats:
+                result = self.fn(*self.args, **kwargs)
+        except Cancelled:
+            self.signals.measured.emit(stats)
+            self.signals.cancelled.emit()
+        except Exception as e:
+            if stats is not None:
+                self.signals.measured.emit(stats)
+            self.signals.failed.emit(e)
+        else:
+            self.signals.measured.emit(stats)
+            if self._cancel.is_set():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.min_time_diff = 20  # Default value
+        # Set splitting, PPK and export settings, also used when processing a project
+        self.options = MissionOptions()
+        self.metadata_cache = MetadataCache()
+        self.map_view = None
+        self.log_path = setup_logging()
+        self.workers = {}  # Running background stages by name
         self.folder_path = None
+        self.image_columns = None  # ImageColumns of the imported folder, re-segmented without re-reading EXIF
         self.image_sets = None
         self.corrections = []
-        self.ppk_data = []  # Store PPK data
+        self.ppk_data = None  # PPKTrack of the loaded PPK log
+        self.ppk_file = None
+        self.ppk_windows = None  # Time windows the PPK log was trimmed to, None when loaded whole
+        self.project = None  # Project of a multi-folder, multi-PPK campaign
+        self.set_table = None  # SetTable of the image sets, holding their shifts
+        self.image_table = None  # ImageTable, built when the per-image view is first shown
         self.initUI()
 
     def initUI(self):
@@ -136,13 +294,22 @@ class MainWindow(QMainWindow):
         self.setWindowIcon(icon)
 
         layout = QVBoxLayout()
-        self.tableWidget = QTableWidget()
-        self.tableWidget.setColumnCount(7)
-        self.tableWidget.setHorizontalHeaderLabels(['Set', 'Start Time', 'End Time', 'Number of Images', 'Delta Latitude', 'Delta Longitude', 'Delta Altitude'])
-        self.tableWidget.doubleClicked.connect(self.table_double_clicked)
+        self.setsModel = SetTableModel(self)
+        self.imagesModel = ImageTableModel(self)
+        self.tableView = QTableView()
+        self.tableView.setModel(self.setsModel)
+        # Fixed row heights let the view skip measuring rows it does not paint
+        self.tableView.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.tableView.doubleClicked.connect(self.table_double_clicked)
+
+        # Timing and counters of every stage run, newest last
+        self.stagePanel = QPlainTextEdit()
+        self.stagePanel.setReadOnly(True)
+        self.stagePanel.setMaximumHeight(110)
+        self.stagePanel.appendPlainText(f"Log file: {self.log_path}")
         widget = QWidget()
         widget.setLayout(layout)
-        layout.addWidget(self.tableWidget)
+        layout.addWidget(self.tableView)
         self.setCentralWidget(widget)
 
         # Create the clear button
@@ -151,7 +318,8 @@ class MainWindow(QMainWindow):
 
         widget = QWidget()
         widget.setLayout(layout)
-        layout.addWidget(self.tableWidget)
+        layout.addWidget(self.tableView)
+        layout.addWidget(self.stagePanel)
         layout.addWidget(clear_button)  # Add the clear button to the layout
         self.setCentralWidget(widget)
 
@@ -172,12 +340,62 @@ class MainWindow(QMainWindow):
         importppkfile.triggered.connect(self.loadppkpath)
         fileMenu.addAction(importppkfile)
 
+        self.trimPpkAction = QAction('Trim PPK to Image Sets', self, checkable=True)
+        self.trimPpkAction.setChecked(True)
+        self.trimPpkAction.toggled.connect(self.retrim_ppk)
+        fileMenu.addAction(self.trimPpkAction)
+
+        clearCacheAction = QAction('Clear Metadata Cache', self)
+        clearCacheAction.triggered.connect(self.clearMetadataCache)
+        fileMenu.addAction(clearCacheAction)
+
         # Processing Menu
         processingMenu = menubar.addMenu('Processing')
         setTimeDiffAction = QAction('Set Time Difference', self)
         setTimeDiffAction.triggered.connect(self.setTimeDifference)
         processingMenu.addAction(setTimeDiffAction)
 
+        setAltStepAction = QAction('Set Altitude Split', self)
+        setAltStepAction.triggered.connect(self.setAltitudeSplit)
+        processingMenu.addAction(setAltStepAction)
+
+        setSpeedAction = QAction('Set Speed Split', self)
+        setSpeedAction.triggered.connect(self.setSpeedSplit)
+        processingMenu.addAction(setSpeedAction)
+
+        setWorkersAction = QAction('Set EXIF Workers', self)
+        setWorkersAction.triggered.connect(self.setExifWorkers)
+        processingMenu.addAction(setWorkersAction)
+
+        self.exifProcessesAction = QAction('Read EXIF in Processes', self, checkable=True)
+        processingMenu.addAction(self.exifProcessesAction)
+
+        setMarginAction = QAction('Set PPK Time Margin', self)
+        setMarginAction.triggered.connect(self.setPpkMargin)
+        processingMenu.addAction(setMarginAction)
+
+        setOffsetAction = QAction('Set Time Offset', self)
+        setOffsetAction.triggered.connect(self.setTimeOffset)
+        processingMenu.addAction(setOffsetAction)
+
+        setLeapAction = QAction('Set GPS Leap Seconds', self)
+        setLeapAction.triggered.connect(self.setLeapSeconds)
+        processingMenu.addAction(setLeapAction)
+
+        self.hermiteAction = QAction('Hermite Interpolation (ENU)', self, checkable=True)
+        processingMenu.addAction(self.hermiteAction)
+
+        setMaxGapAction = QAction('Set PPK Max Gap', self)
+        setMaxGapAction.triggered.connect(self.setPpkMaxGap)
+        processingMenu.addAction(setMaxGapAction)
+
+        self.skipFlaggedAction = QAction('Skip Flagged PPK Images', self, checkable=True)
+        processingMenu.addAction(self.skipFlaggedAction)
+
+        setLeverArmAction = QAction('Set Lever Arm', self)
+        setLeverArmAction.triggered.connect(self.setLeverArm)
+        processingMenu.addAction(setLeverArmAction)
+
         exportAction = QAction('Export Sets', self)
         exportAction.triggered.connect(self.export_all_sets)
         processingMenu.addAction(exportAction)
@@ -186,6 +404,40 @@ class MainWindow(QMainWindow):
         updatecoorppk.triggered.connect(self.ppkprocess)
         processingMenu.addAction(updatecoorppk)
 
+        self.writeExifAction = QAction('Write Geotags to EXIF', self, checkable=True)
+        processingMenu.addAction(self.writeExifAction)
+
+        self.xmpAction = QAction('Include DJI XMP Tags', self, checkable=True)
+        processingMenu.addAction(self.xmpAction)
+
+        self.profileAction = QAction('Profile Next Run', self, checkable=True)
+        processingMenu.addAction(self.profileAction)
+
+        # Table Menu
+        tableMenu = menubar.addMenu('Table')
+        self.perImageAction = QAction('Show Individual Images', self, checkable=True)
+        self.perImageAction.toggled.connect(self.show_table)
+        tableMenu.addAction(self.perImageAction)
+
+        # Project Menu
+        projectMenu = menubar.addMenu('Project')
+        openProjectAction = QAction('New/Open Project', self)
+        openProjectAction.triggered.connect(self.openProject)
+        projectMenu.addAction(openProjectAction)
+
+        self.projectActions = []
+        for label, slot in (
+            ('Add Image Folder', self.addProjectFolder),
+            ('Add PPK Logs', self.addProjectPpk),
+            ('Project Status', self.showProjectStatus),
+            ('Process Project', self.processProject),
+        ):
+            action = QAction(label, self)
+            action.triggered.connect(slot)
+            action.setEnabled(False)
+            projectMenu.addAction(action)
+            self.projectActions.append(action)
+
         # View Menu
         viewMenu = menubar.addMenu('Map')
         viewonmap = QAction('View on Map', self)
@@ -193,59 +445,314 @@ class MainWindow(QMainWindow):
         viewMenu.addAction(viewonmap)
 
     def setTimeDifference(self):
-        min_time_diff, ok = QInputDialog.getInt(self, "Set Time Difference", "Enter the minimum time difference between sets (in minutes):", min=1, max=120, step=1, value=self.min_time_diff)
+        min_time_diff, ok = QInputDialog.getInt(self, "Set Time Difference", "Enter the minimum time difference between sets (in minutes):", min=1, max=120, step=1, value=self.options.min_time_diff)
+        if ok:
+            self.options.min_time_diff = min_time_diff
+            self.segment_images()
+
+    def setAltitudeSplit(self):
+        step, ok = QInputDialog.getDouble(self, "Set Altitude Split", "Enter the altitude jump between images that starts a new set\n(in metres, 0 = off):", value=self.options.max_alt_step or 0, min=0, max=10000, decimals=1)
+        if ok:
+            self.options.max_alt_step = step or None
+            self.segment_images()
+
+    def setSpeedSplit(self):
+        speed, ok = QInputDialog.getDouble(self, "Set Speed Split", "Enter the ground speed between images that starts a new set\n(in m/s, 0 = off):", value=self.options.max_speed or 0, min=0, max=10000, decimals=1)
+        if ok:
+            self.options.max_speed = speed or None
+            self.segment_images()
+
+    def setExifWorkers(self):
+        workers, ok = QInputDialog.getInt(self, "Set EXIF Workers", "Enter the number of parallel EXIF readers (0 = automatic):", min=0, max=64, step=1, value=self.options.exif_workers or 0)
+        if ok:
+            self.options.exif_workers = workers or None
+
+    def setPpkMargin(self):
+        margin, ok = QInputDialog.getInt(self, "Set PPK Time Margin", "Enter the seconds of PPK data to keep before and after each image set:", min=0, max=3600, step=10, value=self.options.ppk_margin)
         if ok:
-            self.min_time_diff = min_time_diff
+            self.options.ppk_margin = margin
+            self.retrim_ppk()
+
+    def setPpkMaxGap(self):
+        gap, ok = QInputDialog.getDouble(self, "Set PPK Max Gap", "Enter the seconds between the PPK epochs around an image above which it is flagged\n(0 = off):", value=self.options.max_gap or 0, min=0, max=3600, decimals=2)
+        if ok:
+            self.options.max_gap = gap or None
+            self.update_coverage()
+
+    def setTimeOffset(self):
+        offset, ok = QInputDialog.getDouble(self, "Set Time Offset", "Enter the seconds added to the camera clock to reach the PPK time base\n(e.g. time zone or GPS-UTC leap seconds):", value=self.options.time_offset, min=-86400, max=86400, decimals=3)
+        if ok:
+            self.options.time_offset = offset
+            self.update_coverage()
+            self.retrim_ppk()
+
+    def setLeapSeconds(self):
+        leap_seconds, ok = QInputDialog.getInt(self, "Set GPS Leap Seconds", "Enter the GPS-UTC leap seconds removed from DJI MRK trigger times\n(0 if the PPK log is in GPS time):", min=0, max=60, step=1, value=self.options.leap_seconds)
+        if ok:
+            self.options.leap_seconds = leap_seconds
+
+    def setLeverArm(self):
+        text, ok = QInputDialog.getText(self, "Set Lever Arm", "Enter the antenna-to-camera offset as forward, right, down (in metres):", text=', '.join(f"{value:g}" for value in self.options.lever_arm))
+        if ok:
+            try:
+                lever_arm = tuple(float(value) for value in text.replace(',', ' ').split())
+            except ValueError:
+                lever_arm = ()
+            if len(lever_arm) != 3:
+                QMessageBox.warning(self, "Invalid Lever Arm", "Enter three numbers: forward, right, down.")
+                return
+            self.options.lever_arm = lever_arm
+
+    def run_options(self, **changes):
+        """The MissionOptions of a run, with the checkable Processing menu settings applied."""
+        return self.options.replace(
+            method='hermite' if self.hermiteAction.isChecked() else 'linear', skip_flagged=self.skipFlaggedAction.isChecked(),
+            xmp=self.xmpAction.isChecked(), exif_processes=self.exifProcessesAction.isChecked(), **changes,
+        )
+
+    def start_worker(self, stage, label, on_finished, fn, *args, hooks=True, on_failed=None, **kwargs):
+        """Run fn on the thread pool behind a non-modal progress dialog, then call on_finished(result).
+
+        Errors are shown as a critical message unless on_failed(error) is given.
+        """
+        if stage in self.workers:
+            QMessageBox.information(self, "Busy", f"{label} is still running.")
+            return
+        worker = Worker(stage, fn, *args, hooks=hooks, profile_path=self.take_profile_path(stage), **kwargs)
+        progress = QProgressDialog(label, "Cancel", 0, 0, self)
+        progress.setWindowTitle("Working")
+        progress.setWindowModality(Qt.NonModal)
+        progress.setMinimumDuration(500)
+        progress.setAutoReset(False)
+        progress.canceled.connect(worker.cancel)
+
+        def on_progress(done, total):
+            progress.setMaximum(total)
+            progress.setValue(done)
+
+        def done():
+            self.workers.pop(stage, None)
+            progress.canceled.disconnect(worker.cancel)
+            progress.close()
+            progress.deleteLater()
+
+        def finished(result):
+            done()
+            on_finished(result)
+
+        def failed(error):
+            done()
+            if on_failed:
+                on_failed(error)
+            else:
+                QMessageBox.critical(self, "Error", f"{label} failed: {error}")
+
+        worker.signals.measured.connect(self.show_stage)
+        worker.signals.progress.connect(on_progress)
+        worker.signals.finished.connect(finished)
+        worker.signals.failed.connect(failed)
+        worker.signals.cancelled.connect(done)
+        self.workers[stage] = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def take_profile_path(self, stage):
+        """A profile path for this run if 'Profile Next Run' is on, which it then turns off."""
+        if not self.profileAction.isChecked():
+            return None
+        self.profileAction.setChecked(False)
+        return new_profile_path(stage)
+
+    def show_stage(self, stats):
+        """Add a finished stage's StageStats to the summary panel and status bar."""
+        self.stagePanel.appendPlainText(stats.summary())
+        self.statusBar().showMessage(stats.summary())
 
     def loadFolder(self):
-        self.folder_path = QFileDialog.getExistingDirectory(self, "Select Directory")
-        if self.folder_path:
-            self.image_sets = analyze_images(self.folder_path, self.min_time_diff)
-            self.tableWidget.setRowCount(len(self.image_sets))
-            for i, imageset in enumerate(self.image_sets):
-                start_time = datetime.strptime(imageset[0][4] + ' ' + imageset[0][5], '%Y:%m:%d %H:%M:%S')
-                end_time = datetime.strptime(imageset[-1][4] + ' ' + imageset[-1][5], '%Y:%m:%d %H:%M:%S')
-                self.tableWidget.setItem(i, 0, QTableWidgetItem(str(i + 1)))
-                self.tableWidget.setItem(i, 1, QTableWidgetItem(start_time.strftime('%Y-%m-%d %H:%M:%S')))
-                self.tableWidget.setItem(i, 2, QTableWidgetItem(end_time.strftime('%Y-%m-%d %H:%M:%S')))
-                self.tableWidget.setItem(i, 3, QTableWidgetItem(str(len(imageset))))
-                self.tableWidget.setItem(i, 4, QTableWidgetItem("0.000000"))
-                self.tableWidget.setItem(i, 5, QTableWidgetItem("0.000000"))
-                self.tableWidget.setItem(i, 6, QTableWidgetItem("0.00"))
+        folder_path = QFileDialog.getExistingDirectory(self, "Select Directory")
+        if folder_path:
+            self.start_worker(
+                'import', "Importing images...", lambda columns: self.show_images(folder_path, columns),
+                load_images, folder_path, self.options.exif_workers, self.exifProcessesAction.isChecked(), cache=self.metadata_cache,
+                leap_seconds=self.options.leap_seconds
+            )
+
+    def show_images(self, folder_path, columns):
+        self.folder_path = folder_path
+        self.image_columns = columns
+        self.segment_images()
+        self.retrim_ppk()
+
+    def segment_images(self):
+        """Split the imported images into sets with the current gap and split settings.
+
+        Runs on the cached ImageColumns, so it is instant and needs no EXIF
+        re-read; loaded corrections are matched again to the new sets.
+        """
+        if self.image_columns is None:
+            return
+        with measure('segment') as stats:
+            image_sets = self.image_columns.segment(self.options.min_time_diff, self.options.max_alt_step, self.options.max_speed)
+            shifts = match_corrections(image_sets, self.corrections)[0] if self.corrections else []
+        self.show_stage(stats)
+        self.show_image_sets(image_sets)
+        if shifts:
+            self.set_table.set_shifts(shifts)
+            self.shifts_changed()
+
+    def show_image_sets(self, image_sets):
+        self.image_sets = image_sets
+        self.set_table = SetTable(image_sets, self.image_columns)
+        self.set_table.set_coverage(self.ppk_data, self.options.time_offset, self.options.max_gap)
+        self.image_table = None
+        self.setsModel.set_table(self.set_table)
+        self.imagesModel.set_table(None)
+        self.show_table()
+
+    def show_table(self, *_):
+        """Show one row per set, or one per image when 'Show Individual Images' is on."""
+        if self.perImageAction.isChecked() and self.set_table is not None:
+            if self.image_table is None:
+                self.image_table = ImageTable(self.set_table)
+                self.imagesModel.set_table(self.image_table)
+            self.tableView.setModel(self.imagesModel)
+        else:
+            self.tableView.setModel(self.setsModel)
+
+    def shifts_changed(self):
+        self.setsModel.shifts_changed()
+        self.imagesModel.shifts_changed()
+
+    def update_coverage(self):
+        if self.set_table is not None:
+            self.set_table.set_coverage(self.ppk_data, self.options.time_offset, self.options.max_gap)
+            self.setsModel.coverage_changed()
+            self.imagesModel.coverage_changed()
+
+    def clearMetadataCache(self):
+        try:
+            self.metadata_cache.invalidate()
+            QMessageBox.information(self, "Cleared", "The EXIF metadata cache has been cleared.")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to clear the metadata cache: {e}")
 
     def loadcorrections(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Open CSV", "", "CSV Files (*.csv)")
         if filename:
             try:
-                with open(filename, newline='') as file:
-                    reader = csv.DictReader(file)
-                    self.corrections = list(reader)
-                self.apply_corrections()
+                with measure('corrections') as stats:
+                    self.corrections = load_corrections(filename)
+                    self.options.corrections_file = filename
+                    shifts, unused_corrections = match_corrections(self.image_sets or [], self.corrections)
+                self.show_stage(stats)
+                self.apply_corrections(shifts, unused_corrections)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to load corrections: {e}")
     
     def loadppkpath(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Open PPK File", "", "CSV Files (*.csv)")
+        if filename:
+            self.load_ppk_file(filename)
+
+    def ppk_trim_windows(self):
+        """Once the image sets are known, only the PPK epochs around them are needed."""
+        if self.image_sets and self.trimPpkAction.isChecked():
+            return image_windows(self.image_sets, self.options.ppk_margin, self.options.time_offset)
+        return None
+
+    def load_ppk_file(self, filename, reload=False):
+        windows = self.ppk_trim_windows()
+        self.start_worker(
+            'ppk', "Loading PPK data...", lambda track: self.set_ppk_data(filename, windows, track, reload),
+            load_ppk, filename, windows=windows
+        )
+
+    def retrim_ppk(self):
+        """Reload a trimmed PPK log when the time offset, margin or images no longer match its windows."""
+        if self.ppk_file and self.ppk_windows is not None and self.ppk_trim_windows() != self.ppk_windows:
+            self.load_ppk_file(self.ppk_file, reload=True)
+
+    def set_ppk_data(self, filename, windows, track, reload=False):
+        self.ppk_file = filename
+        self.ppk_windows = windows
+        self.ppk_data = track or None
+        self.update_coverage()
+        if not track:
+            QMessageBox.warning(self, "Time Mismatch", "The PPK file has no epochs around the image sets.")
+        elif not reload:
+            QMessageBox.information(self, "Success", f"PPK data loaded successfully ({len(track)} epochs).")
+
+    def openProject(self):
+        filename, _ = QFileDialog.getSaveFileName(self, "New or Existing Project", "", "ShiftApp Projects (*.shiftproj)", options=QFileDialog.DontConfirmOverwrite)
         if filename:
             try:
-                self.ppk_data.clear()
-                with open(filename, newline='') as file:
-                    reader = csv.DictReader(file)
-                    for row in reader:
-                        date, time = row['Date/Time'].split()
-                        lat = float(row['WGS84 Latitude'])
-                        lon = float(row['WGS84 Longitude'])
-                        alt = float(row['WGS84 Ellip. Height'])
-                        self.ppk_data.append((date, time, lat, lon, alt))
-                QMessageBox.information(self, "Success", "PPK data loaded successfully.")
+                project = Project(filename)
+                project.folders()  # Creates the file, or checks an existing one
             except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to load PPK data: {e}")
-    
+                QMessageBox.critical(self, "Error", f"Failed to open the project: {e}")
+                return
+            self.project = project
+            for action in self.projectActions:
+                action.setEnabled(True)
+            self.setWindowTitle(f"Shift App - {os.path.basename(filename)}")
+
+    def addProjectFolder(self):
+        folder_path = QFileDialog.getExistingDirectory(self, "Add Image Folder to Project")
+        if folder_path:
+            self.start_worker(
+                'project', "Adding images to the project...", lambda count: self.statusBar().showMessage(f"{count} images added from {folder_path}"),
+                self.project.add_folder, folder_path, self.options.exif_workers, self.metadata_cache, self.options.leap_seconds,
+                use_processes=self.exifProcessesAction.isChecked()
+            )
+
+    def addProjectPpk(self):
+        filenames, _ = QFileDialog.getOpenFileNames(self, "Add PPK Logs to Project", "", "CSV Files (*.csv)")
+        if filenames:
+            self.start_worker(
+                'project', "Adding PPK logs to the project...", lambda epochs: self.statusBar().showMessage(f"{sum(epochs)} PPK epochs added"),
+                lambda: [self.project.add_ppk(filename) for filename in filenames], hooks=False
+            )
+
+    def showProjectStatus(self):
+        try:
+            lines = self.project.status(self.options.time_offset)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to read the project: {e}")
+            return
+        QMessageBox.information(self, "Project Status", "\n".join(lines) or "The project is empty.")
+
+    def processProject(self):
+        output_dir = QFileDialog.getExistingDirectory(self, "Select Output Folder for the Project")
+        if output_dir:
+            exif_dir = None
+            if self.writeExifAction.isChecked():
+                exif_dir = QFileDialog.getExistingDirectory(self, "Select Output Folder for Geotagged Images")
+                if not exif_dir:
+                    return
+            self.start_worker(
+                'project', "Processing the project...", self.project_processed, process_project, self.project.path, output_dir,
+                self.run_options(exif_dir=exif_dir), log_file=self.log_path,
+            )
+
+    def project_processed(self, result):
+        summaries, failures = result
+        message = "\n".join(summaries) or "The project has no image folders."
+        if failures:
+            QMessageBox.warning(self, "Project Errors", f"{failures} folders failed:\n{message}")
+        else:
+            QMessageBox.information(self, "Project Processed", message)
+
     def clear_data(self):
-        self.tableWidget.setRowCount(0)  # Clear all rows from the table
+        self.setsModel.set_table(None)  # Clear all rows from the table
+        self.imagesModel.set_table(None)
+        self.set_table = None
+        self.image_table = None
+        self.image_columns = None
         self.image_sets = []  # Reset the image sets
-        self.ppk_data = []  # Reset the PPK data
+        self.ppk_data = None  # Reset the PPK data
+        self.ppk_file = None
+        self.ppk_windows = None
         self.corrections = []  # Reset the corrections
+        self.options.corrections_file = None
         QMessageBox.information(self, "Cleared", "All data has been cleared.")
 
 
@@ -254,74 +761,65 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Missing Data", "Ensure both image sets and PPK data are loaded.")
             return
 
-        # Flatten the image sets into a single list for easier processing
-        all_images = [img for imageset in self.image_sets for img in imageset]
-
-        # Normalize and parse the image times and PPK times
-        def normalize_date(date_str):
-            """Normalize date by removing leading zeros and converting to a consistent format."""
-            return date_str.replace('-', '/').replace(':', '/').lstrip('0')
-
-        image_times = [datetime.strptime(normalize_date(img[4]) + ' ' + img[5], '%Y/%m/%d %H:%M:%S') for img in all_images]
-        ppk_times = [datetime.strptime(normalize_date(ppk[0]) + ' ' + ppk[1], '%m/%d/%Y %H:%M:%S.%f') for ppk in self.ppk_data]
-        
-        if min(image_times) > max(ppk_times) or max(image_times) < min(ppk_times):
-            QMessageBox.warning(self, "Time Mismatch", "Image timestamps do not overlap with PPK data timestamps.")
-            return
-
-        # Initialize the progress dialog
-        progress = QProgressDialog("Updating Images Geolocations...", "Cancel", 0, len(all_images), self)
-        progress.setWindowTitle("Geotagging")
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setValue(0)
-
-        # Interpolate and update image geolocations
-        updated_image_data = []
-        for idx, image in enumerate(all_images):
-            image_time = datetime.strptime(normalize_date(image[4]) + ' ' + image[5], '%Y/%m/%d %H:%M:%S')
-
-            # Find the nearest PPK times surrounding the image time
-            ppk_before = max([ppk for ppk in self.ppk_data if datetime.strptime(normalize_date(ppk[0]) + ' ' + ppk[1], '%m/%d/%Y %H:%M:%S.%f') <= image_time], key=lambda ppk: datetime.strptime(normalize_date(ppk[0]) + ' ' + ppk[1], '%m/%d/%Y %H:%M:%S.%f'))
-            ppk_after = min([ppk for ppk in self.ppk_data if datetime.strptime(normalize_date(ppk[0]) + ' ' + ppk[1], '%m/%d/%Y %H:%M:%S.%f') >= image_time], key=lambda ppk: datetime.strptime(normalize_date(ppk[0]) + ' ' + ppk[1], '%m/%d/%Y %H:%M:%S.%f'))
-
-            # Interpolate the latitude, longitude, and altitude
-            time_before = datetime.strptime(normalize_date(ppk_before[0]) + ' ' + ppk_before[1], '%m/%d/%Y %H:%M:%S.%f')
-            time_after = datetime.strptime(normalize_date(ppk_after[0]) + ' ' + ppk_after[1], '%m/%d/%Y %H:%M:%S.%f')
-
-            if time_before == time_after:
-                interpolated_lat = ppk_before[2]
-                interpolated_lon = ppk_before[3]
-                interpolated_alt = ppk_before[4]
-            else:
-                total_time_diff = (time_after - time_before).total_seconds()
-                time_diff_before = (image_time - time_before).total_seconds()
-
-                ratio = time_diff_before / total_time_diff
-                interpolated_lat = ppk_before[2] + ratio * (ppk_after[2] - ppk_before[2])
-                interpolated_lon = ppk_before[3] + ratio * (ppk_after[3] - ppk_before[3])
-                interpolated_alt = ppk_before[4] + ratio * (ppk_after[4] - ppk_before[4])
+        options = self.run_options()
+        self.start_worker(
+            'geotag', "Geotagging images...", self.export_geotags, geotag_columns, self.image_sets, self.ppk_data, options.time_offset,
+            options.method, options.lever_arm, options.exif_workers, options.max_gap, options.skip_flagged,
+            hooks=False, on_failed=self.geotag_failed
+        )
 
-            # Update image data with the interpolated values
-            updated_image_data.append([os.path.basename(image[0]), interpolated_lat, interpolated_lon, interpolated_alt])
-
-            # Update the progress dialog
-            progress.setValue(idx + 1)
-            if progress.wasCanceled():
-                break
+    def geotag_failed(self, error):
+        if isinstance(error, TimeMismatch):
+            QMessageBox.warning(self, "Time Mismatch", str(error))
+        else:
+            QMessageBox.critical(self, "Error", f"Geotagging failed: {error}")
+
+    def export_filename(self, title):
+        """Ask for an export file; a name without extension gets the selected format's."""
+        filename, selected_filter = QFileDialog.getSaveFileName(self, title, "", EXPORT_FILTERS)
+        if filename and not os.path.splitext(filename)[1]:
+            filename += selected_filter[selected_filter.index('*') + 1:-1] if '*' in selected_filter else '.csv'
+        return filename
+
+    def export_geotags(self, result):
+        geotags, skipped = result
+        if skipped:
+            reason = "outside the PPK time range or flagged" if self.skipFlaggedAction.isChecked() else "outside the PPK time range"
+            QMessageBox.warning(self, "Outside PPK Range", f"{skipped} images lie {reason} and were not geotagged.")
+        flagged = int((geotags.flags != 0).sum())
+        if flagged:
+            QMessageBox.warning(
+                self, "Flagged PPK Epochs",
+                f"{flagged} images were geotagged between PPK epochs that are too far apart or not fixed; "
+                "their flags are kept in the NumPy, Parquet, Feather, GeoJSON and GeoPackage exports.",
+            )
 
-        # Export updated geolocations to a CSV file
-        export_filename, _ = QFileDialog.getSaveFileName(self, "Save Updated Geolocations", "", "CSV Files (*.csv)")
+        # Export updated geolocations as CSV or one of the columnar formats
+        export_filename = self.export_filename("Save Updated Geolocations")
         if export_filename:
             try:
-                with open(export_filename, mode='w', newline='') as file:
-                    writer = csv.writer(file)
-                    writer.writerow(['Image Filename', 'Latitude', 'Longitude', 'Altitude'])
-                    for row in updated_image_data:
-                        writer.writerow(row)
+                with measure('export') as stats:
+                    export_geotag_file(export_filename, geotags)
+                self.show_stage(stats)
                 QMessageBox.information(self, "Success", "Updated geolocations exported successfully.")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to export geolocations: {e}")
 
+        self.write_exif(geotags.rows())
+
+    def write_exif(self, rows):
+        """Write [path, lat, lon, alt] rows into the images' GPS tags when that option is on."""
+        if not self.writeExifAction.isChecked() or not rows:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Select Output Folder for Geotagged Images (the image folder updates them in place)")
+        if output_dir:
+            self.start_worker('exif', "Writing geotags into images...", self.exif_written, write_geotags_exif, rows, output_dir, xmp=self.xmpAction.isChecked())
+
+    def exif_written(self, result):
+        written, errors = result
+        if errors:
+            QMessageBox.warning(self, "Geotagging Errors", f"{len(errors)} images could not be geotagged:\n" + "\n".join(errors[:20]))
+        QMessageBox.information(self, "Success", f"Geotags written into {written} images.")
 
     def showmap(self):
         # Check if there's any data to show
@@ -329,140 +827,44 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "No Data", "No layers to be shown.")
             return
 
-        # Initialize bounding box values
-        min_lat, min_lon = float('inf'), float('inf')
-        max_lat, max_lon = float('-inf'), float('-inf')
-
-        # Create the map with a default location, it will be adjusted later
-        m = folium.Map(location=[0, 0], zoom_start=2)
-        data_added = False  # To track if any data was added to the map
-
-        # Feature groups for layers
-        image_layer = folium.FeatureGroup(name="Image Locations")
-        ppk_layer = folium.FeatureGroup(name="PPK Path")
-
-        # If image sets exist, plot them on the image_layer
-        if self.image_sets:
-            for imageset in self.image_sets:
-                for image in imageset:
-                    lat = dms_to_decimal(*image[1])
-                    lon = dms_to_decimal(*image[2])
-                    folium.Marker(
-                        [lat, lon],
-                        tooltip=os.path.basename(image[0]),
-                        icon=folium.Icon(icon="camera", prefix="fa")
-                    ).add_to(image_layer)
-                    data_added = True
-
-                    # Update bounding box
-                    min_lat = min(min_lat, lat)
-                    max_lat = max(max_lat, lat)
-                    min_lon = min(min_lon, lon)
-                    max_lon = max(max_lon, lon)
-
-        # If PPK data exists, plot the path on the ppk_layer
-        if self.ppk_data:
-            ppk_path = []
-            for date, time, lat, lon, alt in self.ppk_data:
-                ppk_path.append([lat, lon])
-
-                # Update bounding box
-                min_lat = min(min_lat, lat)
-                max_lat = max(max_lat, lat)
-                min_lon = min(min_lon, lon)
-                max_lon = max(max_lon, lon)
-
-            # Add the PPK path as a polyline to the ppk_layer
-            folium.PolyLine(ppk_path, color="blue", weight=2.5, opacity=1).add_to(ppk_layer)
-            data_added = True
-
-        # Add layers to the map
-        if data_added:
-            if self.image_sets:
-                image_layer.add_to(m)
-            if self.ppk_data:
-                ppk_layer.add_to(m)
-
-            # Add layer control to the map
-            folium.LayerControl().add_to(m)
-
-            # Adjust the map view to fit the data
-            # Calculate the center of the bounding box
-            center_lat = (min_lat + max_lat) / 2
-            center_lon = (min_lon + max_lon) / 2
-            m.location = [center_lat, center_lon]
-            folium.FitBounds([[min_lat, min_lon], [max_lat, max_lon]]).add_to(m)
-
-            # Save and display the map
-            map_html = "map.html"
-            m.save(map_html)
+        columns = self.set_table.columns if self.image_sets else None
+        image_lat = columns.lat if columns is not None else []
+        image_lon = columns.lon if columns is not None else []
+        image_names = [os.path.basename(image.path) for image in columns.images] if columns is not None else []
+        ppk_lat = self.ppk_data.lat if self.ppk_data else []
+        ppk_lon = self.ppk_data.lon if self.ppk_data else []
+
+        # Cached by content, so re-opening an unchanged map does not rebuild it
+        self.start_worker('map', "Building map...", self.display_map, render_map, image_lat, image_lon, image_names, ppk_lat, ppk_lon, hooks=False)
+
+    def display_map(self, map_html):
+        if map_html is None:
+            # If no data was added to the map, warn the user
+            QMessageBox.warning(self, "No Data", "No layers to be shown.")
+            return
 
+        if self.map_view is None:
+            # QtWebEngine starts Chromium, so it is only loaded once a map is shown
+            try:
+                from PyQt5.QtWebEngineWidgets import QWebEngineView
+            except ImportError as e:
+                QMessageBox.critical(self, "Map Unavailable", f"The map needs PyQtWebEngine, which could not be loaded: {e}")
+                return
             self.map_view = QWebEngineView()
             self.map_view.setWindowTitle("Image and PPK Locations")
             self.map_view.resize(800, 600)
-            self.map_view.setUrl(QUrl.fromLocalFile(os.path.abspath(map_html)))
-            self.map_view.show()
-        else:
-            # If no data was added to the map, warn the user
-            QMessageBox.warning(self, "No Data", "No layers to be shown.")
+        if self.map_view.url() != QUrl.fromLocalFile(map_html):
+            self.map_view.setUrl(QUrl.fromLocalFile(map_html))
+        self.map_view.show()
+        self.map_view.raise_()
 
-    def apply_corrections(self):
+    def apply_corrections(self, shifts, unused_corrections):
         if not self.corrections or not self.image_sets:
             return
 
-        corrections_found = set()
-        unmatched_corrections = []
-
-        for i, imageset in enumerate(self.image_sets):
-            try:
-                # Parsing the image set's start date and time
-                start_date_str = imageset[0][4]  # 'YYYY:mm:dd'
-                start_time_str = imageset[0][5]  # 'HH:MM:SS'
-                start_date = datetime.strptime(start_date_str, '%Y:%m:%d').date()  # Extract just the date
-                start_datetime = datetime.strptime(start_date_str + ' ' + start_time_str, '%Y:%m:%d %H:%M:%S')
-            except ValueError as e:
-                print(f"Error parsing date for image set {i}: {e}")
-                unmatched_corrections.append(i)
-                continue  # Skip to the next image set if parsing fails
-
-            applicable_correction = None
-
-            # Iterate through corrections to find the latest one with the same date and before the start time
-            for correction in self.corrections:
-                try:
-                    # Parsing the correction's date and time
-                    corr_datetime = datetime.strptime(correction['Date/Time'], '%m/%d/%Y %H:%M')
-                    corr_date = corr_datetime.date()  # Extract just the date
-                except ValueError as e:
-                    print(f"Error parsing correction date: {e}")
-                    continue  # Skip this correction if parsing fails
-
-                # First, compare the dates
-                if corr_date == start_date:
-                    # If the dates match, then compare the times
-                    if corr_datetime.time() < start_datetime.time():  # Check time separately
-                        applicable_correction = correction
-                    else:
-                        break  # Corrections are sorted, so stop checking once times no longer match
-                elif corr_date > start_date:
-                    break  # Since corrections are sorted, stop if the correction date is later than the image set's date
-
-            if applicable_correction:
-                # Extract the deltas and apply the correction to the table
-                delta_lat = float(applicable_correction['deltaLat'])
-                delta_lon = float(applicable_correction['deltaLong'])
-                delta_alt = float(applicable_correction['deltah'])
-
-                self.tableWidget.setItem(i, 4, QTableWidgetItem(f"{delta_lat:.8f}"))  # Display with full precision
-                self.tableWidget.setItem(i, 5, QTableWidgetItem(f"{delta_lon:.8f}"))  # Display with full precision
-                self.tableWidget.setItem(i, 6, QTableWidgetItem(f"{delta_alt:.4f}"))  # Display with full precision
-                corrections_found.add(applicable_correction['Point Id'])
-            else:
-                unmatched_corrections.append(i)
-
-        # Find corrections that were not used
-        correction_ids = {c['Point Id'] for c in self.corrections}
-        unused_corrections = correction_ids - corrections_found
+        # Apply the correction deltas to the table
+        self.set_table.set_shifts(shifts)
+        self.shifts_changed()
 
         if unused_corrections:
             QMessageBox.warning(
@@ -477,15 +879,13 @@ class MainWindow(QMainWindow):
 
     def table_double_clicked(self, index):
         set_index = index.row()
-        current_lat = float(self.tableWidget.item(set_index, 4).text())
-        current_lon = float(self.tableWidget.item(set_index, 5).text())
-        current_alt = float(self.tableWidget.item(set_index, 6).text())
+        if self.tableView.model() is self.imagesModel:
+            set_index = int(self.image_table.set_index[set_index])
+        current_lat, current_lon, current_alt = self.set_table.shifts[set_index].tolist()
         dialog = CorrectionDialog(current_lat, current_lon, current_alt, self)
         if dialog.exec_():
-            lat_shift, lon_shift, alt_shift = dialog.get_corrections()
-            self.tableWidget.setItem(set_index, 4, QTableWidgetItem(f"{lat_shift:.9f}"))
-            self.tableWidget.setItem(set_index, 5, QTableWidgetItem(f"{lon_shift:.9f}"))
-            self.tableWidget.setItem(set_index, 6, QTableWidgetItem(f"{alt_shift:.6f}"))
+            self.set_table.shifts[set_index] = dialog.get_corrections()
+            self.shifts_changed()
 
 
     def export_all_sets(self):
@@ -496,32 +896,24 @@ class MainWindow(QMainWindow):
         dialog = ExportSelectionDialog(self.image_sets, self)
         if dialog.exec_():
             selected_indices = dialog.get_selected_indices()
-            filename = QFileDialog.getSaveFileName(self, "Save File", "", "CSV Files (*.csv)")
-            if filename[0]:
-                with open(filename[0], 'w', newline='') as file:
-                    writer = csv.writer(file)
-                    writer.writerow(['ID', 'Latitude', 'Longitude', 'Altitude'])
-                    for i in selected_indices:
-                        imageset = self.image_sets[i]
-                        lat_shift_item = self.tableWidget.item(i, 4)
-                        lon_shift_item = self.tableWidget.item(i, 5)
-                        alt_shift_item = self.tableWidget.item(i, 6)
-                        lat_shift = float(lat_shift_item.text()) if lat_shift_item else 0.0
-                        lon_shift = float(lon_shift_item.text()) if lon_shift_item else 0.0
-                        alt_shift = float(alt_shift_item.text()) if alt_shift_item else 0.0
-                        for image in imageset:
-                            adjusted_lat = dms_to_decimal(*image[1]) + lat_shift
-                            adjusted_lon = dms_to_decimal(*image[2]) + lon_shift
-                            adjusted_alt = image[3] + alt_shift
-                            writer.writerow([
-                                os.path.basename(image[0]), 
-                                f"{adjusted_lat:.9f}", 
-                                f"{adjusted_lon:.9f}", 
-                                f"{adjusted_alt:.6f}"
-                            ])
+            shifts = self.set_table.shift_tuples()
+            filename = self.export_filename("Save File")
+            if filename:
+                try:
+                    with measure('export') as stats:
+                        export_set_file(filename, self.image_sets, selected_indices, shifts)
+                    self.show_stage(stats)
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Failed to export sets: {e}")
+            self.write_exif(set_positions(self.image_sets, selected_indices, shifts))
+
+def create_application(argv):
+    """The QApplication, set up so QtWebEngine can still be imported after it exists."""
+    QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+    return QApplication(argv)
 
 def main():
-    app = QApplication(sys.argv)
+    app = create_application(sys.argv)
     ex = MainWindow()
     ex.show()
     sys.exit(app.exec_())
@@ -0,0 +1 @@
+"""Qt-free processing core for the Shift App."""
@@ -0,0 +1,281 @@
+"""Headless benchmark of every processing stage on a synthetic mission.
+
+Example::
+
+    python -m shiftcore.benchmark --images 5000 --sets 8 --ppk-rate 10 --save-baseline baseline.json
+    python -m shiftcore.benchmark --images 5000 --sets 8 --ppk-rate 10 --baseline baseline.json
+
+A mission is generated with shiftcore.synthetic in a scratch directory that
+also serves as the cache directory, so the user's EXIF cache, PPK sidecars
+and maps are never touched. Each stage reports wall and CPU time, throughput
+and the peak of Python (and NumPy) allocations traced by tracemalloc. With
+--baseline, stages slower than the stored run by more than --tolerance are
+reported and the exit status is 1.
+
+Startup is measured in fresh interpreters: importing the Qt-free core, and
+launching the GUI up to a constructed main window (offscreen, skipped when
+PyQt5 or ShiftApp.py is not available). Startups slower than
+STARTUP_TARGETS are reported and also make the exit status 1.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from shiftcore.cache import MetadataCache
+from shiftcore.exif_writer import write_geotags_exif
+from shiftcore.export import EXPORT_FORMATS, write_columns
+from shiftcore.pipeline import analyze_images, dms_to_decimal, geotag_columns, geotag_images, image_windows, load_corrections, load_images, match_corrections, set_positions, write_geotags, write_sets
+from shiftcore.ppk import load_ppk
+from shiftcore.sets import SetTable
+from shiftcore.synthetic import make_mission
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCHMARK_VERSION = 1
+# Differences below this many seconds are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.02
+# Wall seconds from starting Python, by startup stage
+STARTUP_TARGETS = {'startup (core)': 0.5, 'startup (main window)': 1.5}
+STARTUP_SCRIPTS = {
+    'startup (core)': "import shiftcore.cli, shiftcore.project",
+    'startup (main window)': "import ShiftApp; app = ShiftApp.create_application([]); ShiftApp.MainWindow()",
+}
+
+
+def run_stage(results, name, items, fn, *args, trace_memory=True, **kwargs):
+    """Time fn(*args, **kwargs) as a stage processing ``items`` items; returns its result."""
+    if trace_memory:
+        tracemalloc.start()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    results[name] = {
+        'wall': wall,
+        'cpu': cpu,
+        'items': items,
+        'rate': items / wall if wall > 0 else None,
+        'peak_mb': peak / 2 ** 20 if peak is not None else None,
+    }
+    return result
+
+
+def run_startup(results, name, script):
+    """Time a fresh interpreter running script from the folder holding ShiftApp.py."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    before = os.times()
+    wall = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', script], cwd=root, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - wall
+    after = os.times()
+    if process.returncode:
+        error = (process.stderr.strip().splitlines() or ['failed'])[-1]
+        print(f"Skipping {name}: {error}")
+        return
+    results[name] = {
+        'wall': wall,
+        'cpu': (after.children_user - before.children_user) + (after.children_system - before.children_system),
+        'items': 1,
+        'rate': None,
+        'peak_mb': None,
+    }
+
+
+def missed_targets(results):
+    """Lines for the startup stages slower than STARTUP_TARGETS."""
+    return [
+        f"  {name:<28} {results[name]['wall']:9.3f} s, target {target:.3f} s"
+        for name, target in STARTUP_TARGETS.items()
+        if name in results and results[name]['wall'] > target
+    ]
+
+
+def run_benchmark(work_dir, images=2000, sets=4, ppk_rate=5.0, session_length=4 * 3600.0, exif_workers=None,
+                  trace_memory=True, with_map=True, with_startup=True):
+    """Generate a mission in work_dir, run every stage on it and return {stage: measurements}."""
+    # Keep caches, sidecars and maps inside the scratch directory while the stages run
+    key = 'XDG_CACHE_HOME' if os.name != 'nt' else 'LOCALAPPDATA'
+    previous = os.environ.get(key)
+    os.environ[key] = os.path.join(work_dir, 'cache')
+    try:
+        return _run_stages(work_dir, images, sets, ppk_rate, session_length, exif_workers, trace_memory, with_map, with_startup)
+    finally:
+        if previous is None:
+            del os.environ[key]
+        else:
+            os.environ[key] = previous
+
+
+def _run_stages(work_dir, images, sets, ppk_rate, session_length, exif_workers, trace_memory, with_map, with_startup):
+    results = {}
+    mission = make_mission(os.path.join(work_dir, 'mission'), images, sets, ppk_rate, session_length)
+    epochs = int(session_length * ppk_rate)
+    min_time_diff = max(1, int(mission['set_gap'] / 120))
+    cache = MetadataCache(os.path.join(work_dir, 'cache', 'bench.sqlite'))
+
+    def stage(name, items, fn, *args, **kwargs):
+        return run_stage(results, name, items, fn, *args, trace_memory=trace_memory, **kwargs)
+
+    image_sets = stage('analyze_images (cold)', images, analyze_images, mission['images'], min_time_diff, exif_workers, cache=cache)
+    stage('analyze_images (cached)', images, analyze_images, mission['images'], min_time_diff, exif_workers, cache=cache)
+    columns = load_images(mission['images'], exif_workers, cache=cache)
+    stage('segment (time gap)', images, columns.segment, min_time_diff)
+    stage('segment (alt + speed)', images, columns.segment, min_time_diff, max_alt_step=50, max_speed=30)
+    stage('set statistics', images, SetTable, image_sets, columns)
+    corrections = stage('load_corrections', sets, load_corrections, mission['corrections'])
+    shifts, _ = stage('match_corrections', sets, match_corrections, image_sets, corrections)
+
+    stage('load_ppk (parse)', epochs, load_ppk, mission['ppk'])
+    track = stage('load_ppk (sidecar)', epochs, load_ppk, mission['ppk'])
+    windows = image_windows(image_sets, 60)
+    stage('load_ppk (windowed)', epochs, load_ppk, mission['ppk'], use_sidecar=False, windows=windows)
+    stage('load_ppk (windowed sidecar)', epochs, load_ppk, mission['ppk'], windows=windows)
+
+    rows, _ = stage('geotag_images (linear)', images, geotag_images, image_sets, track)
+    stage('geotag_images (hermite)', images, geotag_images, image_sets, track, method='hermite')
+    stage('geotag_images (lever arm)', images, geotag_images, image_sets, track, method='hermite', lever_arm=(0.1, 0.0, 0.2), workers=exif_workers)
+
+    out_dir = os.path.join(work_dir, 'out')
+    os.makedirs(out_dir, exist_ok=True)
+    stage('write_geotags', images, write_geotags, os.path.join(out_dir, 'ppk.csv'), rows)
+    stage('write_sets', images, write_sets, os.path.join(out_dir, 'sets.csv'), image_sets, range(len(image_sets)), shifts)
+    geotags, _ = geotag_columns(image_sets, track)
+    for extension in EXPORT_FORMATS:
+        try:
+            stage(f"export {extension}", images, write_columns, os.path.join(out_dir, 'ppk' + extension), geotags)
+        except ImportError as e:
+            print(f"Skipping {extension} export: {e}")
+    positions = set_positions(image_sets, range(len(image_sets)), shifts)
+    stage('write_geotags_exif', images, write_geotags_exif, positions, os.path.join(out_dir, 'exif'), True, exif_workers)
+
+    if with_map:
+        try:
+            from shiftcore.mapview import render_map
+        except ImportError as e:
+            print(f"Skipping render_map: {e}")
+        else:
+            flat = [image for imageset in image_sets for image in imageset]
+            stage(
+                'render_map', images + epochs, render_map,
+                [dms_to_decimal(*image.lat) for image in flat], [dms_to_decimal(*image.lon) for image in flat],
+                [os.path.basename(image.path) for image in flat], track.lat, track.lon,
+            )
+
+    if with_startup:
+        for name, script in STARTUP_SCRIPTS.items():
+            run_startup(results, name, script)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each stage against the baseline, and the names of regressed stages."""
+    lines = []
+    regressions = []
+    for name, stage in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            lines.append(f"  {name:<28} new stage")
+            continue
+        ratio = stage['wall'] / reference['wall'] if reference['wall'] > 0 else float('inf')
+        regressed = ratio > 1 + tolerance and stage['wall'] - reference['wall'] > MIN_REGRESSION_SECONDS
+        if regressed:
+            regressions.append(name)
+        lines.append(f"  {name:<28} {reference['wall']:9.3f} s -> {stage['wall']:9.3f} s  x{ratio:5.2f}{'  REGRESSION' if regressed else ''}")
+    return lines, regressions
+
+
+def format_results(results):
+    """Table lines of the stage measurements."""
+    lines = [f"  {'stage':<28} {'wall s':>9} {'cpu s':>9} {'items/s':>12} {'peak MB':>9}"]
+    for name, stage in results.items():
+        rate = f"{stage['rate']:12.0f}" if stage['rate'] else f"{'-':>12}"
+        peak = f"{stage['peak_mb']:9.1f}" if stage['peak_mb'] is not None else f"{'-':>9}"
+        lines.append(f"  {name:<28} {stage['wall']:9.3f} {stage['cpu']:9.3f} {rate} {peak}")
+    return lines
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='shiftcore.benchmark', description="Benchmark the processing stages on a synthetic mission.")
+    parser.add_argument('--images', type=int, default=2000, help="number of synthetic images")
+    parser.add_argument('--sets', type=int, default=4, help="number of flights (image sets)")
+    parser.add_argument('--ppk-rate', type=float, default=5.0, help="PPK epochs per second")
+    parser.add_argument('--session-hours', type=float, default=4.0, help="length of the PPK session")
+    parser.add_argument('--exif-workers', type=int, default=None, help="EXIF reader/writer threads")
+    parser.add_argument('--work-dir', help="scratch directory (default: a temporary directory, removed afterwards)")
+    parser.add_argument('--no-memory', action='store_true', help="do not trace allocations (tracemalloc slows some stages)")
+    parser.add_argument('--no-map', action='store_true', help="skip the map stage")
+    parser.add_argument('--no-startup', action='store_true', help="skip the startup stages")
+    parser.add_argument('--save-baseline', metavar='FILE', help="store the results as a JSON baseline")
+    parser.add_argument('--baseline', metavar='FILE', help="compare against a JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown over the baseline (0.25 = 25%%)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = {
+        'version': BENCHMARK_VERSION,
+        'images': args.images,
+        'sets': args.sets,
+        'ppk_rate': args.ppk_rate,
+        'session_hours': args.session_hours,
+        'trace_memory': not args.no_memory,
+    }
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='shiftcore-bench-')
+    try:
+        results = run_benchmark(
+            work_dir, args.images, args.sets, args.ppk_rate, args.session_hours * 3600, args.exif_workers,
+            trace_memory=not args.no_memory, with_map=not args.no_map, with_startup=not args.no_startup,
+        )
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{args.images} images in {args.sets} sets, {args.ppk_rate:g} Hz PPK over {args.session_hours:g} h")
+    print('\n'.join(format_results(results)))
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        print(f"  peak RSS {max_rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10):.1f} MB")
+    missed = missed_targets(results)
+    if missed:
+        print("Startup slower than its target:")
+        print('\n'.join(missed))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump({'config': config, 'stages': results}, file, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('config') != config:
+            print(f"warning: baseline was recorded with {baseline.get('config')}")
+        lines, regressions = compare(results, baseline.get('stages', {}), args.tolerance)
+        print(f"Against {args.baseline}:")
+        print('\n'.join(lines))
+        if regressions:
+            print(f"{len(regressions)} stages regressed by more than {args.tolerance:.0%}", file=sys.stderr)
+            return 1
+    return 1 if missed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
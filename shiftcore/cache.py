@@ -0,0 +1,106 @@
+"""Persistent EXIF metadata cache.
+
+Image records are stored in a SQLite database keyed by absolute path and
+validated against the file size and modification time, so re-importing a
+folder only re-reads images that are new or have changed.
+"""
+import os
+import sqlite3
+
+from shiftcore.records import ImageRecord
+
+SCHEMA_VERSION = 3
+
+
+def cache_dir():
+    """The per-user cache directory of the app."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ShiftApp')
+
+
+def default_cache_path():
+    """Location of the cache database in the per-user cache directory."""
+    return os.path.join(cache_dir(), 'exif_cache.sqlite')
+
+
+def _folder_range(folder_path):
+    """Key range (lower, upper) covering every path below folder_path."""
+    prefix = os.path.join(os.path.abspath(folder_path), '')
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class MetadataCache:
+    """EXIF records cached on disk, keyed by path, size and mtime."""
+
+    def __init__(self, path=None):
+        self.path = path or default_cache_path()
+
+    def _connect(self):
+        # A fresh connection per operation keeps the cache usable from worker threads
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS images')
+            conn.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS images ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+            'lat_d REAL, lat_m REAL, lat_s REAL, lon_d REAL, lon_m REAL, lon_s REAL, '
+            'alt REAL, timestamp REAL, error TEXT)'
+        )
+        return conn
+
+    def load_folder(self, folder_path):
+        """All cached entries below folder_path as {abs path: (size, mtime_ns, record, error)}."""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT * FROM images WHERE path >= ? AND path < ?', _folder_range(folder_path))
+            entries = {}
+            for path, size, mtime_ns, lat_d, lat_m, lat_s, lon_d, lon_m, lon_s, alt, timestamp, error in rows:
+                record = None if error else ImageRecord(path, (lat_d, lat_m, lat_s), (lon_d, lon_m, lon_s), alt, timestamp)
+                entries[path] = (size, mtime_ns, record, error)
+            return entries
+        finally:
+            conn.close()
+
+    def update_folder(self, folder_path, entries, keep_paths):
+        """Store new or changed entries and evict cached paths below folder_path not in keep_paths.
+
+        ``entries`` is an iterable of (abs path, size, mtime_ns, record, error).
+        """
+        rows = []
+        for path, size, mtime_ns, record, error in entries:
+            if record is None:
+                rows.append((path, size, mtime_ns) + (None,) * 8 + (error,))
+            else:
+                rows.append((path, size, mtime_ns) + tuple(record.lat) + tuple(record.lon) + (record.alt, record.timestamp, None))
+        conn = self._connect()
+        try:
+            with conn:
+                stale = [
+                    (path,) for (path,) in conn.execute('SELECT path FROM images WHERE path >= ? AND path < ?', _folder_range(folder_path))
+                    if path not in keep_paths
+                ]
+                conn.executemany('DELETE FROM images WHERE path = ?', stale)
+                conn.executemany('INSERT OR REPLACE INTO images VALUES (%s)' % ', '.join('?' * 12), rows)
+        finally:
+            conn.close()
+
+    def invalidate(self, folder_path=None):
+        """Drop the cached entries below folder_path, or the whole cache."""
+        if not os.path.exists(self.path):
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                if folder_path is None:
+                    conn.execute('DELETE FROM images')
+                else:
+                    conn.execute('DELETE FROM images WHERE path >= ? AND path < ?', _folder_range(folder_path))
+            if folder_path is None:
+                conn.execute('VACUUM')
+        finally:
+            conn.close()
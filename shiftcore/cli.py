@@ -0,0 +1,122 @@
+"""Headless batch mode: import, correct, PPK-geotag and export flight folders.
+
+Example::
+
+    python -m shiftcore flight1 flight2 --ppk base.csv --corrections transforms.csv -o out --jobs 4
+
+Each folder is processed as an independent mission; missions run
+concurrently in a process pool. Nothing here imports Qt.
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from shiftcore.cache import MetadataCache
+from shiftcore.export import FORMAT_NAMES
+from shiftcore.instrument import measure, setup_logging
+from shiftcore.interpolation import INTERPOLATION_METHODS
+from shiftcore.pipeline import MissionOptions, image_windows, load_images, process_images
+from shiftcore.ppk import load_ppk
+from shiftcore.timestamps import GPS_UTC_LEAP_SECONDS
+
+log = logging.getLogger(__name__)
+
+
+def process_mission(folder_path, output_dir, ppk_file=None, options=None):
+    """Run the full pipeline for one flight folder and return a summary line.
+
+    ``options`` is a shiftcore.pipeline.MissionOptions (defaults when None).
+    The folder's images are read (through the EXIF cache unless
+    options.use_cache is False) and, with ppk_file, geotagged from that log;
+    see process_images. The mission is named after the folder and every
+    stage is timed and logged.
+    """
+    options = options or MissionOptions()
+    name = os.path.basename(os.path.normpath(folder_path))
+    profile_path = os.path.join(options.profile_dir, f"{name}.prof") if options.profile_dir else None
+    with measure(f"{name}/mission", profile_path):
+        return _process_mission(name, folder_path, output_dir, ppk_file, options)
+
+
+def _process_mission(name, folder_path, output_dir, ppk_file, options):
+    cache = MetadataCache() if options.use_cache else None
+    with measure(f"{name}/import"):
+        columns = load_images(folder_path, options.exif_workers, options.exif_processes, cache=cache, leap_seconds=options.leap_seconds)
+
+    def tracks(image_sets):
+        # One log for the whole folder, loaded around the image sets
+        windows = image_windows(image_sets, options.ppk_margin, options.time_offset) if options.ppk_margin is not None else None
+        with measure(f"{name}/ppk"):
+            track = load_ppk(ppk_file, use_sidecar=options.use_cache, windows=windows)
+        yield np.arange(len(columns)), track
+
+    return process_images(name, columns, output_dir, tracks if ppk_file else None, options)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='shiftcore', description="Batch-process DJI flight folders without the GUI.")
+    parser.add_argument('folders', nargs='+', help="image folders, one mission each")
+    parser.add_argument('--ppk', action='append', default=[], help="PPK CSV; give once for all folders or once per folder")
+    parser.add_argument('--corrections', help="transforms CSV applied to every mission")
+    parser.add_argument('-o', '--output-dir', default='.', help="directory for the exported CSVs")
+    parser.add_argument('--min-time-diff', type=int, default=20, help="minutes between images that start a new set")
+    parser.add_argument('--max-alt-step', type=float, default=None, help="also start a new set where the altitude jumps by more than this many metres")
+    parser.add_argument('--max-speed', type=float, default=None, help="also start a new set where the ground speed between images exceeds this many m/s")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="missions processed in parallel (default: CPU count)")
+    parser.add_argument('--exif-workers', type=int, default=None, help="EXIF reader threads per mission")
+    parser.add_argument('--exif-processes', action='store_true', help="read EXIF in worker processes instead of threads")
+    parser.add_argument('--ppk-margin', type=float, default=60, help="seconds of PPK kept before and after each image set")
+    parser.add_argument('--time-offset', type=float, default=0.0, help="seconds added to the camera clock to reach the PPK time base (time zone, GPS-UTC leap seconds)")
+    parser.add_argument('--leap-seconds', type=int, default=GPS_UTC_LEAP_SECONDS, help="GPS-UTC leap seconds removed from DJI MRK trigger times (0 for a PPK log in GPS time)")
+    parser.add_argument('--interpolation', choices=INTERPOLATION_METHODS, default='linear', help="PPK interpolation: linear on lat/lon or a cubic Hermite spline in a local ENU frame")
+    parser.add_argument('--lever-arm', type=float, nargs=3, metavar=('FORWARD', 'RIGHT', 'DOWN'), help="antenna-to-camera offset in metres, rotated by the XMP flight attitude")
+    parser.add_argument('--max-gap', type=float, default=None, help="flag images whose bracketing PPK epochs are more than this many seconds apart")
+    parser.add_argument('--skip-flagged', action='store_true', help="leave out images with gapped or non-fixed PPK epochs instead of flagging them")
+    parser.add_argument('--full-ppk', action='store_true', help="load the whole PPK log instead of the image time windows")
+    parser.add_argument('--write-exif', metavar='DIR', help="also write the positions into copies of the images under DIR/<folder name>")
+    parser.add_argument('--format', action='append', choices=FORMAT_NAMES, help="export format, repeatable (default: csv); parquet and feather need pyarrow")
+    parser.add_argument('--xmp', action='store_true', help="with --write-exif, also update the DJI drone-dji XMP position tags")
+    parser.add_argument('--log-file', help="log file (default: shiftapp.log in the user cache directory)")
+    parser.add_argument('--profile', metavar='DIR', help="save a cProfile of each mission to DIR/<folder name>.prof")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the EXIF metadata cache or the PPK sidecar")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if len(args.ppk) not in (0, 1, len(args.folders)):
+        print("error: give --ppk once, or once per folder", file=sys.stderr)
+        return 2
+    ppk_files = args.ppk * len(args.folders) if len(args.ppk) == 1 else args.ppk or [None] * len(args.folders)
+    os.makedirs(args.output_dir, exist_ok=True)
+    log_file = setup_logging(args.log_file, console=True)
+
+    options = MissionOptions(
+        corrections_file=args.corrections, min_time_diff=args.min_time_diff, max_alt_step=args.max_alt_step,
+        max_speed=args.max_speed, exif_workers=args.exif_workers, exif_processes=args.exif_processes,
+        use_cache=not args.no_cache, ppk_margin=None if args.full_ppk else args.ppk_margin, time_offset=args.time_offset,
+        leap_seconds=args.leap_seconds, method=args.interpolation, lever_arm=args.lever_arm or (0.0, 0.0, 0.0),
+        max_gap=args.max_gap, skip_flagged=args.skip_flagged, formats=args.format or ['csv'],
+        exif_dir=args.write_exif, xmp=args.xmp, profile_dir=args.profile,
+    )
+
+    failures = 0
+    # Missions log to the same file; only this process rotates it
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=partial(setup_logging, log_file, console=True, rotate=False)) as executor:
+        futures = [
+            executor.submit(process_mission, folder, args.output_dir, ppk_file, options)
+            for folder, ppk_file in zip(args.folders, ppk_files)
+        ]
+        for folder, future in zip(args.folders, futures):
+            try:
+                print(future.result())
+            except Exception as e:
+                failures += 1
+                log.error("%s: failed: %s", folder, e)
+    log.info("Log written to %s", log_file)
+    return 1 if failures else 0
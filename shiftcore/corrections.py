@@ -0,0 +1,46 @@
+"""Interval-indexed lookup of base-station corrections.
+
+Correction rows are parsed once, grouped by date and sorted by time, so the
+correction applying to an image set is found with a bisect regardless of
+the order of rows in the transforms file.
+"""
+import logging
+from bisect import bisect_left
+
+from shiftcore.instrument import record
+from shiftcore.timestamps import correction_epoch
+
+log = logging.getLogger(__name__)
+
+DAY = 86400
+
+
+class CorrectionIndex:
+    """Transforms CSV rows indexed by date, then time."""
+
+    def __init__(self, corrections):
+        self.point_ids = {c['Point Id'] for c in corrections}
+        parsed = {}
+        for correction in corrections:
+            try:
+                corr_time = correction_epoch(correction['Date/Time'])
+            except ValueError as e:
+                log.warning("Error parsing correction date: %s", e)
+                record(errors=1)
+                continue  # Skip this correction if parsing fails
+            parsed.setdefault(corr_time // DAY, []).append((corr_time, correction))
+
+        # Stable sort keeps file order among corrections sharing a timestamp
+        self._by_date = {}
+        for day, entries in parsed.items():
+            entries.sort(key=lambda entry: entry[0])
+            self._by_date[day] = ([when for when, _ in entries], [correction for _, correction in entries])
+
+    def __len__(self):
+        return len(self.point_ids)
+
+    def lookup(self, timestamp):
+        """The latest correction on the same date as the epoch-second timestamp and strictly before it, or None."""
+        times, corrections = self._by_date.get(timestamp // DAY, ((), ()))
+        i = bisect_left(times, timestamp) - 1
+        return corrections[i] if i >= 0 else None
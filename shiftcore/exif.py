@@ -0,0 +1,306 @@
+"""Header-only EXIF extraction and concurrent folder scanning.
+
+Only the APP1/EXIF segment of each JPEG (or the eXIf chunk of a PNG) is read
+and decoded, so no image object is ever constructed and the pixel data is
+never touched.
+"""
+import logging
+import multiprocessing
+import os
+import re
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from shiftcore.instrument import record
+from shiftcore.progress import check_cancelled
+from shiftcore.records import ImageRecord
+from shiftcore.timestamps import image_epoch
+
+log = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+_EXIF_IFD_POINTER = 0x8769
+_GPS_IFD_POINTER = 0x8825
+_DATETIME_ORIGINAL = 0x9003
+_SUBSEC_TIME_ORIGINAL = 0x9291
+_GPS_LATITUDE_REF = 0x0001
+_GPS_LATITUDE = 0x0002
+_GPS_LONGITUDE_REF = 0x0003
+_GPS_LONGITUDE = 0x0004
+_GPS_ALTITUDE_REF = 0x0005
+_GPS_ALTITUDE = 0x0006
+
+# TIFF field type -> (struct code, size in bytes)
+_FIELD_TYPES = {
+    1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4), 5: ('LL', 8),
+    7: ('s', 1), 9: ('l', 4), 10: ('ll', 8), 13: ('L', 4),
+}
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_EXIF_HEADER = b'Exif\x00\x00'
+_XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+
+# DJI airframe attitude tags. A nadir camera's gimbal pitch is about -90 degrees,
+# so of the gimbal angles only the yaw can stand in for the airframe's
+_FLIGHT_ATTITUDE_TAGS = ('FlightYawDegree', 'FlightPitchDegree', 'FlightRollDegree')
+_GIMBAL_YAW_TAG = 'GimbalYawDegree'
+_XMP_VALUE = re.compile(rb'drone-dji:(\w+)(?:="|>)\s*([-+0-9.eE]+)')
+
+
+def _read_jpeg_app1(file, header):
+    """Return the payload of the first APP1 segment starting with header, reading only segment headers."""
+    if file.read(2) != b'\xff\xd8':
+        return None
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        # Skip fill bytes between segments
+        while marker[1] == 0xFF:
+            byte = file.read(1)
+            if not byte:
+                raise ValueError("truncated JPEG header")
+            marker = marker[1:] + byte
+        if marker[1] in (0xD9, 0xDA):  # EOI or start of scan: no more metadata
+            return None
+        length = struct.unpack('>H', file.read(2))[0]
+        if marker[1] == 0xE1:
+            payload = file.read(length - 2)
+            if payload.startswith(header):
+                return payload[len(header):]
+        else:
+            file.seek(length - 2, os.SEEK_CUR)
+
+
+def _read_jpeg_exif(file):
+    """Return the TIFF payload of the APP1/EXIF segment."""
+    return _read_jpeg_app1(file, _EXIF_HEADER)
+
+
+def _read_png_exif(file):
+    """Return the payload of the PNG eXIf chunk, seeking over all other chunks."""
+    if file.read(8) != _PNG_SIGNATURE:
+        return None
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'eXIf':
+            return file.read(length)
+        if chunk_type in (b'IDAT', b'IEND'):
+            return None
+        file.seek(length + 4, os.SEEK_CUR)  # chunk data + CRC
+
+
+def read_exif_segment(filename):
+    """Return the raw TIFF-structured EXIF bytes of an image, or None."""
+    with open(filename, 'rb') as file:
+        if filename.lower().endswith('.png'):
+            return _read_png_exif(file)
+        return _read_jpeg_exif(file)
+
+
+def _read_ifd(tiff, offset, order):
+    """Decode one IFD into a {tag: value} dict."""
+    entries = {}
+    count = struct.unpack_from(order + 'H', tiff, offset)[0]
+    for i in range(count):
+        tag, field_type, value_count, value_offset = struct.unpack_from(order + 'HHL4s', tiff, offset + 2 + i * 12)
+        if field_type not in _FIELD_TYPES:
+            continue
+        code, size = _FIELD_TYPES[field_type]
+        total = size * value_count
+        data = value_offset if total <= 4 else tiff[struct.unpack(order + 'L', value_offset)[0]:][:total]
+        if code == 's':
+            entries[tag] = data[:total].split(b'\x00', 1)[0].decode('ascii', 'replace')
+        elif len(code) == 2:
+            values = struct.unpack(order + code * value_count, data)
+            entries[tag] = tuple(num / den if den else float('nan') for num, den in zip(values[::2], values[1::2]))
+        else:
+            entries[tag] = struct.unpack(order + code * value_count, data[:total])
+    return entries
+
+
+def _signed(value, negative):
+    """The tag value, negated (every component of a tuple) when its ref tag says so."""
+    if value is None or not negative:
+        return value
+    if isinstance(value, tuple):
+        return tuple(-component for component in value)
+    return -value
+
+
+def parse_exif(tiff):
+    """Decode DateTimeOriginal, SubSecTimeOriginal and the GPS position tags from TIFF-structured EXIF bytes.
+
+    EXIF stores the position as absolute values with S/W and below sea
+    level refs; the returned latitude, longitude and altitude carry the sign.
+    """
+    order = {b'II': '<', b'MM': '>'}[tiff[:2]]
+    ifd0 = _read_ifd(tiff, struct.unpack_from(order + 'L', tiff, 4)[0], order)
+    exif_ifd = {}
+    gps_ifd = {}
+    if _EXIF_IFD_POINTER in ifd0:
+        exif_ifd = _read_ifd(tiff, ifd0[_EXIF_IFD_POINTER][0], order)
+    if _GPS_IFD_POINTER in ifd0:
+        gps_ifd = _read_ifd(tiff, ifd0[_GPS_IFD_POINTER][0], order)
+    return {
+        'DateTimeOriginal': exif_ifd.get(_DATETIME_ORIGINAL),
+        'SubSecTimeOriginal': exif_ifd.get(_SUBSEC_TIME_ORIGINAL),
+        'GPSLatitude': _signed(gps_ifd.get(_GPS_LATITUDE), gps_ifd.get(_GPS_LATITUDE_REF, '').upper() == 'S'),
+        'GPSLongitude': _signed(gps_ifd.get(_GPS_LONGITUDE), gps_ifd.get(_GPS_LONGITUDE_REF, '').upper() == 'W'),
+        'GPSAltitude': _signed(gps_ifd.get(_GPS_ALTITUDE, (None,))[0], gps_ifd.get(_GPS_ALTITUDE_REF, (0,))[0] == 1),
+    }
+
+
+def read_image_record(full_path, tiff=None):
+    """Return the ImageRecord of one image, parsing its capture time once.
+
+    ``tiff`` is the image's EXIF segment when it has already been read.
+    """
+    if tiff is None:
+        tiff = read_exif_segment(full_path)
+    exif_data = parse_exif(tiff) if tiff else {}
+    date, time_ = (exif_data.get('DateTimeOriginal') or ' ').split()
+    latitude = exif_data.get('GPSLatitude') or (0, 0, 0)
+    longitude = exif_data.get('GPSLongitude') or (0, 0, 0)
+    altitude = exif_data.get('GPSAltitude')
+    timestamp = image_epoch(date, time_, exif_data.get('SubSecTimeOriginal'))
+    return ImageRecord(full_path, latitude, longitude, altitude if altitude is not None else 0, timestamp)
+
+
+def read_attitude(full_path):
+    """(yaw, pitch, roll) degrees of the airframe from the DJI drone-dji XMP tags of a JPEG, or None.
+
+    Without airframe tags the gimbal yaw is returned with NaN pitch and roll.
+    """
+    with open(full_path, 'rb') as file:
+        packet = _read_jpeg_app1(file, _XMP_HEADER)
+    if not packet:
+        return None
+    values = {name.decode('ascii'): value for name, value in _XMP_VALUE.findall(packet)}
+    if all(tag in values for tag in _FLIGHT_ATTITUDE_TAGS):
+        return tuple(float(values[tag]) for tag in _FLIGHT_ATTITUDE_TAGS)
+    if _GIMBAL_YAW_TAG in values:
+        return float(values[_GIMBAL_YAW_TAG]), float('nan'), float('nan')
+    return None
+
+
+def _attitude_one(full_path):
+    try:
+        return read_attitude(full_path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def read_attitudes(paths, workers=None):
+    """(N, 3) yaw, pitch, roll array in degrees for the given images, NaN rows where no attitude is tagged.
+
+    Rows with only a gimbal yaw have NaN pitch and roll (see read_attitude).
+    """
+    attitudes = np.full((len(paths), 3), np.nan)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, attitude in enumerate(executor.map(_attitude_one, paths)):
+            if attitude:
+                attitudes[i] = attitude
+    return attitudes
+
+
+def _scan_one(full_path):
+    """Pool task: return (record, None, bytes read) or (None, error message, 0)."""
+    try:
+        tiff = read_exif_segment(full_path)
+        return read_image_record(full_path, tiff or b''), None, len(tiff or b'')
+    except Exception as e:
+        return None, f"Error processing {full_path}: {e}", 0
+
+
+def list_images(folder_path):
+    """All image paths below folder_path."""
+    paths = []
+    for root, dirs, files in os.walk(folder_path):
+        for filename in files:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+    return paths
+
+
+def scan_images(folder_path, workers=None, use_processes=False, cache=None, progress=None, cancelled=None):
+    """Read the EXIF record of every image below folder_path concurrently.
+
+    ``workers`` sets the pool size (None lets the executor choose) and
+    ``use_processes`` swaps the thread pool for a process pool. When a
+    MetadataCache is given, only new or changed files are read.
+    ``progress(done, total)`` is called as files complete, and the scan
+    raises Cancelled as soon as ``cancelled()`` returns True.
+    """
+    paths = list_images(folder_path)
+    start = time.perf_counter()
+    records = []
+    pending = paths
+    if cache is not None:
+        cached = cache.load_folder(folder_path)
+        stats = {}
+        pending = []
+        for path in paths:
+            st = os.stat(path)
+            key = os.path.abspath(path)
+            stats[path] = (key, st.st_size, st.st_mtime_ns)
+            entry = cached.get(key)
+            if entry is None or entry[:2] != (st.st_size, st.st_mtime_ns):
+                pending.append(path)
+            elif entry[3]:
+                log.warning(entry[3])
+                record(errors=1)
+            else:
+                cached_record = entry[2]
+                cached_record.path = path
+                records.append(cached_record)
+
+    done = len(paths) - len(pending)
+    if progress:
+        progress(done, len(paths))
+    results = []
+    bytes_read = 0
+    if pending:
+        if use_processes:
+            # Spawned rather than forked, as the GUI scans from a worker thread
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            chunksize = max(1, len(pending) // ((workers or os.cpu_count() or 1) * 4)) if use_processes else 1
+            for image, error, size in executor.map(_scan_one, pending, chunksize=chunksize):
+                results.append((image, error))
+                bytes_read += size
+                done += 1
+                if progress:
+                    progress(done, len(paths))
+                check_cancelled(cancelled)
+        finally:
+            executor.shutdown(cancel_futures=True)
+    errors = 0
+    for image, error in results:
+        if error:
+            log.warning(error)
+            errors += 1
+        else:
+            records.append(image)
+    record(files=len(paths), bytes_read=bytes_read, errors=errors)
+
+    if cache is not None:
+        cache.update_folder(
+            folder_path,
+            [stats[path] + result for path, result in zip(pending, results)],
+            {key for key, size, mtime_ns in stats.values()},
+        )
+
+    elapsed = time.perf_counter() - start
+    rate = len(paths) / elapsed if elapsed > 0 else float('inf')
+    log.info("Scanned %d images (%d read, %d cached) in %.2f s (%.1f files/s)", len(paths), len(pending), len(paths) - len(pending), elapsed, rate)
+    return records
@@ -0,0 +1,297 @@
+"""Write geotags into JPEG metadata without touching the pixel data.
+
+Only the segments before the start of scan are decoded. The GPSInfo IFD is
+patched in place when it already holds the position tags (DJI images always
+do); otherwise a new GPS IFD is appended inside the APP1 segment, and for
+images without one IFD0 is rebuilt there too with a pointer to it. With
+``xmp=True`` the DJI ``drone-dji`` position attributes are updated too, using
+the XMP packet padding to keep the segment size unchanged where possible.
+
+Every image is written to a temporary file next to its destination and
+moved into place with os.replace, so an interrupted run never leaves a
+half-written image. When every segment keeps its size, the original is
+copied and only the patched metadata range is written into the copy.
+Copies into an output folder keep their path relative to the images'
+common folder, so equal names in different folders (DJI's 100MEDIA,
+101MEDIA, ...) do not overwrite each other.
+"""
+import os
+import re
+import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from shiftcore.instrument import record
+from shiftcore.progress import check_cancelled
+
+_EXIF_HEADER = b'Exif\x00\x00'
+_XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+_MPF_HEADER = b'MPF\x00'
+_GPS_IFD_POINTER = 0x8825
+_GPS_VERSION = 0
+
+_ASCII, _BYTE, _LONG, _RATIONAL = 2, 1, 4, 5
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8, 13: 4}
+
+_XMP_TAGS = {
+    b'GpsLatitude': 'lat',
+    b'GpsLongitude': 'lon',
+    b'GpsLongtitude': 'lon',  # spelling used by several DJI firmwares
+    b'AbsoluteAltitude': 'alt',
+}
+_XMP_ATTRIBUTE = re.compile(rb'(drone-dji:(\w+)=")([^"]*)(")')
+_XMP_ELEMENT = re.compile(rb'(<drone-dji:(\w+)>)([^<]*)(</drone-dji:\2>)')
+_XMP_PADDING = re.compile(rb'(\s*)(<\?xpacket end=)')
+
+
+def _read_header(path):
+    """Return ([marker, offset, payload], sos_offset) for every segment before the start of scan."""
+    segments = []
+    with open(path, 'rb') as file:
+        if file.read(2) != b'\xff\xd8':
+            raise ValueError("not a JPEG file")
+        while True:
+            offset = file.tell()
+            marker = file.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                raise ValueError("corrupt JPEG header")
+            if marker[1] in (0xDA, 0xD9):
+                return segments, offset
+            length = struct.unpack('>H', file.read(2))[0]
+            segments.append([marker[1], offset, file.read(length - 2)])
+
+
+def _rational_dms(value):
+    """Degrees, minutes, seconds rationals for an absolute decimal angle."""
+    # Round once in micro-arcseconds so rounded seconds carry into the minutes
+    degrees, rest = divmod(round(abs(value) * 3600 * 1000000), 3600 * 1000000)
+    minutes, seconds = divmod(rest, 60 * 1000000)
+    return [(degrees, 1), (minutes, 1), (seconds, 1000000)]
+
+
+def _gps_entries(lat, lon, alt):
+    """{tag: (type, count, values)} of the GPS position tags."""
+    return {
+        1: (_ASCII, 2, b'N\x00' if lat >= 0 else b'S\x00'),
+        2: (_RATIONAL, 3, _rational_dms(lat)),
+        3: (_ASCII, 2, b'E\x00' if lon >= 0 else b'W\x00'),
+        4: (_RATIONAL, 3, _rational_dms(lon)),
+        5: (_BYTE, 1, b'\x00' if alt >= 0 else b'\x01'),
+        6: (_RATIONAL, 1, [(round(abs(alt) * 1000), 1000)]),
+    }
+
+
+def _pack_value(order, field_type, values):
+    if field_type == _RATIONAL:
+        return b''.join(struct.pack(order + 'LL', num, den) for num, den in values)
+    return values
+
+
+def _append_ifd(tiff, order, entries, next_ifd=0):
+    """Append an IFD of {tag: (type, count, data)} to the tiff bytearray and return its offset.
+
+    Data of up to 4 bytes is the entry's value field; longer data is stored
+    after the table.
+    """
+    start = len(tiff) + (len(tiff) % 2)
+    data_area = start + 2 + 12 * len(entries) + 4
+    table = bytearray(struct.pack(order + 'H', len(entries)))
+    extra = bytearray()
+    for tag in sorted(entries):
+        field_type, count, data = entries[tag]
+        if len(data) <= 4:
+            table += struct.pack(order + 'HHL', tag, field_type, count) + data.ljust(4, b'\x00')
+        else:
+            table += struct.pack(order + 'HHLL', tag, field_type, count, data_area + len(extra))
+            extra += data + b'\x00' * (len(data) % 2)
+    table += struct.pack(order + 'L', next_ifd)
+    tiff += b'\x00' * (start - len(tiff)) + table + extra
+    return start
+
+
+def _patch_tiff(tiff, lat, lon, alt):
+    """Return the TIFF bytes with the GPS position tags set."""
+    order = {b'II': '<', b'MM': '>'}[bytes(tiff[:2])]
+    tiff = bytearray(tiff)
+    ifd0 = struct.unpack_from(order + 'L', tiff, 4)[0]
+    ifd0_count = struct.unpack_from(order + 'H', tiff, ifd0)[0]
+    pointer_entry = None
+    for i in range(ifd0_count):
+        entry = ifd0 + 2 + i * 12
+        if struct.unpack_from(order + 'H', tiff, entry)[0] == _GPS_IFD_POINTER:
+            pointer_entry = entry
+
+    existing = {}
+    if pointer_entry is not None:
+        gps_ifd = struct.unpack_from(order + 'L', tiff, pointer_entry + 8)[0]
+        for i in range(struct.unpack_from(order + 'H', tiff, gps_ifd)[0]):
+            entry = gps_ifd + 2 + i * 12
+            tag, field_type, count = struct.unpack_from(order + 'HHL', tiff, entry)
+            size = _TYPE_SIZES.get(field_type, 1) * count
+            data_offset = entry + 8 if size <= 4 else struct.unpack_from(order + 'L', tiff, entry + 8)[0]
+            existing[tag] = (field_type, count, data_offset, size)
+
+    new_entries = _gps_entries(lat, lon, alt)
+    if all(tag in existing and existing[tag][:2] == entry[:2] for tag, entry in new_entries.items()):
+        # Same types and counts: overwrite the values where they are
+        for tag, (field_type, count, values) in new_entries.items():
+            data = _pack_value(order, field_type, values)
+            data_offset = existing[tag][2]
+            tiff[data_offset:data_offset + len(data)] = data
+        return bytes(tiff)
+
+    # Otherwise append a rebuilt GPS IFD, keeping the other GPS tags, and repoint IFD0 at it
+    raw = {tag: (field_type, count, bytes(tiff[data_offset:data_offset + size])) for tag, (field_type, count, data_offset, size) in existing.items()}
+    raw.setdefault(_GPS_VERSION, (_BYTE, 4, b'\x02\x03\x00\x00'))
+    for tag, (field_type, count, values) in new_entries.items():
+        raw[tag] = (field_type, count, _pack_value(order, field_type, values))
+    gps_ifd = _append_ifd(tiff, order, raw)
+    if pointer_entry is not None:
+        struct.pack_into(order + 'L', tiff, pointer_entry + 8, gps_ifd)
+        return bytes(tiff)
+
+    # No GPS IFD yet: append a copy of IFD0 with a pointer entry added. Its value
+    # fields are copied as they are, so data they point to stays where it is.
+    entries = {}
+    for i in range(ifd0_count):
+        entry = ifd0 + 2 + i * 12
+        tag, field_type, count = struct.unpack_from(order + 'HHL', tiff, entry)
+        entries[tag] = (field_type, count, bytes(tiff[entry + 8:entry + 12]))
+    entries[_GPS_IFD_POINTER] = (_LONG, 1, struct.pack(order + 'L', gps_ifd))
+    next_ifd = struct.unpack_from(order + 'L', tiff, ifd0 + 2 + ifd0_count * 12)[0]
+    struct.pack_into(order + 'L', tiff, 4, _append_ifd(tiff, order, entries, next_ifd))
+    return bytes(tiff)
+
+
+def _patch_xmp(packet, lat, lon, alt):
+    """Return the XMP packet with the drone-dji position values replaced, keeping its size if the padding allows."""
+    values = {'lat': f"{lat:+.9f}", 'lon': f"{lon:+.9f}", 'alt': f"{alt:+.3f}"}
+
+    def replace(match):
+        key = _XMP_TAGS.get(match.group(2))
+        if key is None:
+            return match.group(0)
+        return match.group(1) + values[key].encode('ascii') + match.group(4)
+
+    patched = _XMP_ELEMENT.sub(replace, _XMP_ATTRIBUTE.sub(replace, packet))
+    growth = len(patched) - len(packet)
+    padding = _XMP_PADDING.search(patched)
+    if growth and padding and len(padding.group(1)) - growth >= 1:
+        whitespace = padding.group(1)
+        whitespace = whitespace[:len(whitespace) - growth] if growth > 0 else whitespace + b' ' * -growth
+        patched = patched[:padding.start()] + whitespace + patched[padding.start(2):]
+    return patched
+
+
+def _assemble(segments):
+    return b''.join(b'\xff' + bytes([marker]) + struct.pack('>H', len(payload) + 2) + payload for marker, offset, payload in segments)
+
+
+def write_image_geotag(src, dst, lat, lon, alt, xmp=False):
+    """Write the position into the metadata of src, saving the result to dst (which may be src)."""
+    segments, sos_offset = _read_header(src)
+    changed = []
+    mpf_index = None
+    for index, segment in enumerate(segments):
+        marker, offset, payload = segment
+        if marker == 0xE1 and payload.startswith(_EXIF_HEADER):
+            new_payload = _EXIF_HEADER + _patch_tiff(payload[len(_EXIF_HEADER):], lat, lon, alt)
+        elif xmp and marker == 0xE1 and payload.startswith(_XMP_HEADER):
+            new_payload = _XMP_HEADER + _patch_xmp(payload[len(_XMP_HEADER):], lat, lon, alt)
+        else:
+            if marker == 0xE2 and payload.startswith(_MPF_HEADER) and mpf_index is None:
+                mpf_index = index
+            continue
+        if len(new_payload) + 2 > 0xFFFF:
+            raise ValueError("metadata segment would exceed 64 KB")
+        changed.append((index, len(new_payload) != len(payload)))
+        segment[2] = new_payload
+    if not changed:
+        raise ValueError("image has no EXIF segment")
+
+    resized = any(grown for index, grown in changed)
+    if mpf_index is not None and any(grown and index > mpf_index for index, grown in changed):
+        raise ValueError("resizing metadata after the MPF segment would break the embedded preview")
+    temp_path = dst + '.tmp'
+    try:
+        if not resized:
+            # Same-size patch: copy the image and write the changed metadata range into the copy
+            first = segments[changed[0][0]][1]
+            region = _assemble(segments[changed[0][0]:changed[-1][0] + 1])
+            shutil.copyfile(src, temp_path)
+            with open(temp_path, 'r+b') as file:
+                file.seek(first)
+                file.write(region)
+        else:
+            with open(src, 'rb') as source, open(temp_path, 'wb') as target:
+                target.write(b'\xff\xd8' + _assemble(segments))
+                source.seek(sos_offset)
+                shutil.copyfileobj(source, target, 1024 * 1024)
+        shutil.copymode(src, temp_path)
+        os.replace(temp_path, dst)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _write_one(task):
+    """Pool task: return None or an error message."""
+    src, dst, lat, lon, alt, xmp = task
+    try:
+        write_image_geotag(src, dst, lat, lon, alt, xmp)
+    except Exception as e:
+        return f"Error geotagging {src}: {e}"
+
+
+def _output_paths(paths, output_dir):
+    """Destination of each image in output_dir, at its path relative to the images' common folder."""
+    if not paths:
+        return []
+    paths = [os.path.abspath(path) for path in paths]
+    try:
+        root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    except ValueError:  # images on different drives
+        return [os.path.join(output_dir, os.path.basename(path)) for path in paths]
+    return [os.path.join(output_dir, os.path.relpath(path, root)) for path in paths]
+
+
+def write_geotags_exif(rows, output_dir=None, xmp=False, workers=None, progress=None, cancelled=None):
+    """Write [path, lat, lon, alt] rows into the images' GPS tags on a thread pool.
+
+    Images are patched in place, or written as copies into output_dir (see
+    _output_paths). Rows whose destination another row also writes are not
+    written and reported as errors. Returns (written, errors) where errors
+    lists one message per failed image.
+    """
+    rows = list(rows)
+    destinations = _output_paths([row[0] for row in rows], output_dir) if output_dir else [row[0] for row in rows]
+    counts = {}
+    for dst in destinations:
+        key = os.path.normcase(os.path.abspath(dst))
+        counts[key] = counts.get(key, 0) + 1
+    errors = []
+    tasks = []
+    for (path, lat, lon, alt), dst in zip(rows, destinations):
+        if counts[os.path.normcase(os.path.abspath(dst))] > 1:
+            errors.append(f"Error geotagging {path}: {dst} is also written for another image")
+        else:
+            tasks.append((path, dst, lat, lon, alt, xmp))
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        for folder in {os.path.dirname(task[1]) for task in tasks}:
+            os.makedirs(folder, exist_ok=True)
+    done = len(errors)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for error in executor.map(_write_one, tasks):
+            done += 1
+            if error:
+                errors.append(error)
+            if progress:
+                progress(done, len(rows))
+            check_cancelled(cancelled)
+    finally:
+        executor.shutdown(cancel_futures=True)
+    record(files=done, errors=len(errors))
+    return done - len(errors), errors
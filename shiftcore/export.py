@@ -0,0 +1,245 @@
+"""Columnar export of geotag results: NumPy, Parquet/Feather, GeoJSON and GeoPackage.
+
+Results are kept as GeotagColumns, one array per field, and every format is
+written from whole columns at once instead of formatting value by value.
+The format follows the file extension (see EXPORT_FORMATS); CSV stays in
+shiftcore.pipeline.
+
+Parquet and Feather need the optional pyarrow package, which is only
+imported when one of them is written. GeoPackage is written with the
+standard library's sqlite3 and needs no GIS libraries.
+"""
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from shiftcore.instrument import record
+
+# WGS84 geographic coordinates, with ellipsoidal height as Z
+WGS84_SRS_ID = 4326
+GPKG_APPLICATION_ID = 0x47504B47  # 'GPKG'
+GPKG_USER_VERSION = 10200
+GPKG_TABLE = 'geotags'
+# SQLite column types by NumPy dtype kind; anything else is REAL
+_SQL_TYPES = {'U': 'TEXT', 'i': 'INTEGER'}
+
+
+class GeotagColumns:
+    """Per-image export fields as parallel arrays.
+
+    ``set_index`` is the 0-based image set, ``time`` the epoch seconds the
+    position was computed for (PPK time base, or the camera clock for
+    set positions), and ``ppk_gap``/``ppk_nearest`` the seconds between the
+    bracketing PPK epochs and to the nearer of them, as per-image
+    uncertainty indicators. ``flags``, ``fix`` and the ``sd_*`` standard
+    deviations are the PPKTrack.quality results. Uncertainty fields are NaN
+    (flags 0) where no PPK was used or the log has no such column.
+    """
+
+    __slots__ = ('path', 'set_index', 'time', 'lat', 'lon', 'alt', 'ppk_gap', 'ppk_nearest', 'flags', 'fix', 'sd_north', 'sd_east', 'sd_up')
+
+    def __init__(self, path, set_index, time, lat, lon, alt, ppk_gap=None, ppk_nearest=None, flags=None, fix=None,
+                 sd_north=None, sd_east=None, sd_up=None):
+        count = len(path)
+
+        def optional(values):
+            return np.full(count, np.nan) if values is None else np.asarray(values, dtype=np.float64)
+
+        self.path = list(path)
+        self.set_index = np.asarray(set_index, dtype=np.int64)
+        self.time = np.asarray(time, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.alt = np.asarray(alt, dtype=np.float64)
+        self.ppk_gap = optional(ppk_gap)
+        self.ppk_nearest = optional(ppk_nearest)
+        self.flags = np.zeros(count, dtype=np.int64) if flags is None else np.asarray(flags, dtype=np.int64)
+        self.fix = optional(fix)
+        self.sd_north = optional(sd_north)
+        self.sd_east = optional(sd_east)
+        self.sd_up = optional(sd_up)
+
+    def __len__(self):
+        return len(self.path)
+
+    def take(self, mask):
+        """The rows selected by a boolean mask or index array."""
+        indices = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else np.asarray(mask)
+        return GeotagColumns(
+            [self.path[i] for i in indices.tolist()],
+            *(getattr(self, name)[indices] for name in self.__slots__[1:]),
+        )
+
+    def rows(self):
+        """[path, lat, lon, alt] rows, the form write_geotags and write_geotags_exif take."""
+        return [list(row) for row in zip(self.path, self.lat.tolist(), self.lon.tolist(), self.alt.tolist())]
+
+    def fields(self):
+        """{field name: array} in export order; image names are file base names."""
+        return {
+            'image': np.array([os.path.basename(path) for path in self.path], dtype=str),
+            'set': self.set_index + 1,
+            'time': self.time,
+            'latitude': self.lat,
+            'longitude': self.lon,
+            'altitude': self.alt,
+            'ppk_gap': self.ppk_gap,
+            'ppk_nearest': self.ppk_nearest,
+            'flags': self.flags,
+            'fix': self.fix,
+            'sd_north': self.sd_north,
+            'sd_east': self.sd_east,
+            'sd_up': self.sd_up,
+        }
+
+
+def concat_columns(parts):
+    """One GeotagColumns of several, in order."""
+    if not parts:
+        return GeotagColumns([], [], [], [], [], [])
+    return GeotagColumns(
+        [path for part in parts for path in part.path],
+        *(np.concatenate([getattr(part, name) for part in parts]) for name in GeotagColumns.__slots__[1:]),
+    )
+
+
+def write_npz(filename, columns):
+    """Uncompressed .npz with one array per field (np.load needs no pickle to read it)."""
+    with open(filename, 'wb') as file:
+        np.savez(file, **columns.fields())
+
+
+def _arrow_table(columns):
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Feather export need the pyarrow package (pip install pyarrow).") from None
+    return pyarrow.table(columns.fields())
+
+
+def write_parquet(filename, columns):
+    table = _arrow_table(columns)
+    import pyarrow.parquet
+    pyarrow.parquet.write_table(table, filename)
+
+
+def write_feather(filename, columns):
+    table = _arrow_table(columns)
+    import pyarrow.feather
+    pyarrow.feather.write_feather(table, filename)
+
+
+def write_geojson(filename, columns):
+    """RFC 7946 FeatureCollection of [lon, lat, alt] points; NaN fields become null."""
+    fields = columns.fields()
+    names = [name for name in fields if name not in ('latitude', 'longitude', 'altitude')]
+    values = [[None if value != value else value for value in fields[name].tolist()] for name in names]
+    coordinates = zip(columns.lon.tolist(), columns.lat.tolist(), columns.alt.tolist())
+    features = [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': list(point)}, 'properties': dict(zip(names, row))}
+        for point, row in zip(coordinates, zip(*values))
+    ]
+    with open(filename, 'w', encoding='utf-8') as file:
+        # json.dumps encodes in C in one go; json.dump would take the pure-Python chunked encoder
+        file.write(json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':')))
+
+
+def _gpkg_points(lat, lon, alt):
+    """GeoPackage binary POINT Z geometries (no envelope, little-endian ISO WKB) as bytes objects."""
+    blob = np.dtype([
+        ('magic', 'S2'), ('version', 'u1'), ('flags', 'u1'), ('srs_id', '<i4'),
+        ('byte_order', 'u1'), ('wkb_type', '<u4'), ('x', '<f8'), ('y', '<f8'), ('z', '<f8'),
+    ])
+    points = np.zeros(len(lat), dtype=blob)
+    points['magic'] = b'GP'
+    points['flags'] = 0b00000001  # little-endian header, no envelope
+    points['srs_id'] = WGS84_SRS_ID
+    points['byte_order'] = 1
+    points['wkb_type'] = 1001  # Point Z
+    points['x'] = lon
+    points['y'] = lat
+    points['z'] = alt
+    data = points.tobytes()
+    size = blob.itemsize
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def write_geopackage(filename, columns):
+    """OGC GeoPackage with a POINT Z feature table named GPKG_TABLE in WGS84."""
+    if os.path.exists(filename):
+        os.remove(filename)
+    fields = columns.fields()
+    conn = sqlite3.connect(filename)
+    try:
+        with conn:
+            conn.execute('PRAGMA application_id = %d' % GPKG_APPLICATION_ID)
+            conn.execute('PRAGMA user_version = %d' % GPKG_USER_VERSION)
+            conn.execute(
+                'CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, '
+                'organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT)'
+            )
+            conn.executemany('INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)', [
+                ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', None),
+                ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', None),
+                ('WGS 84 geodetic', WGS84_SRS_ID, 'EPSG', 4326,
+                 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,AUTHORITY["EPSG","7030"]],'
+                 'AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],'
+                 'UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]', None),
+            ])
+            conn.execute(
+                'CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, '
+                'identifier TEXT UNIQUE, description TEXT DEFAULT \'\', last_change DATETIME NOT NULL, '
+                'min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER)'
+            )
+            conn.execute(
+                'CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL, '
+                'geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL, '
+                'CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name))'
+            )
+            conn.execute(
+                f'CREATE TABLE {GPKG_TABLE} (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom POINT, '
+                + ', '.join(f'"{name}" {_SQL_TYPES.get(values.dtype.kind, "REAL")}' for name, values in fields.items()) + ')'
+            )
+            values = [fields[name].tolist() for name in fields]
+            conn.executemany(
+                f'INSERT INTO {GPKG_TABLE} (geom, ' + ', '.join(f'"{name}"' for name in fields) + ') '
+                f'VALUES (?{", ?" * len(fields)})',
+                # sqlite3 stores NaN as NULL
+                zip(_gpkg_points(columns.lat, columns.lon, columns.alt), *values),
+            )
+            extent = (
+                (float(np.nanmin(columns.lon)), float(np.nanmin(columns.lat)), float(np.nanmax(columns.lon)), float(np.nanmax(columns.lat)))
+                if len(columns) else (None,) * 4
+            )
+            conn.execute(
+                'INSERT INTO gpkg_contents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (GPKG_TABLE, 'features', GPKG_TABLE, 'Image geotags', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), *extent, WGS84_SRS_ID),
+            )
+            conn.execute('INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, ?, ?)', (GPKG_TABLE, 'geom', 'POINT', WGS84_SRS_ID, 1, 0))
+    finally:
+        conn.close()
+
+
+EXPORT_FORMATS = {
+    '.npz': write_npz,
+    '.parquet': write_parquet,
+    '.feather': write_feather,
+    '.geojson': write_geojson,
+    '.gpkg': write_geopackage,
+}
+# Output format names for command-line options, CSV included
+FORMAT_NAMES = ('csv',) + tuple(extension[1:] for extension in EXPORT_FORMATS)
+
+
+def write_columns(filename, columns):
+    """Write GeotagColumns in the format given by the file extension (one of EXPORT_FORMATS)."""
+    extension = os.path.splitext(filename)[1].lower()
+    try:
+        writer = EXPORT_FORMATS[extension]
+    except KeyError:
+        raise ValueError(f"Unsupported export format: {extension or filename}") from None
+    record(files=1)
+    writer(filename, columns)
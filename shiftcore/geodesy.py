@@ -0,0 +1,113 @@
+"""Vectorized WGS84 frame conversions.
+
+Positions are converted between geodetic (lat, lon, height), Earth-centred
+ECEF and local east/north/up coordinates as whole NumPy arrays, so
+interpolation and lever-arm offsets can be done in metres instead of
+degrees.
+"""
+import numpy as np
+
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_B = WGS84_A * (1 - WGS84_F)
+_EP2 = WGS84_E2 / (1 - WGS84_E2)
+
+
+def geodetic_to_ecef(lat, lon, height):
+    """ECEF (x, y, z) metres for latitude/longitude in degrees and ellipsoidal height in metres."""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    return (
+        (n + height) * cos_lat * np.cos(lon),
+        (n + height) * cos_lat * np.sin(lon),
+        (n * (1 - WGS84_E2) + height) * sin_lat,
+    )
+
+
+def ecef_to_geodetic(x, y, z):
+    """(lat, lon, height) for ECEF metres; Bowring's method refined with two iterations."""
+    p = np.hypot(x, y)
+    lon = np.arctan2(y, x)
+    theta = np.arctan2(z * WGS84_A, p * WGS84_B)
+    lat = np.arctan2(z + _EP2 * WGS84_B * np.sin(theta) ** 3, p - WGS84_E2 * WGS84_A * np.cos(theta) ** 3)
+    for _ in range(2):
+        n = WGS84_A / np.sqrt(1 - WGS84_E2 * np.sin(lat) ** 2)
+        height = p / np.cos(lat) - n
+        lat = np.arctan2(z, p * (1 - WGS84_E2 * n / (n + height)))
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    # Stable height formula at every latitude, poles included
+    height = p * np.cos(lat) + z * sin_lat - WGS84_A ** 2 / n
+    return np.degrees(lat), np.degrees(lon), height
+
+
+def _enu_rotation(lat, lon):
+    """Rows of the ECEF -> ENU rotation (east, north, up unit vectors) at lat/lon degrees."""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    sin_lon, cos_lon = np.sin(lon), np.cos(lon)
+    zero = np.zeros_like(sin_lat)
+    return (
+        (-sin_lon, cos_lon, zero),
+        (-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat),
+        (cos_lat * cos_lon, cos_lat * sin_lon, sin_lat),
+    )
+
+
+def geodetic_to_enu(lat, lon, height, origin):
+    """East/north/up metres of geodetic positions relative to origin (lat, lon, height)."""
+    x, y, z = geodetic_to_ecef(lat, lon, height)
+    x0, y0, z0 = geodetic_to_ecef(*origin)
+    dx, dy, dz = x - x0, y - y0, z - z0
+    return tuple(rx * dx + ry * dy + rz * dz for rx, ry, rz in _enu_rotation(origin[0], origin[1]))
+
+
+def enu_to_geodetic(east, north, up, origin):
+    """Geodetic (lat, lon, height) of east/north/up metres relative to origin (lat, lon, height)."""
+    (ex, ey, ez), (nx, ny, nz), (ux, uy, uz) = _enu_rotation(origin[0], origin[1])
+    x0, y0, z0 = geodetic_to_ecef(*origin)
+    return ecef_to_geodetic(
+        x0 + ex * east + nx * north + ux * up,
+        y0 + ey * east + ny * north + uy * up,
+        z0 + ez * east + nz * north + uz * up,
+    )
+
+
+def body_to_enu(vector, yaw, pitch, roll):
+    """Rotate a forward/right/down body-frame vector into east/north/up for yaw/pitch/roll degree arrays.
+
+    Uses the aerospace Z-Y-X convention: yaw clockwise from north, pitch nose
+    up and roll right wing down, as in the DJI attitude tags.
+    """
+    forward, right, down = vector
+    yaw, pitch, roll = np.radians(yaw), np.radians(pitch), np.radians(roll)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cr, sr = np.cos(roll), np.sin(roll)
+    north = cy * cp * forward + (cy * sp * sr - sy * cr) * right + (cy * sp * cr + sy * sr) * down
+    east = sy * cp * forward + (sy * sp * sr + cy * cr) * right + (sy * sp * cr - cy * sr) * down
+    nadir = -sp * forward + cp * sr * right + cp * cr * down
+    return east, north, -nadir
+
+
+def offset_positions(lat, lon, height, east, north, up):
+    """Geodetic positions moved by per-point east/north/up offsets in metres."""
+    (ex, ey, ez), (nx, ny, nz), (ux, uy, uz) = _enu_rotation(lat, lon)
+    x, y, z = geodetic_to_ecef(lat, lon, height)
+    return ecef_to_geodetic(
+        x + ex * east + nx * north + ux * up,
+        y + ey * east + ny * north + uy * up,
+        z + ez * east + nz * north + uz * up,
+    )
+
+
+def small_offsets(delta_lat, delta_lon, lat):
+    """Approximate (east, north) metres spanned by small lat/lon differences in degrees at latitude lat."""
+    north = np.radians(delta_lat) * WGS84_A
+    east = np.radians(delta_lon) * WGS84_A * np.cos(np.radians(lat))
+    return east, north
@@ -0,0 +1,141 @@
+"""Per-stage instrumentation: timing, counters, logging and optional profiling.
+
+A processing stage runs inside ``measure(name)``. Functions deep in the
+pipeline add to the running stage's counters with ``record()`` without
+having it passed down, and when the stage ends one structured line
+(``stage=... files=... bytes=... errors=... wall=... cpu=...``) is logged.
+``measure(name, profile_path)`` also captures a cProfile of the stage.
+"""
+import contextvars
+import cProfile
+import logging
+import os
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from shiftcore.cache import cache_dir
+from shiftcore.progress import Cancelled
+
+log = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s %(processName)s %(levelname)s %(name)s: %(message)s'
+LOG_MAX_BYTES = 5 * 2 ** 20
+LOG_BACKUPS = 3
+
+_current = contextvars.ContextVar('shiftcore_stage', default=None)
+
+
+def default_log_path():
+    """Location of the log file in the per-user cache directory."""
+    return os.path.join(cache_dir(), 'shiftapp.log')
+
+
+def setup_logging(path=None, level=logging.INFO, console=False, rotate=True):
+    """Send shiftcore log records to path (rotated unless rotate is False) and optionally stderr."""
+    path = path or default_log_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    logger = logging.getLogger('shiftcore')
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    if rotate:
+        handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+    else:
+        # Worker processes append without rotating so they never rename the file under each other
+        handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(handler)
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(stream)
+    return path
+
+
+class StageStats:
+    """Counters and timings of one run of a stage."""
+
+    __slots__ = ('name', 'status', 'files', 'bytes_read', 'errors', 'wall', 'cpu', 'profile')
+
+    def __init__(self, name):
+        self.name = name
+        self.status = 'running'
+        self.files = 0
+        self.bytes_read = 0
+        self.errors = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.profile = None
+
+    def summary(self):
+        """One human-readable line for status bars and panels."""
+        size = f"{self.bytes_read / 2 ** 20:.1f} MB" if self.bytes_read >= 2 ** 20 else f"{self.bytes_read / 2 ** 10:.0f} KB"
+        text = f"{self.name}: {self.files} files, {size} read, {self.errors} errors, {self.wall:.2f} s (CPU {self.cpu:.2f} s)"
+        if self.status != 'ok':
+            text += f" [{self.status}]"
+        if self.profile:
+            text += f", profile: {self.profile}"
+        return text
+
+    def log_line(self):
+        """Structured key=value form written to the log."""
+        return (
+            f"stage={self.name} status={self.status} files={self.files} bytes={self.bytes_read} "
+            f"errors={self.errors} wall={self.wall:.3f} cpu={self.cpu:.3f}"
+        )
+
+
+def record(files=0, bytes_read=0, errors=0):
+    """Add to the counters of the stage running in this thread, if any."""
+    stats = _current.get()
+    if stats is not None:
+        stats.files += files
+        stats.bytes_read += bytes_read
+        stats.errors += errors
+
+
+@contextmanager
+def measure(name, profile_path=None):
+    """Time the enclosed block as stage name and yield its StageStats.
+
+    CPU time is process-wide, so it includes the stage's pool threads. With
+    profile_path, a cProfile of the calling thread is saved there.
+    """
+    stats = StageStats(name)
+    token = _current.set(stats)
+    profiler = None
+    if profile_path:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:  # another profiler is already active
+            log.warning("Profiling of %s skipped: %s", name, e)
+            profiler = None
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield stats
+        stats.status = 'ok'
+    except Cancelled:
+        stats.status = 'cancelled'
+        raise
+    except Exception:
+        stats.status = 'failed'
+        raise
+    finally:
+        stats.wall = time.perf_counter() - wall
+        stats.cpu = time.process_time() - cpu
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(os.path.dirname(os.path.abspath(profile_path)), exist_ok=True)
+            profiler.dump_stats(profile_path)
+            stats.profile = profile_path
+        _current.reset(token)
+        log.info(stats.log_line())
+
+
+def new_profile_path(stage):
+    """A new .prof path for stage in the per-user cache directory."""
+    return os.path.join(cache_dir(), 'profiles', f"{stage}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
@@ -0,0 +1,216 @@
+"""Vectorized PPK interpolation engine.
+
+PPK epochs are parsed once into time-sorted NumPy column arrays, so every
+image can be bracketed with a single ``searchsorted`` call and interpolated
+in one batched operation instead of scanning the whole log per image.
+
+Two methods are available: ``linear`` between the bracketing epochs on the
+raw lat/lon/height columns, and ``hermite``, a cubic Hermite spline through
+the surrounding epochs evaluated in a local east/north/up frame, which
+follows turns between low-rate (1 Hz) epochs.
+
+Logs with solution quality (Q) and standard deviation columns keep them,
+and PPKTrack.quality flags images whose bracketing epochs are missing, too
+far apart or not fixed solutions, for the whole mission at once.
+"""
+import numpy as np
+
+from shiftcore.geodesy import enu_to_geodetic, geodetic_to_enu
+
+INTERPOLATION_METHODS = ('linear', 'hermite')
+
+# Bit flags of PPKTrack.quality
+FLAG_OUTSIDE = 1  # no PPK epoch before or after the image
+FLAG_GAP = 2  # the bracketing epochs are more than max_gap seconds apart
+FLAG_NOT_FIXED = 4  # a bracketing epoch is not a fixed solution
+FLAG_NAMES = ((FLAG_OUTSIDE, 'outside'), (FLAG_GAP, 'gap'), (FLAG_NOT_FIXED, 'not fixed'))
+# Solution quality codes of the Q column (RTKLIB convention)
+QUALITY_FIX = 1
+QUALITY_CODES = {'fix': 1, 'fixed': 1, 'float': 2, 'sbas': 3, 'dgps': 4, 'single': 5, 'ppp': 6}
+
+
+def describe_flags(flags):
+    """Readable form of PPKTrack.quality flags, 'ok' when none are set."""
+    return ', '.join(name for bit, name in FLAG_NAMES if flags & bit) or 'ok'
+
+
+def image_epochs(images, time_offset=0.0):
+    """PPK time base epoch seconds array of ImageRecords.
+
+    MRK trigger times are used where present; other images use the camera
+    timestamp shifted by time_offset seconds.
+    """
+    count = len(images)
+    times = np.fromiter((image.timestamp for image in images), dtype=np.float64, count=count)
+    if time_offset:
+        times += time_offset
+    triggers = np.fromiter(
+        (np.nan if image.trigger_time is None else image.trigger_time for image in images), dtype=np.float64, count=count
+    )
+    return np.where(np.isnan(triggers), times, triggers)
+
+
+class PPKTrack:
+    """PPK epochs stored as time-sorted float64 column arrays.
+
+    ``fix`` (Q codes, see QUALITY_CODES) and the ``sd_north``,
+    ``sd_east`` and ``sd_up`` standard deviations in metres are None when
+    the log has no such column; missing values within a column are NaN.
+    """
+
+    __slots__ = ('time', 'lat', 'lon', 'height', 'fix', 'sd_north', 'sd_east', 'sd_up')
+
+    def __init__(self, time, lat, lon, height, fix=None, sd_north=None, sd_east=None, sd_up=None):
+        columns = [
+            None if column is None else np.asarray(column, dtype=np.float64)
+            for column in (time, lat, lon, height, fix, sd_north, sd_east, sd_up)
+        ]
+        # Only reorder (and so copy) the columns when the log is not already time-sorted
+        if np.any(columns[0][1:] < columns[0][:-1]):
+            order = np.argsort(columns[0], kind='stable')
+            columns = [None if column is None else column[order] for column in columns]
+        self.time, self.lat, self.lon, self.height, self.fix, self.sd_north, self.sd_east, self.sd_up = columns
+
+    @property
+    def extra_columns(self):
+        """fix, sd_north, sd_east and sd_up, each None when the log lacks it."""
+        return self.fix, self.sd_north, self.sd_east, self.sd_up
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def start(self):
+        return self.time[0]
+
+    @property
+    def end(self):
+        return self.time[-1]
+
+    def interpolate(self, times, method='linear'):
+        """Interpolate lat, lon and height at the given epoch seconds.
+
+        ``method`` is one of INTERPOLATION_METHODS. Returns (lat, lon, height,
+        inside) arrays; ``inside`` is False for times outside the track, whose
+        positions are NaN.
+        """
+        if method not in INTERPOLATION_METHODS:
+            raise ValueError(f"Unknown interpolation method: {method}")
+        times = np.asarray(times, dtype=np.float64)
+        if not len(self.time):
+            nan = np.full(len(times), np.nan)
+            return nan, nan.copy(), nan.copy(), np.zeros(len(times), dtype=bool)
+        before, after, inside = self._bracket(times)
+
+        time_before = self.time[before]
+        total_time_diff = self.time[after] - time_before
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(total_time_diff > 0, (times - time_before) / total_time_diff, 0.0)
+
+        if method == 'hermite':
+            results = list(self._hermite(before, after, ratio, total_time_diff))
+            for value in results:
+                value[~inside] = np.nan
+            return results[0], results[1], results[2], inside
+
+        results = []
+        for column in (self.lat, self.lon, self.height):
+            value = column[before] + ratio * (column[after] - column[before])
+            value[~inside] = np.nan
+            results.append(value)
+        return results[0], results[1], results[2], inside
+
+    def _bracket(self, times):
+        """Latest epoch at or before and earliest epoch at or after each time, and whether both exist.
+
+        The indices are clipped into the (non-empty) track, so they can be
+        used for times outside it too.
+        """
+        before = np.searchsorted(self.time, times, side='right') - 1
+        after = np.searchsorted(self.time, times, side='left')
+        inside = (before >= 0) & (after < len(self.time))
+        last = len(self.time) - 1
+        return np.clip(before, 0, last), np.clip(after, 0, last), inside
+
+    def quality(self, times, max_gap=None):
+        """Flag the PPK support of each epoch second.
+
+        Returns (flags, fix, sd_north, sd_east, sd_up). ``flags`` combines
+        FLAG_OUTSIDE, FLAG_GAP (bracketing epochs more than max_gap seconds
+        apart; not checked when max_gap is None) and FLAG_NOT_FIXED (a
+        bracketing epoch has a known quality other than QUALITY_FIX). The
+        other arrays are the worse quality code and larger standard
+        deviations of the bracketing epochs, NaN where unknown or outside.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        count = len(times)
+        flags = np.zeros(count, dtype=np.int64)
+        results = [np.full(count, np.nan) for _ in range(4)]
+        if not len(self.time):
+            flags[:] = FLAG_OUTSIDE
+            return (flags, *results)
+        before, after, inside = self._bracket(times)
+        flags[~inside] |= FLAG_OUTSIDE
+        if max_gap is not None:
+            flags[inside & (self.time[after] - self.time[before] > max_gap)] |= FLAG_GAP
+        for result, column in zip(results, self.extra_columns):
+            if column is not None:
+                # Quality codes grow worse and deviations larger, so fmax keeps the weaker epoch
+                result[inside] = np.fmax(column[before[inside]], column[after[inside]])
+        fix = results[0]
+        flags[~np.isnan(fix) & (fix != QUALITY_FIX)] |= FLAG_NOT_FIXED
+        return (flags, *results)
+
+    def spacing(self, times):
+        """Seconds between the epochs bracketing each time, and to the nearer of them.
+
+        Both grow where the log thins out or has gaps, so they serve as
+        per-image uncertainty indicators; they are NaN outside the track.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        before = np.searchsorted(self.time, times, side='right') - 1
+        after = np.searchsorted(self.time, times, side='left')
+        inside = (before >= 0) & (after < len(self.time))
+        gap = np.full(len(times), np.nan)
+        nearest = np.full(len(times), np.nan)
+        before, after, times = before[inside], after[inside], times[inside]
+        gap[inside] = self.time[after] - self.time[before]
+        nearest[inside] = np.minimum(times - self.time[before], self.time[after] - times)
+        return gap, nearest
+
+    def _hermite(self, before, after, ratio, interval):
+        """Cubic Hermite spline in a local ENU frame between the bracketing epochs.
+
+        Tangents are finite differences over the neighbouring epochs
+        (Catmull-Rom), falling back to one-sided differences at the track ends.
+        """
+        if not len(before):
+            return np.empty(0), np.empty(0), np.empty(0)
+        last = len(self.time) - 1
+        previous = np.maximum(before - 1, 0)
+        following = np.minimum(after + 1, last)
+        # Only the epochs around the images are moved into the local frame
+        needed = np.unique(np.concatenate((previous, before, after, following)))
+        middle = needed[len(needed) // 2]
+        origin = (self.lat[middle], self.lon[middle], self.height[middle])
+        enu = np.column_stack(geodetic_to_enu(self.lat[needed], self.lon[needed], self.height[needed], origin))
+
+        def points(index):
+            return enu[np.searchsorted(needed, index)]
+
+        def tangent(start, end):
+            span = (self.time[end] - self.time[start])[:, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(span > 0, (points(end) - points(start)) / span, 0.0)
+
+        s = ratio[:, None]
+        h = interval[:, None]
+        s2 = s * s
+        s3 = s2 * s
+        position = (
+            (2 * s3 - 3 * s2 + 1) * points(before)
+            + (s3 - 2 * s2 + s) * h * tangent(previous, after)
+            + (-2 * s3 + 3 * s2) * points(after)
+            + (s3 - s2) * h * tangent(before, following)
+        )
+        return enu_to_geodetic(position[:, 0], position[:, 1], position[:, 2], origin)
@@ -0,0 +1,130 @@
+"""Scalable folium map of image locations and the PPK path.
+
+Images are drawn as a single GeoJSON point layer rendered on a canvas, and
+the PPK path is decimated with Douglas-Peucker at a tolerance of about one
+screen pixel at the fitted zoom, so the generated HTML stays small even with
+thousands of images. Maps are cached by content in the user cache directory.
+
+folium (and the jinja2/branca stack behind it) is only imported when a map
+that is not cached yet is built, so importing this module stays cheap.
+"""
+import glob
+import hashlib
+import os
+
+import numpy as np
+
+from shiftcore.cache import cache_dir
+
+# Bump whenever the generated HTML changes so cached maps are rebuilt
+MAP_VERSION = 1
+MAX_CACHED_MAPS = 10
+# Fraction of the data extent treated as one pixel when decimating the PPK path
+PIXEL_FRACTION = 1 / 1000
+
+
+def simplify_path(lat, lon, tolerance):
+    """Indices of the points kept by Douglas-Peucker simplification at tolerance degrees."""
+    count = len(lat)
+    if count < 3:
+        return np.arange(count)
+    # Scale longitude so distances are roughly isotropic
+    x = lon * np.cos(np.radians(np.mean(lat)))
+    y = lat
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        seg_x, seg_y = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            distance = np.hypot(seg_x, seg_y)
+        else:
+            distance = np.abs(dy * seg_x - dx * seg_y) / norm
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return np.flatnonzero(keep)
+
+
+def _map_key(image_lat, image_lon, image_names, ppk_lat, ppk_lon):
+    digest = hashlib.sha1(str(MAP_VERSION).encode())
+    for column in (image_lat, image_lon, ppk_lat, ppk_lon):
+        digest.update(np.ascontiguousarray(column, dtype=np.float64).tobytes())
+        digest.update(b'|')
+    digest.update('\n'.join(image_names).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _prune_cache(folder):
+    """Keep only the most recently used maps."""
+    maps = sorted(glob.glob(os.path.join(folder, '*.html')), key=os.path.getmtime, reverse=True)
+    for path in maps[MAX_CACHED_MAPS:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def render_map(image_lat, image_lon, image_names, ppk_lat, ppk_lon):
+    """Write (or reuse) the map HTML for the given points and return its path, or None without data."""
+    image_lat = np.asarray(image_lat, dtype=np.float64)
+    image_lon = np.asarray(image_lon, dtype=np.float64)
+    ppk_lat = np.asarray(ppk_lat, dtype=np.float64)
+    ppk_lon = np.asarray(ppk_lon, dtype=np.float64)
+    if not len(image_lat) and not len(ppk_lat):
+        return None
+
+    folder = os.path.join(cache_dir(), 'maps')
+    map_html = os.path.join(folder, _map_key(image_lat, image_lon, image_names, ppk_lat, ppk_lon) + '.html')
+    if os.path.exists(map_html):
+        os.utime(map_html)  # mark as recently used
+        return map_html
+
+    import folium
+
+    all_lat = np.concatenate([image_lat, ppk_lat])
+    all_lon = np.concatenate([image_lon, ppk_lon])
+    min_lat, max_lat = float(all_lat.min()), float(all_lat.max())
+    min_lon, max_lon = float(all_lon.min()), float(all_lon.max())
+
+    m = folium.Map(location=[(min_lat + max_lat) / 2, (min_lon + max_lon) / 2], zoom_start=2, prefer_canvas=True)
+
+    if len(image_lat):
+        features = {
+            'type': 'FeatureCollection',
+            'features': [
+                {'type': 'Feature', 'properties': {'name': name}, 'geometry': {'type': 'Point', 'coordinates': [round(lon, 7), round(lat, 7)]}}
+                for name, lat, lon in zip(image_names, image_lat.tolist(), image_lon.tolist())
+            ],
+        }
+        folium.GeoJson(
+            features,
+            name="Image Locations",
+            marker=folium.CircleMarker(radius=4, weight=1, color="darkred", fill=True, fill_color="red", fill_opacity=0.8),
+            tooltip=folium.GeoJsonTooltip(fields=['name'], labels=False),
+        ).add_to(m)
+
+    if len(ppk_lat):
+        tolerance = max(max_lat - min_lat, max_lon - min_lon) * PIXEL_FRACTION
+        kept = simplify_path(ppk_lat, ppk_lon, tolerance)
+        ppk_path = np.round(np.column_stack([ppk_lat[kept], ppk_lon[kept]]), 7).tolist()
+        folium.PolyLine(ppk_path, color="blue", weight=2.5, opacity=1, name="PPK Path").add_to(m)
+
+    # Add layer control to the map and fit the view to the data
+    folium.LayerControl().add_to(m)
+    folium.FitBounds([[min_lat, min_lon], [max_lat, max_lon]]).add_to(m)
+
+    os.makedirs(folder, exist_ok=True)
+    temp_path = map_html + '.tmp'
+    m.save(temp_path)
+    os.replace(temp_path, map_html)
+    _prune_cache(folder)
+    return map_html
@@ -0,0 +1,103 @@
+"""DJI ``*_Timestamp.MRK`` trigger times.
+
+RTK/PPK-capable DJI cameras log every shutter trigger with its GPS week and
+seconds-of-week to a ``*_Timestamp.MRK`` file next to the photos. These
+epochs have sub-millisecond resolution, unlike the whole seconds of
+DateTimeOriginal, so images matched to a trigger by sequence number are
+interpolated at the trigger time instead of the camera clock.
+"""
+import logging
+import os
+import re
+
+import numpy as np
+
+from shiftcore.instrument import record
+from shiftcore.timestamps import GPS_UTC_LEAP_SECONDS, gps_epoch
+
+log = logging.getLogger(__name__)
+
+MRK_SUFFIX = '_timestamp.mrk'
+
+# DJI_0001.JPG or DJI_<timestamp>_0001_V.JPG; the lens suffix ("_V", "_W", ...) is optional
+_SEQUENCE_PATTERN = re.compile(r'^DJI_(?:\d+_)?(\d+)(?:_[A-Za-z]+)?\.[^.]+$', re.IGNORECASE)
+
+
+def read_mrk(filename, leap_seconds=GPS_UTC_LEAP_SECONDS):
+    """(sequence, epoch) arrays of the triggers in an MRK file.
+
+    Each line starts with the sequence number, the GPS seconds-of-week and
+    the GPS week in brackets; the columns are converted in bulk.
+    """
+    record(files=1, bytes_read=os.path.getsize(filename))
+    with open(filename, encoding='ascii', errors='replace') as file:
+        fields = [line.split(None, 3)[:3] for line in file if line.strip()]
+    fields = [row for row in fields if len(row) == 3]
+    if not fields:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    columns = np.array(fields)
+    sequence = columns[:, 0].astype(np.int64)
+    seconds = columns[:, 1].astype(np.float64)
+    week = np.char.strip(columns[:, 2], '[]').astype(np.int64)
+    return sequence, gps_epoch(week, seconds, leap_seconds)
+
+
+def directory_triggers(directory, leap_seconds=GPS_UTC_LEAP_SECONDS):
+    """Sequence-sorted (sequence, epoch) arrays of every MRK file in a directory, or None.
+
+    Sequence numbers that appear in more than one MRK file cannot be matched
+    to a photo unambiguously and are dropped.
+    """
+    try:
+        names = [name for name in os.listdir(directory) if name.lower().endswith(MRK_SUFFIX)]
+    except OSError:
+        return None
+    if not names:
+        return None
+    parts = [read_mrk(os.path.join(directory, name), leap_seconds) for name in sorted(names)]
+    sequence = np.concatenate([part[0] for part in parts])
+    epoch = np.concatenate([part[1] for part in parts])
+
+    order = np.argsort(sequence, kind='stable')
+    sequence, epoch = sequence[order], epoch[order]
+    unique, counts = np.unique(sequence, return_counts=True)
+    if np.any(counts > 1):
+        log.warning("Ignoring %d trigger numbers repeated across the MRK files in %s", int(np.sum(counts > 1)), directory)
+        keep = np.isin(sequence, unique[counts == 1])
+        sequence, epoch = sequence[keep], epoch[keep]
+    return sequence, epoch
+
+
+def sequence_numbers(paths):
+    """Photo sequence number parsed from each DJI file name, -1 for other names."""
+    numbers = np.full(len(paths), -1, dtype=np.int64)
+    for i, path in enumerate(paths):
+        match = _SEQUENCE_PATTERN.search(os.path.basename(path))
+        if match:
+            numbers[i] = int(match.group(1))
+    return numbers
+
+
+def apply_trigger_times(images, leap_seconds=GPS_UTC_LEAP_SECONDS):
+    """Set ``trigger_time`` on every ImageRecord matching an MRK trigger; returns the match count.
+
+    Images are matched per directory with one searchsorted over the sorted
+    trigger sequence numbers.
+    """
+    by_directory = {}
+    for image in images:
+        by_directory.setdefault(os.path.dirname(image.path), []).append(image)
+
+    matched = 0
+    for directory, directory_images in by_directory.items():
+        triggers = directory_triggers(directory, leap_seconds)
+        if triggers is None or not len(triggers[0]):
+            continue
+        trigger_sequence, trigger_epoch = triggers
+        numbers = sequence_numbers([image.path for image in directory_images])
+        index = np.minimum(np.searchsorted(trigger_sequence, numbers), len(trigger_sequence) - 1)
+        hit = (numbers >= 0) & (trigger_sequence[index] == numbers)
+        for i, when in zip(np.flatnonzero(hit).tolist(), trigger_epoch[index[hit]].tolist()):
+            directory_images[i].trigger_time = when
+        matched += int(hit.sum())
+    return matched
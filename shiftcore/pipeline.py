@@ -0,0 +1,392 @@
+"""Qt-free processing pipeline: import, corrections, PPK geotagging and export.
+
+Both the GUI and the command-line batch mode run these functions, so a
+headless run produces exactly what the menu actions produce.
+"""
+import csv
+import logging
+import math
+import os
+
+import numpy as np
+
+from shiftcore.corrections import CorrectionIndex
+from shiftcore.exif import read_attitudes, scan_images
+from shiftcore.exif_writer import write_geotags_exif
+from shiftcore.export import GeotagColumns, concat_columns, write_columns
+from shiftcore.geodesy import body_to_enu, offset_positions
+from shiftcore.instrument import measure, record
+from shiftcore.interpolation import FLAG_OUTSIDE, image_epochs
+from shiftcore.mrk import apply_trigger_times
+from shiftcore.sets import ImageColumns, SetTable
+from shiftcore.timestamps import GPS_UTC_LEAP_SECONDS
+
+log = logging.getLogger(__name__)
+
+
+class TimeMismatch(ValueError):
+    """Raised by geotag_columns when the image times do not overlap the PPK data at all."""
+
+
+def load_images(folder_path, workers=None, use_processes=False, cache=None, progress=None, cancelled=None, leap_seconds=GPS_UTC_LEAP_SECONDS):
+    """Read the folder's images into time-sorted ImageColumns, ready to be segmented into sets."""
+    image_data = scan_images(folder_path, workers, use_processes, cache, progress, cancelled)
+    # Sub-second shutter times from DJI *_Timestamp.MRK files next to the images
+    matched = apply_trigger_times(image_data, leap_seconds)
+    if matched:
+        log.info("Matched %d of %d images to MRK trigger times", matched, len(image_data))
+    return ImageColumns(image_data)
+
+
+def analyze_images(folder_path, min_time_diff, workers=None, use_processes=False, cache=None, progress=None, cancelled=None, leap_seconds=GPS_UTC_LEAP_SECONDS, max_alt_step=None, max_speed=None):
+    """Read the folder's images and split them into sets; see ImageColumns.split_points."""
+    columns = load_images(folder_path, workers, use_processes, cache, progress, cancelled, leap_seconds)
+    return columns.segment(min_time_diff, max_alt_step, max_speed)
+
+
+def dms_to_decimal(d, m, s):
+    """Convert degrees, minutes, seconds to decimal."""
+    return d + m / 60.0 + s / 3600.0
+
+
+def format_coords(coord_tuple):
+    """Format coordinates from tuple to string with degrees, minutes, and seconds."""
+    sign = '-' if any(value < 0 for value in coord_tuple) else ''
+    degrees, minutes, seconds = (abs(value) for value in coord_tuple)
+    return f"{sign}{degrees:.0f}° {minutes:.0f}' {seconds:.2f}\""
+
+
+def load_corrections(filename):
+    """Read a transforms CSV into a CorrectionIndex."""
+    record(files=1, bytes_read=os.path.getsize(filename))
+    with open(filename, newline='') as file:
+        return CorrectionIndex(list(csv.DictReader(file)))
+
+
+def match_corrections(image_sets, corrections):
+    """Find the correction applying to each image set.
+
+    ``corrections`` is a CorrectionIndex or a list of transforms rows.
+    Returns (shifts, unused_ids): one (delta_lat, delta_lon, delta_alt) tuple
+    or None per set, and the Point Ids of corrections matching no set.
+    """
+    if not isinstance(corrections, CorrectionIndex):
+        corrections = CorrectionIndex(corrections)
+    shifts = []
+    corrections_found = set()
+
+    for imageset in image_sets:
+        # The latest correction with the same date and before the start time,
+        # compared at the whole-second resolution of DateTimeOriginal
+        applicable_correction = corrections.lookup(math.floor(imageset[0].timestamp))
+        if applicable_correction:
+            shifts.append((
+                float(applicable_correction['deltaLat']),
+                float(applicable_correction['deltaLong']),
+                float(applicable_correction['deltah']),
+            ))
+            corrections_found.add(applicable_correction['Point Id'])
+        else:
+            shifts.append(None)
+
+    # Find corrections that were not used
+    return shifts, corrections.point_ids - corrections_found
+
+
+def image_windows(image_sets, margin, time_offset=0.0):
+    """(start, end) PPK-time epoch seconds of each image set, widened by margin seconds."""
+    windows = []
+    for imageset in image_sets:
+        times = image_epochs(imageset, time_offset)
+        windows.append((float(times.min()) - margin, float(times.max()) + margin))
+    return windows
+
+
+def apply_lever_arm(paths, lat, lon, alt, lever_arm, workers=None):
+    """Move antenna positions to the camera by a forward/right/down lever arm in metres.
+
+    The arm is rotated by each image's DJI XMP airframe attitude; images with
+    only a gimbal yaw are taken as level at that heading, and images without
+    either keep the antenna position. Returns (lat, lon, alt, corrected_count).
+    """
+    attitudes = read_attitudes(paths, workers)
+    tagged = ~np.isnan(attitudes[:, 0])
+    if not tagged.any():
+        return lat, lon, alt, 0
+    level = tagged & np.isnan(attitudes[:, 1:]).any(axis=1)
+    if level.any():
+        log.info("%d images have no airframe attitude; their lever arm uses the gimbal yaw with zero pitch and roll", int(level.sum()))
+        attitudes[level, 1:] = 0.0
+    east, north, up = body_to_enu(lever_arm, attitudes[tagged, 0], attitudes[tagged, 1], attitudes[tagged, 2])
+    lat, lon, alt = lat.copy(), lon.copy(), alt.copy()
+    lat[tagged], lon[tagged], alt[tagged] = offset_positions(lat[tagged], lon[tagged], alt[tagged], east, north, up)
+    return lat, lon, alt, int(tagged.sum())
+
+
+def geotag_columns(image_sets, track, time_offset=0.0, method='linear', lever_arm=None, workers=None, max_gap=None, skip_flagged=False):
+    """Interpolate a PPKTrack position for every image.
+
+    Images with an MRK trigger time are interpolated at that epoch; for the
+    others ``time_offset`` is added to the camera timestamp to bring it onto
+    the PPK time base (time zone and GPS-UTC differences).
+
+    ``method`` selects the PPKTrack interpolation. A non-zero ``lever_arm``
+    (forward, right, down metres from antenna to camera) is applied using the
+    attitude in each image's XMP, read with ``workers`` threads.
+
+    Every image gets PPKTrack.quality flags: bracketing epochs more than
+    ``max_gap`` seconds apart (None: not checked) or not fixed solutions.
+    Flagged images are exported with their flags, or left out with
+    ``skip_flagged``.
+
+    Returns (columns, skipped): GeotagColumns of the geotagged images, with
+    the PPK epoch spacing, quality flags and standard deviations around each
+    as uncertainty fields, and the number of images outside the PPK time
+    range or skipped as flagged. Raises TimeMismatch when the image timestamps
+    do not overlap the PPK data at all.
+    """
+    # Flatten the image sets into a single list for easier processing
+    all_images = [img for imageset in image_sets for img in imageset]
+    set_index = np.repeat(np.arange(len(image_sets)), [len(imageset) for imageset in image_sets])
+    record(files=len(all_images))
+
+    # Image times were parsed once at import; bring them onto the PPK time base
+    image_times = image_epochs(all_images, time_offset)
+
+    if not len(track) or image_times.min() > track.end or image_times.max() < track.start:
+        raise TimeMismatch("Image timestamps do not overlap with PPK data timestamps.")
+
+    # Interpolate every image geolocation in one batched operation
+    lats, lons, alts, inside = track.interpolate(image_times, method)
+    flags, fix, sd_north, sd_east, sd_up = track.quality(image_times, max_gap)
+    flagged = int(np.count_nonzero(inside & (flags != 0)))
+    if flagged:
+        log.warning("%d of %d images have gapped or non-fixed PPK epochs%s", flagged, len(all_images), " and were skipped" if skip_flagged else "")
+    if skip_flagged:
+        inside &= flags == 0
+    if lever_arm is not None and any(lever_arm):
+        paths = [image.path for image, ok in zip(all_images, inside.tolist()) if ok]
+        lats[inside], lons[inside], alts[inside], corrected = apply_lever_arm(
+            paths, lats[inside], lons[inside], alts[inside], lever_arm, workers
+        )
+        log.info("Applied the lever arm to %d of %d images", corrected, len(paths))
+    gap, nearest = track.spacing(image_times)
+    columns = GeotagColumns(
+        [image.path for image in all_images], set_index, image_times, lats, lons, alts, gap, nearest,
+        flags, fix, sd_north, sd_east, sd_up,
+    )
+    return columns.take(inside), len(all_images) - int(inside.sum())
+
+
+def geotag_images(image_sets, track, time_offset=0.0, method='linear', lever_arm=None, workers=None, max_gap=None, skip_flagged=False):
+    """geotag_columns as ([path, lat, lon, alt] rows, skipped)."""
+    columns, skipped = geotag_columns(image_sets, track, time_offset, method, lever_arm, workers, max_gap, skip_flagged)
+    return columns.rows(), skipped
+
+
+def write_geotags(filename, rows):
+    """Write geotag rows from geotag_images to a CSV file."""
+    record(files=1)
+    with open(filename, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Image Filename', 'Latitude', 'Longitude', 'Altitude'])
+        for path, lat, lon, alt in rows:
+            writer.writerow([os.path.basename(path), lat, lon, alt])
+
+
+def set_positions(image_sets, selected_indices, shifts):
+    """[path, lat, lon, alt] rows of the selected image sets with their (lat, lon, alt) shifts applied."""
+    rows = []
+    for i in selected_indices:
+        lat_shift, lon_shift, alt_shift = shifts[i] or (0.0, 0.0, 0.0)
+        for image in image_sets[i]:
+            rows.append([
+                image.path,
+                dms_to_decimal(*image.lat) + lat_shift,
+                dms_to_decimal(*image.lon) + lon_shift,
+                image.alt + alt_shift,
+            ])
+    return rows
+
+
+def set_columns(image_sets, selected_indices, shifts):
+    """GeotagColumns of the selected image sets with their (lat, lon, alt) shifts applied, timed by the camera clock."""
+    selected = list(selected_indices)
+    images = [image for i in selected for image in image_sets[i]]
+    counts = [len(image_sets[i]) for i in selected]
+    offsets = np.array([shifts[i] or (0.0, 0.0, 0.0) for i in selected], dtype=np.float64).reshape(len(selected), 3)
+    offsets = np.repeat(offsets, counts, axis=0)
+    count = len(images)
+    return GeotagColumns(
+        [image.path for image in images],
+        np.repeat(np.array(selected, dtype=np.int64), counts),
+        np.fromiter((image.timestamp for image in images), dtype=np.float64, count=count),
+        np.fromiter((dms_to_decimal(*image.lat) for image in images), dtype=np.float64, count=count) + offsets[:, 0],
+        np.fromiter((dms_to_decimal(*image.lon) for image in images), dtype=np.float64, count=count) + offsets[:, 1],
+        np.fromiter((image.alt for image in images), dtype=np.float64, count=count) + offsets[:, 2],
+    )
+
+
+def export_geotag_file(filename, columns):
+    """Write GeotagColumns as CSV (the write_geotags layout) or a format in EXPORT_FORMATS, by extension."""
+    if os.path.splitext(filename)[1].lower() in ('', '.csv'):
+        write_geotags(filename, columns.rows())
+    else:
+        write_columns(filename, columns)
+
+
+def export_set_file(filename, image_sets, selected_indices, shifts):
+    """Write the selected image sets as CSV (the write_sets layout) or a format in EXPORT_FORMATS, by extension."""
+    if os.path.splitext(filename)[1].lower() in ('', '.csv'):
+        write_sets(filename, image_sets, selected_indices, shifts)
+    else:
+        write_columns(filename, set_columns(image_sets, selected_indices, shifts))
+
+
+def write_sets(filename, image_sets, selected_indices, shifts):
+    """Write the selected image sets with their (lat, lon, alt) shifts applied to a CSV file."""
+    record(files=1)
+    with open(filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['ID', 'Latitude', 'Longitude', 'Altitude'])
+        for path, adjusted_lat, adjusted_lon, adjusted_alt in set_positions(image_sets, selected_indices, shifts):
+            writer.writerow([
+                os.path.basename(path),
+                f"{adjusted_lat:.9f}",
+                f"{adjusted_lon:.9f}",
+                f"{adjusted_alt:.6f}"
+            ])
+
+
+class MissionOptions:
+    """Processing settings of a mission, shared by the GUI, the batch CLI and project mode.
+
+    EXIF is read by exif_workers threads, or processes with exif_processes.
+    Sets split on min_time_diff minutes and, optionally, max_alt_step metres
+    or max_speed m/s (see ImageColumns.split_points). Only PPK epochs within
+    ppk_margin seconds of the images are loaded (None: whole logs), and
+    time_offset seconds bring the camera clock onto the PPK time base. Images
+    whose PPK epochs are more than max_gap seconds apart or not fixed are
+    flagged, or left out with skip_flagged. Results are exported once per
+    entry of formats (see shiftcore.export.FORMAT_NAMES) and, with exif_dir,
+    written into copies of the images under exif_dir/<mission name>. With
+    profile_dir, a mission is profiled to profile_dir/<mission name>.prof.
+    """
+
+    __slots__ = (
+        'corrections_file', 'min_time_diff', 'max_alt_step', 'max_speed', 'exif_workers', 'exif_processes', 'use_cache',
+        'ppk_margin', 'time_offset', 'leap_seconds', 'method', 'lever_arm', 'max_gap', 'skip_flagged', 'formats',
+        'exif_dir', 'xmp', 'profile_dir',
+    )
+
+    def __init__(self, corrections_file=None, min_time_diff=20, max_alt_step=None, max_speed=None, exif_workers=None,
+                 exif_processes=False, use_cache=True, ppk_margin=60, time_offset=0.0, leap_seconds=GPS_UTC_LEAP_SECONDS, method='linear',
+                 lever_arm=(0.0, 0.0, 0.0), max_gap=None, skip_flagged=False, formats=('csv',), exif_dir=None, xmp=False,
+                 profile_dir=None):
+        self.corrections_file = corrections_file
+        self.min_time_diff = min_time_diff
+        self.max_alt_step = max_alt_step
+        self.max_speed = max_speed
+        self.exif_workers = exif_workers
+        self.exif_processes = exif_processes
+        self.use_cache = use_cache
+        self.ppk_margin = ppk_margin
+        self.time_offset = time_offset
+        self.leap_seconds = leap_seconds
+        self.method = method
+        self.lever_arm = tuple(lever_arm)
+        self.max_gap = max_gap
+        self.skip_flagged = skip_flagged
+        self.formats = tuple(formats)
+        self.exif_dir = exif_dir
+        self.xmp = xmp
+        self.profile_dir = profile_dir
+
+    def __repr__(self):
+        return 'MissionOptions(' + ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__) + ')'
+
+    def replace(self, **changes):
+        """A copy with the given settings changed."""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return MissionOptions(**values)
+
+
+def log_set_stats(name, table):
+    """Log duration, extent, mean altitude, PPK coverage and flagged images of every set in a SetTable."""
+    for i in range(len(table)):
+        coverage = f"{table.coverage[i]:.0%} ({table.flagged[i]:.0f} flagged)" if table.image_flags is not None else "-"
+        log.info(
+            "%s: set %d: %d images, %.0f s, %.0f x %.0f m, mean altitude %.1f m, PPK coverage %s",
+            name, i + 1, table.count[i], table.duration[i], table.width[i], table.depth[i], table.mean_alt[i], coverage,
+        )
+
+
+def process_images(name, columns, output_dir, tracks=None, options=None):
+    """Segment, correct, geotag and export the ImageColumns of one mission; return a summary line.
+
+    This is the body shared by shiftcore.cli.process_mission and
+    shiftcore.project.process_folder. ``tracks(image_sets)`` yields
+    (indices, track) pairs: the PPKTrack covering the images at those
+    indices of ``columns.images``, which each get geotagged with it. Images
+    no pair covers count as outside the PPK range. Without tracks the
+    corrected set positions are the only output. ``options`` is a
+    MissionOptions (defaults when None).
+    """
+    options = options or MissionOptions()
+    image_sets = columns.segment(options.min_time_diff, options.max_alt_step, options.max_speed)
+    if not image_sets:
+        return f"{name}: no images found"
+    summary = [f"{name}: {len(columns)} images in {len(image_sets)} sets"]
+
+    shifts = [None] * len(image_sets)
+    if options.corrections_file:
+        with measure(f"{name}/corrections"):
+            shifts, _ = match_corrections(image_sets, load_corrections(options.corrections_file))
+        summary.append(f"{sum(1 for shift in shifts if shift)} sets corrected")
+    sets_files = [os.path.join(output_dir, f"{name}_sets.{extension}") for extension in options.formats]
+    with measure(f"{name}/export"):
+        for sets_file in sets_files:
+            export_set_file(sets_file, image_sets, range(len(image_sets)), shifts)
+    summary.append(f"sets -> {', '.join(sets_files)}")
+    positions = set_positions(image_sets, range(len(image_sets)), shifts)
+
+    table = SetTable(image_sets, columns)
+    if tracks is not None:
+        flags = np.full(len(columns), FLAG_OUTSIDE, dtype=np.int64)
+        set_of_path = {image.path: i for i, imageset in enumerate(image_sets) for image in imageset}
+        parts = []
+        for indices, track in tracks(image_sets):
+            images = [columns.images[i] for i in indices]
+            flags[indices] = track.quality(image_epochs(images, options.time_offset), options.max_gap)[0]
+            with measure(f"{name}/geotag"):
+                part, _ = geotag_columns(
+                    [images], track, options.time_offset, options.method, options.lever_arm, options.exif_workers,
+                    options.max_gap, options.skip_flagged,
+                )
+            # Geotagged as one group; restore each image's own set number
+            part.set_index = np.array([set_of_path[path] for path in part.path], dtype=np.int64)
+            parts.append(part)
+        geotags = concat_columns(parts)
+        table.set_flags(flags)
+        if len(geotags):
+            ppk_files = [os.path.join(output_dir, f"{name}_ppk.{extension}") for extension in options.formats]
+            with measure(f"{name}/export"):
+                for ppk_out in ppk_files:
+                    export_geotag_file(ppk_out, geotags)
+            summary.append(
+                f"{len(geotags)} geotagged ({len(columns) - len(geotags)} {'outside PPK range or flagged' if options.skip_flagged else 'outside PPK range'}, "
+                f"{np.count_nonzero(geotags.flags)} flagged) -> {', '.join(ppk_files)}"
+            )
+            positions = geotags.rows()
+        else:
+            summary.append("no PPK coverage")
+    log_set_stats(name, table)
+
+    if options.exif_dir:
+        with measure(f"{name}/exif"):
+            written, errors = write_geotags_exif(positions, os.path.join(options.exif_dir, name), options.xmp, options.exif_workers)
+        for error in errors:
+            log.warning(error)
+        summary.append(f"EXIF written to {written} images ({len(errors)} failed)")
+    return ', '.join(summary)
@@ -0,0 +1,325 @@
+"""Streaming PPK CSV loader with compact columnar storage.
+
+The CSV is read in chunks of rows, each ``Date/Time`` is parsed exactly once
+into epoch seconds, and time/lat/lon/height are kept in contiguous float64
+arrays (32 bytes per epoch). Solution quality (Q) and standard deviation
+columns are kept too when the log has them (see QUALITY_COLUMNS and
+SD_COLUMNS). The parsed columns are saved to a binary sidecar in the user
+cache directory and memory-mapped on later loads.
+
+When the loader is given time windows (for instance the image sets' time
+span plus a margin), a current sidecar is masked to them. Without one, the
+log is parsed in full once so that the sidecar can be written, and every
+later windowed load is memory-mapped. Loads that skip the sidecar instead
+bisect a time-sorted log by byte offset so that only the rows near each
+window are read, and rows outside the windows are skipped after parsing
+just their timestamp.
+"""
+import csv
+import glob
+import hashlib
+import logging
+import os
+from array import array
+from bisect import bisect_right
+from itertools import islice
+
+import numpy as np
+
+from shiftcore.cache import cache_dir
+from shiftcore.instrument import record
+from shiftcore.interpolation import QUALITY_CODES, PPKTrack
+from shiftcore.progress import check_cancelled
+from shiftcore.timestamps import ppk_epoch
+
+log = logging.getLogger(__name__)
+
+TIME_COLUMN = 'Date/Time'
+LAT_COLUMN = 'WGS84 Latitude'
+LON_COLUMN = 'WGS84 Longitude'
+HEIGHT_COLUMN = 'WGS84 Ellip. Height'
+# Optional columns, matched case-insensitively by any of these names
+QUALITY_COLUMNS = ('Q', 'Quality', 'Fix Status', 'Solution Status')
+SD_COLUMNS = (
+    ('SDN', 'SDN(m)', 'Std. Dev. North', 'Std North', 'Sigma North'),
+    ('SDE', 'SDE(m)', 'Std. Dev. East', 'Std East', 'Sigma East'),
+    ('SDU', 'SDU(m)', 'Std. Dev. Up', 'Std Up', 'Sigma Up', 'Std. Dev. Height'),
+)
+# Bump whenever the sidecar layout changes so older sidecars are re-parsed
+SIDECAR_VERSION = 2
+
+# Byte span below which bisecting a log stops and rows are streamed instead
+_SEEK_RESOLUTION = 64 * 1024
+# Bytes read from the end of a log to find its last row
+_TAIL_BYTES = 4096
+
+
+class _UnsortedLog(Exception):
+    """Raised when a log turns out not to be time-sorted while seeking through it."""
+
+
+def _sidecar_stem(filename):
+    """Cache path prefix shared by every sidecar of one PPK file."""
+    digest = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(), 'ppk', digest)
+
+
+def _sidecar_path(filename):
+    """Sidecar path for the current size and mtime of a PPK file."""
+    st = os.stat(filename)
+    return f"{_sidecar_stem(filename)}-{st.st_size}-{st.st_mtime_ns}-v{SIDECAR_VERSION}.npy"
+
+
+def merge_windows(windows):
+    """Sort (start, end) epoch-second windows and merge the overlapping ones."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(window) for window in merged]
+
+
+def _rows(file):
+    """CSV rows of a binary file from its current position."""
+    return csv.reader(line.decode('utf-8', 'replace') for line in file)
+
+
+def _parse_quality(value):
+    """Q code of a numeric or named (fix/float/single...) solution status; NaN if unknown."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        return float(QUALITY_CODES.get(value.lower(), 'nan'))
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+
+def _optional_indices(header):
+    """Header indices of the quality and sd north/east/up columns, None where absent."""
+    names = [name.strip().lower() for name in header]
+    indices = []
+    for aliases in (QUALITY_COLUMNS, *SD_COLUMNS):
+        found = [names.index(alias.lower()) for alias in aliases if alias.lower() in names]
+        indices.append(found[0] if found else None)
+    return indices
+
+
+def _row_time(row, time_index):
+    date, time = row[time_index].split()
+    return ppk_epoch(date, time)
+
+
+def _append_rows(rows, indices, columns, chunk_size, windows=None, sorted_window=False, on_chunk=None):
+    """Parse rows into the column arrays, chunk_size rows at a time.
+
+    Rows outside ``windows`` are skipped after parsing only their time. With
+    ``sorted_window`` the rows are expected to be time-sorted, reading stops
+    after the end of the single window, and _UnsortedLog is raised if time
+    goes backwards. ``on_chunk()`` is called after every chunk.
+    """
+    time_index, lat_index, lon_index, height_index = indices[:4]
+    times, lats, lons, heights = columns[:4]
+    extra = [
+        (index, values, _parse_quality if i == 0 else _parse_float)
+        for i, (index, values) in enumerate(zip(indices[4:], columns[4:])) if index is not None
+    ]
+    starts = [start for start, end in windows] if windows else None
+    last_time = float('-inf')
+    if sorted_window:
+        # Reading stops at the window end, so avoid over-reading past it
+        chunk_size = min(chunk_size, 4096)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        for row in chunk:
+            if not row:
+                continue
+            t = _row_time(row, time_index)
+            if windows:
+                if sorted_window:
+                    if t < last_time:
+                        raise _UnsortedLog()
+                    last_time = t
+                    if t > windows[0][1]:
+                        return
+                i = bisect_right(starts, t) - 1
+                if i < 0 or t > windows[i][1]:
+                    continue
+            times.append(t)
+            lats.append(float(row[lat_index]))
+            lons.append(float(row[lon_index]))
+            heights.append(float(row[height_index]))
+            for index, values, parse in extra:
+                values.append(parse(row[index]) if index < len(row) else float('nan'))
+        if on_chunk:
+            on_chunk()
+
+
+def _log_bounds(file, data_start, file_size, time_index):
+    """Times of the first and last rows of a log; _UnsortedLog if the last comes first."""
+    file.seek(data_start)
+    first = next(_rows([file.readline()]), None)
+    tail_start = max(data_start, file_size - _TAIL_BYTES)
+    file.seek(tail_start)
+    lines = file.readlines()
+    if tail_start != data_start:
+        lines = lines[1:]  # the first line may be partial
+    last = [row for row in _rows(lines) if row]
+    if not first or not last:
+        raise _UnsortedLog()
+    bounds = _row_time(first, time_index), _row_time(last[-1], time_index)
+    if bounds[1] < bounds[0]:
+        raise _UnsortedLog()
+    return bounds
+
+
+def _seek_window_start(file, start, data_start, file_size, time_index, bounds):
+    """Position a time-sorted log shortly before its first row at or after start.
+
+    The bisection probes must not go back in time, between each other and
+    the log's first and last row times (``bounds``), and the row the log is
+    positioned at must lie before start; otherwise _UnsortedLog is raised.
+    """
+    lo, hi = data_start, file_size
+    lo_time, hi_time = bounds
+    while hi - lo > _SEEK_RESOLUTION:
+        mid = (lo + hi) // 2
+        file.seek(mid)
+        file.readline()  # skip the partial line to resync on a row boundary
+        row = next(_rows([file.readline()]), None)
+        if not row:
+            hi = mid
+            continue
+        t = _row_time(row, time_index)
+        if not lo_time <= t <= hi_time:
+            raise _UnsortedLog()
+        if t >= start:
+            hi, hi_time = mid, t
+        else:
+            lo, lo_time = mid, t
+    file.seek(lo)
+    if lo != data_start:
+        file.readline()
+        position = file.tell()
+        row = next(_rows([file.readline()]), None)
+        if not row or _row_time(row, time_index) >= start:
+            raise _UnsortedLog()
+        file.seek(position)
+
+
+def _read_columns(filename, chunk_size, windows=None, progress=None, cancelled=None):
+    """Parse the CSV into the PPKTrack column arrays, optionally only inside windows.
+
+    Returns time, lat, lon and height, then fix (Q codes), sd_north, sd_east and
+    sd_up, which are None for columns the log does not have.
+    """
+    columns = [array('d') for _ in range(8)]
+    with open(filename, 'rb') as file:
+        file_size = os.fstat(file.fileno()).st_size
+
+        def on_chunk():
+            check_cancelled(cancelled)
+            if progress:
+                progress(file.tell(), file_size)
+
+        header = next(_rows([file.readline()]), [])
+        header = [name.lstrip('\ufeff') for name in header]
+        try:
+            indices = [header.index(name) for name in (TIME_COLUMN, LAT_COLUMN, LON_COLUMN, HEIGHT_COLUMN)]
+        except ValueError as e:
+            raise ValueError(f"Missing PPK column: {e}") from None
+        indices += _optional_indices(header)
+        data_start = file.tell()
+
+        bytes_read = data_start
+        if windows is None:
+            _append_rows(_rows(file), indices, columns, chunk_size, on_chunk=on_chunk)
+            bytes_read = file_size
+        else:
+            try:
+                bounds = _log_bounds(file, data_start, file_size, indices[0])
+                for window in windows:
+                    _seek_window_start(file, window[0], data_start, file_size, indices[0], bounds)
+                    window_start = file.tell()
+                    _append_rows(_rows(file), indices, columns, chunk_size, [window], sorted_window=True, on_chunk=on_chunk)
+                    bytes_read += file.tell() - window_start
+            except _UnsortedLog:
+                # Bisecting needs a time-sorted log: fall back to one filtered pass
+                log.info("%s is not time-sorted; reading it in full", filename)
+                columns = [array('d') for _ in range(8)]
+                file.seek(data_start)
+                _append_rows(_rows(file), indices, columns, chunk_size, windows, on_chunk=on_chunk)
+                bytes_read = file_size
+    record(files=1, bytes_read=bytes_read)
+    return [None if index is None else np.frombuffer(column, dtype=np.float64) for index, column in zip(indices, columns)]
+
+
+def _window_mask(time, windows):
+    """Boolean mask of the sorted times lying inside any window."""
+    mask = np.zeros(len(time), dtype=bool)
+    for start, end in windows:
+        mask[np.searchsorted(time, start, side='left'):np.searchsorted(time, end, side='right')] = True
+    return mask
+
+
+def _sidecar_track(data, windows=None):
+    """PPKTrack of the sidecar rows that lie inside the windows (all of them without windows)."""
+    if windows is not None:
+        data = data[:, _window_mask(data[0], windows)]
+    # Rows 4-7 hold the optional columns, all NaN where the log lacks one
+    extra = [None if np.isnan(row).all() else row for row in data[4:]]
+    return PPKTrack(data[0], data[1], data[2], data[3], *extra)
+
+
+def _save_sidecar(filename, sidecar, data):
+    try:
+        # Drop sidecars of older versions of this file before saving the new one
+        for stale in glob.glob(glob.escape(_sidecar_stem(filename)) + '-*.npy'):
+            os.remove(stale)
+        os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+        temp_path = sidecar + '.tmp'
+        with open(temp_path, 'wb') as file:
+            np.save(file, data)
+        os.replace(temp_path, sidecar)
+    except OSError as e:
+        log.warning("Could not write PPK cache %s: %s", sidecar, e)
+
+
+def load_ppk(filename, chunk_size=65536, use_sidecar=True, windows=None, progress=None, cancelled=None):
+    """Load a PPK CSV into a PPKTrack, reusing the cached binary sidecar when it is current.
+
+    ``windows`` is an optional list of (start, end) epoch seconds; only
+    epochs inside them are kept. Without a current sidecar the first load
+    parses the whole log to write one, even when windowed: that one load
+    costs a full read, and every later load of the file is memory-mapped.
+    With ``use_sidecar=False`` windowed loads read just the needed part of
+    the log. ``progress(bytes_read, file_size)`` is reported per chunk and
+    Cancelled is raised once ``cancelled()`` is True.
+    """
+    if windows is not None:
+        windows = merge_windows(windows)
+    sidecar = _sidecar_path(filename) if use_sidecar else None
+    if sidecar and os.path.exists(sidecar):
+        data = np.load(sidecar, mmap_mode='r')
+        track = _sidecar_track(data, windows)
+        record(files=1, bytes_read=track.time.nbytes * data.shape[0])
+        return track
+
+    track = PPKTrack(*_read_columns(filename, chunk_size, None if sidecar else windows, progress, cancelled))
+    if not sidecar:
+        return track
+    rows = [track.time, track.lat, track.lon, track.height]
+    if any(column is not None for column in track.extra_columns):
+        rows += [np.full(len(track), np.nan) if column is None else column for column in track.extra_columns]
+    data = np.vstack(rows)
+    _save_sidecar(filename, sidecar, data)
+    return track if windows is None else _sidecar_track(data, windows)
@@ -0,0 +1,32 @@
+"""Progress reporting and cancellation hooks for long-running stages.
+
+Stages accept optional ``progress(done, total)`` and ``cancelled()``
+callables, so the GUI can drive them from worker threads and the CLI can
+ignore them.
+"""
+import time
+
+
+class Cancelled(Exception):
+    """Raised inside a stage when its caller asked for it to stop."""
+
+
+def check_cancelled(cancelled):
+    """Raise Cancelled if the cancelled() callback says so."""
+    if cancelled is not None and cancelled():
+        raise Cancelled()
+
+
+class Throttle:
+    """Forward (done, total) progress to callback at most once per interval seconds."""
+
+    def __init__(self, callback, interval=0.1):
+        self.callback = callback
+        self.interval = interval
+        self._last = float('-inf')
+
+    def __call__(self, done, total):
+        now = time.monotonic()
+        if done >= total or now - self._last >= self.interval:
+            self._last = now
+            self.callback(done, total)
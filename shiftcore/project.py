@@ -0,0 +1,405 @@
+"""Campaign projects: many image folders and PPK logs in one indexed store.
+
+A project is a SQLite file registering image folders (their parsed image
+records, indexed by folder and time) and PPK logs (their time coverage,
+split into intervals at data gaps and indexed by start time). Images are
+matched to the log covering their PPK-time epoch through a PPKIntervals
+index, and process_project runs every folder of the campaign as an
+independent mission in a process pool.
+
+Example::
+
+    python -m shiftcore.project campaign.shiftproj add day1/* day2/* --ppk day1/base.csv --ppk day2/base.csv
+    python -m shiftcore.project campaign.shiftproj status
+    python -m shiftcore.project campaign.shiftproj process -o out --corrections transforms.csv --jobs 4
+
+Nothing here imports Qt.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import numpy as np
+
+from shiftcore.cache import MetadataCache
+from shiftcore.export import FORMAT_NAMES
+from shiftcore.instrument import measure, setup_logging
+from shiftcore.interpolation import INTERPOLATION_METHODS, image_epochs
+from shiftcore.pipeline import MissionOptions, image_windows, load_images, process_images
+from shiftcore.ppk import load_ppk
+from shiftcore.progress import Cancelled, check_cancelled
+from shiftcore.records import ImageRecord
+from shiftcore.sets import ImageColumns
+from shiftcore.timestamps import GPS_UTC_LEAP_SECONDS
+
+log = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+# Seconds without PPK epochs that split a log into separate coverage intervals
+INTERVAL_GAP = 30.0
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS folders (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS images ('
+    'path TEXT PRIMARY KEY, folder_id INTEGER NOT NULL, '
+    'lat_d REAL, lat_m REAL, lat_s REAL, lon_d REAL, lon_m REAL, lon_s REAL, '
+    'alt REAL, timestamp REAL, trigger_time REAL)',
+    'CREATE INDEX IF NOT EXISTS images_folder_time ON images (folder_id, timestamp)',
+    'CREATE TABLE IF NOT EXISTS ppk_logs (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, epochs INTEGER)',
+    'CREATE TABLE IF NOT EXISTS ppk_intervals (log_id INTEGER NOT NULL, start_time REAL, end_time REAL)',
+    'CREATE INDEX IF NOT EXISTS ppk_intervals_start ON ppk_intervals (start_time, end_time)',
+)
+
+
+def track_intervals(time, gap=INTERVAL_GAP):
+    """(start, end) epoch seconds of the runs of a sorted time array without gaps longer than gap."""
+    if not len(time):
+        return []
+    breaks = np.flatnonzero(np.diff(time) > gap)
+    starts = np.concatenate(([time[0]], time[breaks + 1]))
+    ends = np.concatenate((time[breaks], [time[-1]]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class PPKIntervals:
+    """Interval index of the PPK logs' coverage, sorted by start time."""
+
+    __slots__ = ('start', 'end', 'log_id', 'paths', '_reach', '_reach_index')
+
+    def __init__(self, rows, paths):
+        """``rows`` are (log_id, start, end) tuples and ``paths`` maps log ids to files."""
+        rows = sorted(rows, key=lambda row: row[1])
+        count = len(rows)
+        self.log_id = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        self.start = np.fromiter((row[1] for row in rows), dtype=np.float64, count=count)
+        self.end = np.fromiter((row[2] for row in rows), dtype=np.float64, count=count)
+        self.paths = paths
+        # Furthest end among the intervals starting so far, and which interval reaches it,
+        # so a long interval still covers times past shorter ones starting inside it
+        self._reach = np.maximum.accumulate(self.end) if count else self.end
+        self._reach_index = np.zeros(count, dtype=np.int64)
+        if count:
+            furthest = np.flatnonzero(np.concatenate(([True], self.end[1:] > self._reach[:-1])))
+            self._reach_index[furthest] = furthest
+            self._reach_index = np.maximum.accumulate(self._reach_index)
+
+    def __len__(self):
+        return len(self.start)
+
+    def lookup(self, times):
+        """Log id covering each epoch second, or -1 where no log covers it.
+
+        Where logs overlap, the one starting last before the time wins.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        result = np.full(len(times), -1, dtype=np.int64)
+        if not len(self):
+            return result
+        latest = np.searchsorted(self.start, times, side='right') - 1
+        started = latest >= 0
+        latest = np.maximum(latest, 0)
+        direct = started & (self.end[latest] >= times)
+        result[direct] = self.log_id[latest[direct]]
+        reached = started & ~direct & (self._reach[latest] >= times)
+        result[reached] = self.log_id[self._reach_index[latest[reached]]]
+        return result
+
+
+class Project:
+    """A campaign's image folders and PPK logs stored in a SQLite file."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def _connect(self):
+        # A fresh connection per operation keeps the project usable from worker threads and processes
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            conn.close()
+            raise ValueError(f"{self.path} was written by an incompatible version (schema {version}).")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        if version == 0:
+            conn.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+        return conn
+
+    def add_folder(self, folder_path, workers=None, cache=None, leap_seconds=GPS_UTC_LEAP_SECONDS, progress=None, cancelled=None, use_processes=False):
+        """Scan an image folder into the project, replacing its earlier scan; returns the image count."""
+        folder_path = os.path.abspath(folder_path)
+        columns = load_images(folder_path, workers, use_processes, cache=cache, progress=progress, cancelled=cancelled, leap_seconds=leap_seconds)
+        rows = [
+            (image.path,) + tuple(image.lat) + tuple(image.lon) + (image.alt, image.timestamp, image.trigger_time)
+            for image in columns.images
+        ]
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR IGNORE INTO folders (path) VALUES (?)', (folder_path,))
+                folder_id = conn.execute('SELECT id FROM folders WHERE path = ?', (folder_path,)).fetchone()[0]
+                conn.execute('DELETE FROM images WHERE folder_id = ?', (folder_id,))
+                conn.executemany(
+                    'INSERT OR REPLACE INTO images VALUES (?, %d, %s)' % (folder_id, ', '.join('?' * 9)), rows
+                )
+        finally:
+            conn.close()
+        log.info("Project %s: %d images from %s", self.path, len(rows), folder_path)
+        return len(rows)
+
+    def add_ppk(self, filename, use_sidecar=True, progress=None, cancelled=None):
+        """Register a PPK log and its coverage intervals, replacing an earlier registration; returns its epoch count."""
+        filename = os.path.abspath(filename)
+        # Also leaves the binary sidecar behind, so later windowed loads are memory-mapped
+        track = load_ppk(filename, use_sidecar=use_sidecar, progress=progress, cancelled=cancelled)
+        intervals = track_intervals(track.time)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR IGNORE INTO ppk_logs (path) VALUES (?)', (filename,))
+                log_id = conn.execute('SELECT id FROM ppk_logs WHERE path = ?', (filename,)).fetchone()[0]
+                conn.execute('UPDATE ppk_logs SET epochs = ? WHERE id = ?', (len(track), log_id))
+                conn.execute('DELETE FROM ppk_intervals WHERE log_id = ?', (log_id,))
+                conn.executemany('INSERT INTO ppk_intervals VALUES (?, ?, ?)', [(log_id, start, end) for start, end in intervals])
+        finally:
+            conn.close()
+        log.info("Project %s: %d PPK epochs in %d intervals from %s", self.path, len(track), len(intervals), filename)
+        return len(track)
+
+    def remove_folder(self, folder_path):
+        self._remove('folders', 'images', 'folder_id', os.path.abspath(folder_path))
+
+    def remove_ppk(self, filename):
+        self._remove('ppk_logs', 'ppk_intervals', 'log_id', os.path.abspath(filename))
+
+    def _remove(self, table, child_table, key, path):
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(f'SELECT id FROM {table} WHERE path = ?', (path,)).fetchone()
+                if row:
+                    conn.execute(f'DELETE FROM {child_table} WHERE {key} = ?', row)
+                    conn.execute(f'DELETE FROM {table} WHERE id = ?', row)
+        finally:
+            conn.close()
+
+    def folders(self):
+        """Registered folders as [(path, image count)]."""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                'SELECT folders.path, COUNT(images.path) FROM folders LEFT JOIN images ON images.folder_id = folders.id '
+                'GROUP BY folders.id ORDER BY folders.path'
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def ppk_logs(self):
+        """Registered PPK logs as [(path, epochs, start, end)]."""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                'SELECT ppk_logs.path, ppk_logs.epochs, MIN(start_time), MAX(end_time) FROM ppk_logs '
+                'LEFT JOIN ppk_intervals ON ppk_intervals.log_id = ppk_logs.id GROUP BY ppk_logs.id ORDER BY MIN(start_time)'
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def images(self, folder_path):
+        """ImageRecords of a registered folder in time order."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT images.* FROM images JOIN folders ON images.folder_id = folders.id '
+                'WHERE folders.path = ? ORDER BY images.timestamp', (os.path.abspath(folder_path),)
+            )
+            return [
+                ImageRecord(path, (lat_d, lat_m, lat_s), (lon_d, lon_m, lon_s), alt, timestamp, trigger_time)
+                for path, _, lat_d, lat_m, lat_s, lon_d, lon_m, lon_s, alt, timestamp, trigger_time in rows
+            ]
+        finally:
+            conn.close()
+
+    def intervals(self):
+        """PPKIntervals index of every registered log."""
+        conn = self._connect()
+        try:
+            paths = dict(conn.execute('SELECT id, path FROM ppk_logs'))
+            return PPKIntervals(conn.execute('SELECT log_id, start_time, end_time FROM ppk_intervals').fetchall(), paths)
+        finally:
+            conn.close()
+
+    def status(self, time_offset=0.0):
+        """Summary lines: folders with their PPK coverage, then the PPK logs."""
+        intervals = self.intervals()
+        lines = []
+        for path, count in self.folders():
+            covered = int((intervals.lookup(image_epochs(self.images(path), time_offset)) >= 0).sum())
+            lines.append(f"{path}: {count} images, {covered} covered by PPK")
+        for path, epochs, start, end in self.ppk_logs():
+            span = f"{(end - start) / 3600:.1f} h" if start is not None else "empty"
+            lines.append(f"{path}: {epochs} PPK epochs, {span}")
+        return lines
+
+
+def mission_names(folder_paths):
+    """Output names of folders: their base name, prefixed by the parent's where base names repeat."""
+    names = [os.path.basename(os.path.normpath(path)) for path in folder_paths]
+    repeated = {name for name in names if names.count(name) > 1}
+    return [
+        f"{os.path.basename(os.path.dirname(os.path.normpath(path)))}_{name}" if name in repeated else name
+        for path, name in zip(folder_paths, names)
+    ]
+
+
+def process_folder(project_path, folder_path, name, output_dir, options=None):
+    """Export one project folder as a mission named name and return a summary line.
+
+    Works like shiftcore.cli.process_mission (both run
+    shiftcore.pipeline.process_images with a MissionOptions), but the images
+    come from the project store (no EXIF is read) and each image is
+    geotagged with the PPK log whose coverage interval contains its epoch.
+    """
+    options = options or MissionOptions()
+    with measure(f"{name}/mission"):
+        project = Project(project_path)
+        columns = ImageColumns(project.images(folder_path))
+        intervals = project.intervals()
+
+        def tracks(image_sets):
+            log_ids = intervals.lookup(image_epochs(columns.images, options.time_offset))
+            # Logs in the order the images first reach them, so the rows stay roughly chronological
+            _, first = np.unique(log_ids, return_index=True)
+            for log_id in log_ids[np.sort(first)].tolist():
+                if log_id < 0:
+                    continue
+                indices = np.flatnonzero(log_ids == log_id)
+                images = [columns.images[i] for i in indices.tolist()]
+                windows = image_windows([images], options.ppk_margin, options.time_offset) if options.ppk_margin is not None else None
+                with measure(f"{name}/ppk"):
+                    track = load_ppk(intervals.paths[log_id], use_sidecar=options.use_cache, windows=windows)
+                yield indices, track
+
+        return process_images(name, columns, output_dir, tracks, options)
+
+
+def process_project(project_path, output_dir, options=None, jobs=None, log_file=None, progress=None, cancelled=None):
+    """Process every folder of a project in a process pool.
+
+    ``options`` is the MissionOptions of every folder. ``progress(done, total)`` is
+    reported as folders finish, and once ``cancelled()`` is True the pending
+    folders are dropped and Cancelled is raised. A folder that fails is
+    logged and reported in its summary line. Returns (summary lines, number
+    of failed folders).
+    """
+    folders = [path for path, _ in Project(project_path).folders()]
+    os.makedirs(output_dir, exist_ok=True)
+    log_file = log_file or setup_logging()
+    summaries = [None] * len(folders)
+    failures = 0
+    # Missions log to the same file; only the calling process rotates it. The GUI
+    # calls this from a pool thread, and forking a multi-threaded Qt process is unsafe.
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=partial(setup_logging, log_file, rotate=False)) as executor:
+        futures = {
+            executor.submit(process_folder, project_path, folder, name, output_dir, options): i
+            for i, (folder, name) in enumerate(zip(folders, mission_names(folders)))
+        }
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                try:
+                    summaries[i] = future.result()
+                except Exception as e:
+                    failures += 1
+                    log.error("%s: failed: %s", folders[i], e)
+                    summaries[i] = f"{folders[i]}: failed: {e}"
+                if progress:
+                    progress(done, len(folders))
+                check_cancelled(cancelled)
+        except Cancelled:
+            for future in futures:
+                future.cancel()
+            raise
+    return summaries, failures
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='shiftcore.project', description="Manage and batch-process a multi-folder, multi-PPK campaign project.")
+    parser.add_argument('project', help="project file (created if missing)")
+    parser.add_argument('--log-file', help="log file (default: shiftapp.log in the user cache directory)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="register image folders and PPK logs")
+    add.add_argument('folders', nargs='*', help="image folders to scan into the project")
+    add.add_argument('--ppk', action='append', default=[], help="PPK CSV to register (repeatable)")
+    add.add_argument('--exif-workers', type=int, default=None, help="EXIF reader threads")
+    add.add_argument('--exif-processes', action='store_true', help="read EXIF in worker processes instead of threads")
+    add.add_argument('--leap-seconds', type=int, default=GPS_UTC_LEAP_SECONDS, help="GPS-UTC leap seconds removed from DJI MRK trigger times")
+    add.add_argument('--no-cache', action='store_true', help="do not use the EXIF metadata cache or the PPK sidecar")
+
+    remove = commands.add_parser('remove', help="unregister image folders and PPK logs")
+    remove.add_argument('folders', nargs='*', help="image folders to remove")
+    remove.add_argument('--ppk', action='append', default=[], help="PPK CSV to remove (repeatable)")
+
+    status = commands.add_parser('status', help="list folders, PPK logs and PPK coverage")
+    status.add_argument('--time-offset', type=float, default=0.0, help="seconds added to the camera clock to reach the PPK time base")
+
+    process = commands.add_parser('process', help="export every folder in parallel")
+    process.add_argument('-o', '--output-dir', default='.', help="directory for the exported CSVs")
+    process.add_argument('--corrections', help="transforms CSV applied to every folder")
+    process.add_argument('--min-time-diff', type=int, default=20, help="minutes between images that start a new set")
+    process.add_argument('--max-alt-step', type=float, default=None, help="also start a new set where the altitude jumps by more than this many metres")
+    process.add_argument('--max-speed', type=float, default=None, help="also start a new set where the ground speed between images exceeds this many m/s")
+    process.add_argument('-j', '--jobs', type=int, default=None, help="folders processed in parallel (default: CPU count)")
+    process.add_argument('--exif-workers', type=int, default=None, help="EXIF threads per folder")
+    process.add_argument('--ppk-margin', type=float, default=60, help="seconds of PPK kept before and after the images")
+    process.add_argument('--time-offset', type=float, default=0.0, help="seconds added to the camera clock to reach the PPK time base")
+    process.add_argument('--max-gap', type=float, default=None, help="flag images whose bracketing PPK epochs are more than this many seconds apart")
+    process.add_argument('--skip-flagged', action='store_true', help="leave out images with gapped or non-fixed PPK epochs instead of flagging them")
+    process.add_argument('--interpolation', choices=INTERPOLATION_METHODS, default='linear', help="PPK interpolation method")
+    process.add_argument('--lever-arm', type=float, nargs=3, metavar=('FORWARD', 'RIGHT', 'DOWN'), help="antenna-to-camera offset in metres")
+    process.add_argument('--write-exif', metavar='DIR', help="also write the positions into copies of the images under DIR/<folder name>")
+    process.add_argument('--format', action='append', choices=FORMAT_NAMES, help="export format, repeatable (default: csv); parquet and feather need pyarrow")
+    process.add_argument('--xmp', action='store_true', help="with --write-exif, also update the DJI drone-dji XMP position tags")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    log_file = setup_logging(args.log_file, console=True)
+    project = Project(args.project)
+    if args.command == 'add':
+        cache = None if args.no_cache else MetadataCache()
+        for folder in args.folders:
+            project.add_folder(folder, args.exif_workers, cache, args.leap_seconds, use_processes=args.exif_processes)
+        for filename in args.ppk:
+            project.add_ppk(filename, use_sidecar=not args.no_cache)
+    elif args.command == 'remove':
+        for folder in args.folders:
+            project.remove_folder(folder)
+        for filename in args.ppk:
+            project.remove_ppk(filename)
+    elif args.command == 'status':
+        print('\n'.join(project.status(args.time_offset)))
+    else:
+        options = MissionOptions(
+            corrections_file=args.corrections, min_time_diff=args.min_time_diff, max_alt_step=args.max_alt_step,
+            max_speed=args.max_speed, exif_workers=args.exif_workers, ppk_margin=args.ppk_margin,
+            time_offset=args.time_offset, method=args.interpolation, lever_arm=args.lever_arm or (0.0, 0.0, 0.0),
+            max_gap=args.max_gap, skip_flagged=args.skip_flagged, formats=args.format or ['csv'],
+            exif_dir=args.write_exif, xmp=args.xmp,
+        )
+        summaries, failures = process_project(project.path, args.output_dir, options, args.jobs, log_file)
+        print('\n'.join(summaries))
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
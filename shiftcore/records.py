@@ -0,0 +1,25 @@
+"""Compact per-image record shared by every processing stage."""
+
+
+class ImageRecord:
+    """One image's EXIF position and capture time, parsed once at import.
+
+    ``lat`` and ``lon`` are (degrees, minutes, seconds) tuples as stored in
+    EXIF, every component negated south and west of the origin, and ``timestamp`` is DateTimeOriginal plus SubSecTimeOriginal as
+    epoch seconds on the camera clock (see shiftcore.timestamps).
+    ``trigger_time`` is the shutter trigger epoch from a DJI MRK file when one
+    matched the image (see shiftcore.mrk), already on the PPK time base.
+    """
+
+    __slots__ = ('path', 'lat', 'lon', 'alt', 'timestamp', 'trigger_time')
+
+    def __init__(self, path, lat, lon, alt, timestamp, trigger_time=None):
+        self.path = path
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.timestamp = timestamp
+        self.trigger_time = trigger_time
+
+    def __repr__(self):
+        return f"ImageRecord({self.path!r}, {self.lat!r}, {self.lon!r}, {self.alt!r}, {self.timestamp!r}, {self.trigger_time!r})"
@@ -0,0 +1,182 @@
+"""Columnar storage of image sets for segmentation, tables and exports.
+
+Images are parsed once into time-sorted NumPy columns (ImageColumns), so
+splitting them into sets is a single diff-and-threshold pass that can be
+re-run instantly with another gap. Set summaries, statistics and
+correction shifts are kept as arrays too (SetTable), so the GUI table reads
+numbers straight from them (no text round-trip through table cells) and
+the per-image view can show tens of thousands of rows.
+"""
+import numpy as np
+
+from shiftcore.geodesy import small_offsets
+from shiftcore.interpolation import FLAG_OUTSIDE, image_epochs
+
+# Shortest interval used for the ground speed between two images, so that
+# images sharing a timestamp do not divide by zero
+MIN_SPEED_INTERVAL = 0.1
+
+
+def _decimal_degrees(dms):
+    """Decimal degrees of a list of (degrees, minutes, seconds) tuples."""
+    dms = np.array(dms, dtype=np.float64).reshape(len(dms), 3)
+    return dms[:, 0] + dms[:, 1] / 60.0 + dms[:, 2] / 3600.0
+
+
+class ImageColumns:
+    """Time-sorted ImageRecords with their camera time, position and altitude as arrays."""
+
+    __slots__ = ('images', 'time', 'lat', 'lon', 'alt')
+
+    def __init__(self, images):
+        images = list(images)
+        count = len(images)
+        time = np.fromiter((image.timestamp for image in images), dtype=np.float64, count=count)
+        # Only reorder when the images are not already in time order
+        if np.any(time[1:] < time[:-1]):
+            order = np.argsort(time, kind='stable')
+            images = [images[i] for i in order]
+            time = time[order]
+        self.images = images
+        self.time = time
+        self.lat = _decimal_degrees([image.lat for image in images])
+        self.lon = _decimal_degrees([image.lon for image in images])
+        self.alt = np.fromiter((image.alt for image in images), dtype=np.float64, count=count)
+
+    @classmethod
+    def from_sets(cls, image_sets):
+        return cls(image for imageset in image_sets for image in imageset)
+
+    def __len__(self):
+        return len(self.time)
+
+    def split_points(self, min_time_diff, max_alt_step=None, max_speed=None):
+        """Indices of the images that start a new set.
+
+        A set ends where consecutive images are more than min_time_diff
+        minutes apart and, optionally, where the altitude jumps by more than
+        max_alt_step metres or the ground speed between them exceeds
+        max_speed metres per second.
+        """
+        if len(self.time) < 2:
+            return np.empty(0, dtype=np.int64)
+        interval = np.diff(self.time)
+        split = interval > min_time_diff * 60
+        if max_alt_step:
+            split |= np.abs(np.diff(self.alt)) > max_alt_step
+        if max_speed:
+            east, north = small_offsets(np.diff(self.lat), np.diff(self.lon), self.lat[1:])
+            split |= np.hypot(east, north) / np.maximum(interval, MIN_SPEED_INTERVAL) > max_speed
+        return np.flatnonzero(split) + 1
+
+    def segment(self, min_time_diff, max_alt_step=None, max_speed=None):
+        """Split the images into sets (lists of ImageRecords); see split_points."""
+        if not self.images:
+            return []
+        bounds = [0, *self.split_points(min_time_diff, max_alt_step, max_speed).tolist(), len(self.images)]
+        return [self.images[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class SetTable:
+    """Per-set summary, statistics and (lat, lon, alt) shift arrays.
+
+    Duration is in seconds, width/depth are the east-west and north-south
+    extent of the set in metres, coverage is the fraction of a set's images
+    inside the PPK track and flagged the number of those whose PPK epochs
+    are gapped or not fixed (NaN until set_coverage is called).
+    image_flags holds the PPKTrack.quality flags of every image, in column
+    order (None until then).
+    """
+
+    __slots__ = (
+        'image_sets', 'columns', 'first', 'start', 'end', 'count', 'duration', 'width', 'depth', 'mean_alt',
+        'coverage', 'flagged', 'image_flags', 'shifts',
+    )
+
+    def __init__(self, image_sets, columns=None):
+        self.image_sets = image_sets
+        # The columns must hold the sets' images in order, as ImageColumns.segment leaves them
+        self.columns = columns if columns is not None else ImageColumns.from_sets(image_sets)
+        count = len(image_sets)
+        self.count = np.fromiter((len(imageset) for imageset in image_sets), dtype=np.int64, count=count)
+        self.first = np.zeros(count, dtype=np.int64)
+        np.cumsum(self.count[:-1], out=self.first[1:])
+        last = self.first + self.count - 1
+        columns = self.columns
+        self.start = columns.time[self.first]
+        self.end = columns.time[last]
+        self.duration = self.end - self.start
+        if count:
+            lat_min = np.minimum.reduceat(columns.lat, self.first)
+            lat_max = np.maximum.reduceat(columns.lat, self.first)
+            lon_min = np.minimum.reduceat(columns.lon, self.first)
+            lon_max = np.maximum.reduceat(columns.lon, self.first)
+            self.width, self.depth = small_offsets(lat_max - lat_min, lon_max - lon_min, (lat_min + lat_max) / 2)
+            self.mean_alt = np.add.reduceat(columns.alt, self.first) / self.count
+        else:
+            self.width = self.depth = self.mean_alt = np.empty(0)
+        self.coverage = np.full(count, np.nan)
+        self.flagged = np.full(count, np.nan)
+        self.image_flags = None
+        self.shifts = np.zeros((count, 3), dtype=np.float64)
+
+    def __len__(self):
+        return len(self.count)
+
+    def set_coverage(self, track, time_offset=0.0, max_gap=None):
+        """Store every image's PPK quality flags and each set's PPK coverage and flagged count."""
+        if track is None or not len(self):
+            self.coverage[:] = np.nan
+            self.flagged[:] = np.nan
+            self.image_flags = None
+            return
+        self.set_flags(track.quality(image_epochs(self.columns.images, time_offset), max_gap)[0])
+
+    def set_flags(self, flags):
+        """Store PPKTrack.quality flags of every image, in column order, and each set's coverage and flagged count."""
+        inside = (flags & FLAG_OUTSIDE) == 0
+        self.image_flags = flags
+        self.coverage = np.add.reduceat(inside.astype(np.float64), self.first) / self.count
+        self.flagged = np.add.reduceat((inside & (flags != 0)).astype(np.float64), self.first)
+
+    def set_shifts(self, shifts):
+        """Store match_corrections output; sets without a correction (None) keep their shift."""
+        for i, shift in enumerate(shifts):
+            if shift:
+                self.shifts[i] = shift
+
+    def shift_tuples(self):
+        """The shifts as (lat, lon, alt) tuples, the form write_sets and set_positions take."""
+        return [tuple(row) for row in self.shifts.tolist()]
+
+
+class ImageTable:
+    """Per-image columns of a SetTable: set index, name, time and EXIF position.
+
+    PPK flags are read from the SetTable, so they follow set_coverage.
+    """
+
+    __slots__ = ('sets', 'set_index', 'names', 'timestamp', 'lat', 'lon', 'alt')
+
+    def __init__(self, sets):
+        self.sets = sets
+        columns = sets.columns
+        self.set_index = np.repeat(np.arange(len(sets), dtype=np.int64), sets.count)
+        self.names = [image.path for image in columns.images]
+        self.timestamp = columns.time
+        self.lat = columns.lat
+        self.lon = columns.lon
+        self.alt = columns.alt
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def flags(self, row):
+        """PPKTrack.quality flags of an image, None before PPK is loaded."""
+        flags = self.sets.image_flags
+        return None if flags is None else int(flags[row])
+
+    def corrected(self, row):
+        """(lat, lon, alt) of an image with its set's current shift applied."""
+        shift = self.sets.shifts[self.set_index[row]]
+        return self.lat[row] + shift[0], self.lon[row] + shift[1], self.alt[row] + shift[2]
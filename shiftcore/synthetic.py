@@ -0,0 +1,220 @@
+"""Synthetic DJI missions for benchmarking.
+
+Generates, entirely locally, a session of flights: tiny valid JPEGs carrying
+DJI-style EXIF (DateTimeOriginal, SubSecTimeOriginal, GPS) and drone-dji XMP
+attitude tags, a ``*_Timestamp.MRK`` file per flight, a continuous PPK CSV
+at the requested rate and a transforms CSV with one correction per flight.
+The aircraft flies a circle around a home point, so positions, timestamps
+and attitudes are all consistent with each other.
+"""
+import calendar
+import os
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+from shiftcore.geodesy import enu_to_geodetic
+from shiftcore.ppk import HEIGHT_COLUMN, LAT_COLUMN, LON_COLUMN, TIME_COLUMN
+from shiftcore.timestamps import GPS_EPOCH, GPS_UTC_LEAP_SECONDS, SECONDS_PER_WEEK
+
+HOME = (45.2, 7.5, 400.0)
+RADIUS = 200.0  # metres
+SPEED = 10.0  # metres per second
+FLIGHT_HEIGHT = 100.0  # metres above home
+FLIGHT_FRACTION = 0.4  # Part of each flight's slot in the air; the rest is the gap between sets
+
+# An 8x8 grey baseline JPEG without APP segments; metadata is inserted after SOI
+_JPEG_BODY = bytes.fromhex(
+    'ffdb004300100b0c0e0c0a100e0d0e1211101318281a181616183123251d283a333d3c3933383740485c4e404457'
+    '453738506d51575f626768673e4d71797064785c656763ffc0000b080008000801011100ffc4001f000001050101'
+    '0101010100000000000000000102030405060708090a0bffc400b5100002010303020403050504040000017d0102'
+    '0300041105122131410613516107227114328191a1082342b1c11552d1f02433627282090a161718191a25262728'
+    '292a3435363738393a434445464748494a535455565758595a636465666768696a737475767778797a8384858687'
+    '88898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8'
+    'd9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9faffda0008010100003f002bffd9'
+)
+
+_ASCII, _BYTE, _LONG, _RATIONAL = 2, 1, 4, 5
+
+_XMP_TEMPLATE = (
+    '<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>'
+    '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+    '<rdf:Description rdf:about="DJI Meta Data" xmlns:drone-dji="http://www.dji.com/drone-dji/1.0/"'
+    ' drone-dji:GpsLatitude="{lat:.9f}" drone-dji:GpsLongitude="{lon:.9f}"'
+    ' drone-dji:AbsoluteAltitude="{alt:+.3f}" drone-dji:RelativeAltitude="{rel:+.3f}"'
+    ' drone-dji:GimbalRollDegree="+0.00" drone-dji:GimbalYawDegree="{yaw:+.2f}" drone-dji:GimbalPitchDegree="-90.00"'
+    ' drone-dji:FlightRollDegree="{roll:+.2f}" drone-dji:FlightYawDegree="{yaw:+.2f}" drone-dji:FlightPitchDegree="{pitch:+.2f}"/>'
+    '</rdf:RDF></x:xmpmeta>{padding}<?xpacket end="w"?>'
+)
+
+
+def _ascii(text):
+    return text.encode('ascii') + b'\x00'
+
+
+def _rationals(*pairs):
+    return b''.join(struct.pack('<LL', numerator, denominator) for numerator, denominator in pairs)
+
+
+def _dms(value):
+    """Degree/minute/second rationals of a positive decimal angle."""
+    # Round once in 1/10000 arcseconds so rounded seconds carry into the minutes
+    degrees, rest = divmod(round(value * 3600 * 10000), 3600 * 10000)
+    minutes, seconds = divmod(rest, 60 * 10000)
+    return _rationals((degrees, 1), (minutes, 1), (seconds, 10000))
+
+
+def _pack_ifd(entries, start):
+    """Little-endian IFD at offset start from (tag, type, count, payload) entries, values following it."""
+    data_offset = start + 2 + 12 * len(entries) + 4
+    head = struct.pack('<H', len(entries))
+    data = b''
+    for tag, field_type, count, payload in sorted(entries):
+        if len(payload) <= 4:
+            head += struct.pack('<HHL', tag, field_type, count) + payload.ljust(4, b'\x00')
+        else:
+            if len(data) % 2:
+                data += b'\x00'
+            head += struct.pack('<HHLL', tag, field_type, count, data_offset + len(data))
+            data += payload
+    return head + struct.pack('<L', 0) + data
+
+
+def _tiff(timestamp, lat, lon, alt):
+    """EXIF TIFF block with DJI make/model, capture time and GPS position."""
+    when = datetime.fromtimestamp(timestamp, timezone.utc)
+    exif_entries = [
+        (0x9003, _ASCII, 20, _ascii(when.strftime('%Y:%m:%d %H:%M:%S'))),
+        (0x9291, _ASCII, 4, _ascii(f'{when.microsecond // 1000:03d}')),
+    ]
+    gps_entries = [
+        (0x0000, _BYTE, 4, bytes((2, 3, 0, 0))),
+        (0x0001, _ASCII, 2, _ascii('N' if lat >= 0 else 'S')),
+        (0x0002, _RATIONAL, 3, _dms(abs(lat))),
+        (0x0003, _ASCII, 2, _ascii('E' if lon >= 0 else 'W')),
+        (0x0004, _RATIONAL, 3, _dms(abs(lon))),
+        (0x0005, _BYTE, 1, b'\x00'),
+        (0x0006, _RATIONAL, 1, _rationals((round(alt * 1000), 1000))),
+    ]
+
+    def ifd0(exif_offset, gps_offset):
+        return _pack_ifd([
+            (0x010F, _ASCII, 4, _ascii('DJI')),
+            (0x0110, _ASCII, 8, _ascii('FC6310R')),
+            (0x8769, _LONG, 1, struct.pack('<L', exif_offset)),
+            (0x8825, _LONG, 1, struct.pack('<L', gps_offset)),
+        ], 8)
+
+    # Pointer values do not change the IFD0 size, so lay it out once to find the offsets
+    exif_offset = 8 + len(ifd0(0, 0))
+    exif_ifd = _pack_ifd(exif_entries, exif_offset)
+    gps_offset = exif_offset + len(exif_ifd)
+    return b'II*\x00' + struct.pack('<L', 8) + ifd0(exif_offset, gps_offset) + exif_ifd + _pack_ifd(gps_entries, gps_offset)
+
+
+def _segment(marker, payload):
+    return struct.pack('>BBH', 0xFF, marker, len(payload) + 2) + payload
+
+
+def make_jpeg(timestamp, lat, lon, alt, yaw=0.0, pitch=0.0, roll=0.0, xmp_padding=1024):
+    """Bytes of a tiny JPEG tagged like a DJI photo."""
+    xmp = _XMP_TEMPLATE.format(
+        lat=lat, lon=lon, alt=alt, rel=alt - HOME[2], yaw=yaw, pitch=pitch, roll=roll, padding=' ' * xmp_padding
+    )
+    return (
+        b'\xff\xd8'
+        + _segment(0xE1, b'Exif\x00\x00' + _tiff(timestamp, lat, lon, alt))
+        + _segment(0xE1, b'http://ns.adobe.com/xap/1.0/\x00' + xmp.encode('utf-8'))
+        + _JPEG_BODY
+    )
+
+
+def trajectory(times, flight_start):
+    """Geodetic (lat, lon, height) and yaw degrees of the aircraft circling home."""
+    angle = SPEED / RADIUS * (times - flight_start)
+    east = RADIUS * np.cos(angle)
+    north = RADIUS * np.sin(angle)
+    up = np.full_like(times, FLIGHT_HEIGHT)
+    lat, lon, height = enu_to_geodetic(east, north, up, HOME)
+    # Counter-clockwise flight: heading is the tangent, clockwise from north
+    yaw = (np.degrees(np.arctan2(-np.sin(angle), np.cos(angle))) + 360) % 360
+    return lat, lon, height, yaw
+
+
+def make_mission(out_dir, images=1000, sets=4, ppk_rate=5.0, session_length=4 * 3600.0,
+                 start=datetime(2024, 5, 14, 8, 0, tzinfo=timezone.utc), seed=0):
+    """Write a synthetic mission below out_dir and describe it.
+
+    ``images`` are spread evenly over ``sets`` flights within a PPK session of
+    ``session_length`` seconds logged at ``ppk_rate`` Hz. Each flight spends
+    FLIGHT_FRACTION of its slot in the air, so sets are separated by the rest.
+    Returns a dict with the 'images' folder, 'ppk' and 'corrections' CSV
+    paths and the 'set_gap' between flights in seconds.
+    """
+    rng = np.random.default_rng(seed)
+    image_dir = os.path.join(out_dir, 'images')
+    os.makedirs(image_dir, exist_ok=True)
+    session_start = calendar.timegm(start.utctimetuple())
+    slot = session_length / sets
+    flight_length = slot * FLIGHT_FRACTION
+
+    corrections = []
+    per_set = np.diff(np.linspace(0, images, sets + 1).round().astype(int))
+    for number, count in enumerate(per_set):
+        flight_start = session_start + number * slot + 60.0
+        flight_dir = os.path.join(image_dir, f'DJI_{start:%Y%m%d}{number:02d}00_{number + 1:03d}_Mission')
+        os.makedirs(flight_dir, exist_ok=True)
+        # Trigger times with millisecond jitter, as the camera reports them
+        triggers = flight_start + np.linspace(0, flight_length, max(count, 1), endpoint=False)[:count]
+        triggers = np.round(triggers + rng.uniform(0, 0.5, count), 3)
+        lat, lon, height, yaw = trajectory(triggers, flight_start)
+        # The camera's own GPS is metres off the PPK solution
+        noise = rng.normal(0, 1.5e-5, (count, 2))
+        for index in range(count):
+            name = os.path.join(flight_dir, f'DJI_{start:%Y%m%d}{number:02d}00_{index + 1:04d}_V.JPG')
+            with open(name, 'wb') as file:
+                file.write(make_jpeg(
+                    triggers[index], lat[index] + noise[index, 0], lon[index] + noise[index, 1], height[index] + rng.normal(0, 2),
+                    yaw[index], rng.normal(0, 3), rng.normal(0, 3),
+                ))
+
+        gps = triggers + GPS_UTC_LEAP_SECONDS - GPS_EPOCH
+        week, seconds = np.divmod(gps, SECONDS_PER_WEEK)
+        with open(os.path.join(flight_dir, f'DJI_{start:%Y%m%d}{number:02d}00_{number + 1:03d}_Timestamp.MRK'), 'w') as file:
+            for index in range(count):
+                file.write(
+                    f"{index + 1}\t{seconds[index]:.6f}\t[{int(week[index])}]\t     0,N\t     0,E\t     0,V\t"
+                    f"{lat[index]:.8f},Lat\t{lon[index]:.8f},Lon\t{height[index]:.3f},Ellh\t0.010000, 0.010000, 0.020000\t50,Q\n"
+                )
+
+        corrected = datetime.fromtimestamp(flight_start - 60.0, timezone.utc)
+        corrections.append((f'P{number + 1}', corrected.strftime('%m/%d/%Y %H:%M'), *rng.normal(0, 1e-5, 2), rng.normal(0, 0.2)))
+
+    ppk_path = os.path.join(out_dir, 'ppk.csv')
+    epochs = session_start + np.arange(0, session_length, 1.0 / ppk_rate)
+    lat = np.full_like(epochs, HOME[0])
+    lon = np.full_like(epochs, HOME[1])
+    height = np.full_like(epochs, HOME[2])
+    for number in range(sets):
+        flight_start = session_start + number * slot + 60.0
+        airborne = (epochs >= flight_start) & (epochs < flight_start + flight_length + 1)
+        lat[airborne], lon[airborne], height[airborne], _ = trajectory(epochs[airborne], flight_start)
+    with open(ppk_path, 'w', newline='') as file:
+        file.write(f'{TIME_COLUMN},{LAT_COLUMN},{LON_COLUMN},{HEIGHT_COLUMN}\n')
+        for when, row_lat, row_lon, row_height in zip(epochs.tolist(), lat.tolist(), lon.tolist(), height.tolist()):
+            stamp = datetime.fromtimestamp(when, timezone.utc)
+            file.write(f'{stamp:%m/%d/%Y %H:%M:%S}.{stamp.microsecond // 1000:03d},{row_lat:.9f},{row_lon:.9f},{row_height:.4f}\n')
+
+    corrections_path = os.path.join(out_dir, 'transforms.csv')
+    with open(corrections_path, 'w', newline='') as file:
+        file.write('Point Id,Date/Time,deltaLat,deltaLong,deltah\n')
+        for point_id, when, delta_lat, delta_lon, delta_h in corrections:
+            file.write(f'{point_id},{when},{delta_lat:.9f},{delta_lon:.9f},{delta_h:.4f}\n')
+
+    return {
+        'images': image_dir,
+        'ppk': ppk_path,
+        'corrections': corrections_path,
+        'set_gap': slot - flight_length,
+    }
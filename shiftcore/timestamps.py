@@ -0,0 +1,59 @@
+"""Timestamp parsing shared by every stage.
+
+All times are handled as float epoch seconds. Naive date/time strings are
+read as if they were UTC, so differences between two times are exact; the
+offset between the camera clock and the PPK time base is a separate number
+(``time_offset``) added where image times are compared with PPK times.
+"""
+import calendar
+from datetime import datetime, timezone
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _date_seconds(date_str, fmt):
+    """Seconds since the Unix epoch at midnight of the given date."""
+    return calendar.timegm(datetime.strptime(date_str, fmt).timetuple())
+
+
+def _time_seconds(time_str):
+    """Seconds since midnight for an 'HH:MM:SS[.fff]' string."""
+    hours, minutes, seconds = time_str.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def image_epoch(date_str, time_str, subsec=None):
+    """Epoch seconds for an EXIF 'YYYY:mm:dd' date, 'HH:MM:SS' time and optional SubSecTime digits."""
+    seconds = _date_seconds(date_str.replace('-', ':'), '%Y:%m:%d') + _time_seconds(time_str)
+    if subsec and subsec.strip().isdigit():
+        seconds += float('0.' + subsec.strip())
+    return seconds
+
+
+def ppk_epoch(date_str, time_str):
+    """Epoch seconds for a PPK 'mm/dd/YYYY' date and 'HH:MM:SS.fff' time."""
+    date_str = date_str.replace('-', '/').replace(':', '/')
+    return _date_seconds(date_str, '%m/%d/%Y') + _time_seconds(time_str)
+
+
+def correction_epoch(datetime_str):
+    """Epoch seconds for a transforms 'mm/dd/YYYY HH:MM' timestamp."""
+    return calendar.timegm(datetime.strptime(datetime_str, '%m/%d/%Y %H:%M').timetuple())
+
+
+def format_timestamp(timestamp):
+    """'YYYY-mm-dd HH:MM:SS' for epoch seconds."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+GPS_EPOCH = calendar.timegm((1980, 1, 6, 0, 0, 0))
+SECONDS_PER_WEEK = 604800
+GPS_UTC_LEAP_SECONDS = 18  # GPS time runs ahead of UTC by this much since 2017
+
+
+def gps_epoch(week, seconds_of_week, leap_seconds=GPS_UTC_LEAP_SECONDS):
+    """Epoch seconds (UTC) for GPS week and seconds-of-week; works element-wise on arrays.
+
+    Pass leap_seconds=0 to keep the result on the GPS time scale.
+    """
+    return GPS_EPOCH + week * SECONDS_PER_WEEK + seconds_of_week - leap_seconds
@@ -0,0 +1,75 @@
+import struct
+
+import numpy as np
+import pytest
+
+from shiftcore.exif import read_attitudes, read_exif_segment, read_image_record, scan_images
+from shiftcore.exif_writer import write_image_geotag
+from shiftcore.pipeline import apply_lever_arm, dms_to_decimal
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def _jpeg(path):
+    exif = Image.Exif()
+    exif[0x8769] = {0x9003: '2024:05:14 08:00:00'}
+    Image.new('RGB', (16, 16), (90, 120, 150)).save(path, exif=exif)
+    return str(path)
+
+
+@pytest.mark.parametrize('lat, lon, alt', [
+    (45.203439333, 7.502797778, 350.5),
+    (-33.856784, -70.651234, 812.25),
+    (31.559, 35.473, -415.125),
+])
+def test_geotag_round_trip(tmp_path, lat, lon, alt):
+    path = _jpeg(tmp_path / 'image.jpg')
+    write_image_geotag(path, path, lat, lon, alt)
+
+    image = read_image_record(path)
+    assert dms_to_decimal(*image.lat) == pytest.approx(lat, abs=1e-9)
+    assert dms_to_decimal(*image.lon) == pytest.approx(lon, abs=1e-9)
+    assert image.alt == pytest.approx(alt, abs=1e-3)
+
+
+def test_truncated_fill_bytes(tmp_path):
+    path = tmp_path / 'truncated.jpg'
+    path.write_bytes(b'\xff\xd8\xff\xff\xff')
+    with pytest.raises(ValueError):
+        read_exif_segment(str(path))
+    assert read_attitudes([str(path)]).shape == (1, 3)
+
+
+def test_scan_with_processes(tmp_path):
+    for i in range(3):
+        path = _jpeg(tmp_path / f'{i}.jpg')
+        write_image_geotag(path, path, 45 + i, 7, 300)
+    (tmp_path / 'broken.jpg').write_bytes(b'\xff\xd8\xff\xff')
+
+    threads = sorted((image.path, image.lat) for image in scan_images(str(tmp_path)))
+    processes = sorted((image.path, image.lat) for image in scan_images(str(tmp_path), workers=2, use_processes=True))
+    assert len(threads) == 3 and processes == threads
+
+
+def _with_xmp(path, attributes):
+    payload = b'http://ns.adobe.com/xap/1.0/\x00<rdf:Description ' + attributes.encode('ascii') + b'/>'
+    data = open(path, 'rb').read()
+    with open(path, 'wb') as file:
+        file.write(data[:2] + b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload + data[2:])
+    return path
+
+
+def test_lever_arm_ignores_gimbal_pitch(tmp_path):
+    # A nadir camera without airframe tags: only the gimbal yaw (east) may rotate the arm
+    gimbal = _with_xmp(_jpeg(tmp_path / 'gimbal.jpg'), 'drone-dji:GimbalYawDegree="+90.0" drone-dji:GimbalPitchDegree="-90.0" drone-dji:GimbalRollDegree="+0.0"')
+    flight = _with_xmp(_jpeg(tmp_path / 'flight.jpg'), 'drone-dji:FlightYawDegree="+90.0" drone-dji:FlightPitchDegree="+0.0" drone-dji:FlightRollDegree="+0.0" drone-dji:GimbalPitchDegree="-90.0"')
+    untagged = _jpeg(tmp_path / 'untagged.jpg')
+    lat, lon, alt = np.full(3, 45.0), np.full(3, 7.0), np.full(3, 300.0)
+
+    new_lat, new_lon, new_alt, corrected = apply_lever_arm([gimbal, flight, untagged], lat, lon, alt, (1.0, 0.0, 0.0))
+
+    assert corrected == 2
+    np.testing.assert_allclose(new_alt, 300.0, atol=1e-6)
+    np.testing.assert_allclose(new_lat, 45.0, atol=1e-9)
+    assert new_lon[0] == pytest.approx(new_lon[1]) and new_lon[0] > 7.0
+    assert new_lon[2] == 7.0
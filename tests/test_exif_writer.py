@@ -0,0 +1,143 @@
+import os
+import struct
+
+import pytest
+
+from shiftcore.exif_writer import _read_header, write_image_geotag
+
+Image = pytest.importorskip('PIL.Image')
+
+LAT, LON, ALT = 45.203439333, 7.502797778, 350.5
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+
+
+def _segment(marker, payload):
+    return b'\xff' + bytes([marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _xmp(padding):
+    return XMP_HEADER + (
+        b'<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>'
+        b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        b'<rdf:Description xmlns:drone-dji="http://www.dji.com/drone-dji/1.0/" '
+        b'drone-dji:GpsLatitude="+45.000000000" drone-dji:GpsLongtitude="+7.000000000" drone-dji:AbsoluteAltitude="+300.00"/>'
+        b'</rdf:RDF></x:xmpmeta>' + b' ' * padding + b'<?xpacket end="w"?>'
+    )
+
+
+def _jpeg(path, gps=False, extra=()):
+    """A small JPEG with DateTimeOriginal, optionally a GPS IFD, and extra segments after its EXIF segment."""
+    exif = Image.Exif()
+    exif[0x010F] = 'DJI'
+    exif[0x8769] = {0x9003: '2024:05:14 08:00:00'}
+    if gps:
+        exif[0x8825] = {0: b'\x02\x03\x00\x00', 1: 'N', 2: (45.0, 12.0, 13.5), 3: 'E', 4: (7.0, 30.0, 10.0), 5: b'\x00', 6: 300.0}
+    Image.new('RGB', (32, 24), (90, 120, 150)).save(path, exif=exif, quality=90)
+    data = open(path, 'rb').read()
+    segments, sos_offset = _read_header(path)
+    exif_end = next(offset + len(payload) + 4 for marker, offset, payload in segments if marker == 0xE1)
+    with open(path, 'wb') as file:
+        file.write(data[:exif_end] + b''.join(extra) + data[exif_end:])
+    return str(path)
+
+
+def _scan_data(path):
+    segments, sos_offset = _read_header(path)
+    return open(path, 'rb').read()[sos_offset:]
+
+
+def _gps(path):
+    with Image.open(path) as image:
+        gps = image.getexif().get_ifd(0x8825)
+    return gps
+
+
+def _decimal(dms):
+    degrees, minutes, seconds = (float(value) for value in dms)
+    return degrees + minutes / 60 + seconds / 3600
+
+
+def _assert_position(path, lat=LAT, lon=LON, alt=ALT):
+    gps = _gps(path)
+    assert gps[1] == ('N' if lat >= 0 else 'S') and gps[3] == ('E' if lon >= 0 else 'W')
+    assert _decimal(gps[2]) == pytest.approx(abs(lat), abs=1e-9)
+    assert _decimal(gps[4]) == pytest.approx(abs(lon), abs=1e-9)
+    assert float(gps[6]) == pytest.approx(abs(alt), abs=1e-3)
+
+
+def test_gps_ifd_appended(tmp_path):
+    path = _jpeg(tmp_path / 'plain.jpg')
+    assert not _gps(path)
+
+    write_image_geotag(path, path, -LAT, -LON, -ALT)
+
+    _assert_position(path, -LAT, -LON, -ALT)
+    gps = _gps(path)
+    assert gps[0] == b'\x02\x03\x00\x00' and gps[5] == b'\x01'
+    with Image.open(path) as image:
+        exif = image.getexif()
+        assert exif[0x010F] == 'DJI'
+        assert exif.get_ifd(0x8769)[0x9003] == '2024:05:14 08:00:00'
+
+
+def test_gps_ifd_patched_in_place(tmp_path):
+    src = _jpeg(tmp_path / 'gps.jpg', gps=True)
+    dst = str(tmp_path / 'out.jpg')
+    original = open(src, 'rb').read()
+
+    write_image_geotag(src, dst, LAT, LON, ALT)
+
+    patched = open(dst, 'rb').read()
+    assert len(patched) == len(original)
+    # Only bytes inside the EXIF segment differ
+    exif_offset, exif_payload = next((offset, payload) for marker, offset, payload in _read_header(src)[0] if marker == 0xE1)
+    changed = [i for i, (a, b) in enumerate(zip(original, patched)) if a != b]
+    assert changed and exif_offset < changed[0] and changed[-1] < exif_offset + 4 + len(exif_payload)
+    assert open(src, 'rb').read() == original
+    _assert_position(dst)
+
+
+@pytest.mark.parametrize('padding', [64, 0])
+def test_xmp_patched(tmp_path, padding):
+    path = _jpeg(tmp_path / 'xmp.jpg', gps=True, extra=[_segment(0xE1, _xmp(padding))])
+    size = os.path.getsize(path)
+
+    write_image_geotag(path, path, LAT, LON, ALT, xmp=True)
+
+    # With padding the packet keeps its size; without, the segment grows
+    assert (os.path.getsize(path) == size) == bool(padding)
+    with Image.open(path) as image:
+        packet = image.info['xmp']
+    assert b'drone-dji:GpsLatitude="+45.203439333"' in packet
+    assert b'drone-dji:GpsLongtitude="+7.502797778"' in packet
+    assert b'drone-dji:AbsoluteAltitude="+350.500"' in packet
+    assert packet.endswith(b'<?xpacket end="w"?>')
+    _assert_position(path)
+
+
+@pytest.mark.filterwarnings('ignore:Image appears to be a malformed MPO file')
+def test_mpf_guard_refuses_resize(tmp_path):
+    mpf = _segment(0xE2, b'MPF\x00MM\x00*\x00\x00\x00\x08\x00\x00\x00\x00\x00\x00')
+    path = _jpeg(tmp_path / 'mpf.jpg', gps=True, extra=[mpf, _segment(0xE1, _xmp(0))])
+    original = open(path, 'rb').read()
+
+    with pytest.raises(ValueError, match='MPF'):
+        write_image_geotag(path, path, LAT, LON, ALT, xmp=True)
+
+    assert open(path, 'rb').read() == original
+    assert os.listdir(tmp_path) == ['mpf.jpg']
+    assert _decimal(_gps(path)[2]) == pytest.approx(45 + 12 / 60 + 13.5 / 3600)
+
+
+@pytest.mark.parametrize('gps', [False, True])
+def test_image_data_unchanged(tmp_path, gps):
+    src = _jpeg(tmp_path / 'src.jpg', gps=gps, extra=[_segment(0xE1, _xmp(0))])
+    dst = str(tmp_path / 'dst.jpg')
+
+    write_image_geotag(src, dst, LAT, LON, ALT, xmp=True)
+
+    assert _scan_data(dst) == _scan_data(src)
+    with Image.open(src) as before, Image.open(dst) as after:
+        assert after.size == before.size
+        assert after.tobytes() == before.tobytes()
+    _assert_position(dst)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from shiftcore.interpolation import PPKTrack
+
+TIME = [100.0, 110.0, 120.0, 140.0]
+LAT = [45.0, 45.001, 45.003, 45.002]
+LON = [7.5, 7.502, 7.502, 7.506]
+HEIGHT = [400.0, 410.0, 405.0, 425.0]
+
+
+def _linear(t):
+    """Hand-computed linear interpolation between the bracketing epochs."""
+    i = max(i for i in range(len(TIME)) if TIME[i] <= t)
+    if TIME[i] == t:
+        return LAT[i], LON[i], HEIGHT[i]
+    ratio = (t - TIME[i]) / (TIME[i + 1] - TIME[i])
+    return tuple(column[i] + ratio * (column[i + 1] - column[i]) for column in (LAT, LON, HEIGHT))
+
+
+def test_linear_interpolation():
+    track = PPKTrack(TIME, LAT, LON, HEIGHT)
+    times = [100.0, 104.0, 110.0, 117.5, 135.0, 140.0]
+
+    lat, lon, height, inside = track.interpolate(times)
+
+    assert inside.all()
+    expected = np.array([_linear(t) for t in times])
+    np.testing.assert_allclose(lat, expected[:, 0], rtol=0, atol=1e-12)
+    np.testing.assert_allclose(lon, expected[:, 1], rtol=0, atol=1e-12)
+    np.testing.assert_allclose(height, expected[:, 2], rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('method', ['linear', 'hermite'])
+def test_exact_epochs_and_out_of_range(method):
+    track = PPKTrack(TIME, LAT, LON, HEIGHT)
+
+    lat, lon, height, inside = track.interpolate([99.9, 110.0, 120.0, 140.1], method)
+
+    assert inside.tolist() == [False, True, True, False]
+    assert np.isnan([lat[0], lon[0], height[0], lat[3], lon[3], height[3]]).all()
+    np.testing.assert_allclose(lat[1:3], LAT[1:3], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(lon[1:3], LON[1:3], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(height[1:3], HEIGHT[1:3], rtol=0, atol=1e-4)
+
+
+def test_unsorted_and_empty_tracks():
+    order = [2, 0, 3, 1]
+    track = PPKTrack(*([column[i] for i in order] for column in (TIME, LAT, LON, HEIGHT)))
+    lat, lon, height, inside = track.interpolate([104.0])
+    assert inside.all() and lat[0] == pytest.approx(_linear(104.0)[0], abs=1e-12)
+
+    lat, lon, height, inside = PPKTrack([], [], [], []).interpolate([104.0])
+    assert not inside.any() and np.isnan(lat).all()
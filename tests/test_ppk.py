@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from shiftcore import ppk
+from shiftcore.ppk import load_ppk
+from shiftcore.timestamps import ppk_epoch
+
+HEADER = 'Date/Time,WGS84 Latitude,WGS84 Longitude,WGS84 Ellip. Height\n'
+
+
+def _day_rows(day, count):
+    rows = []
+    for i in range(count):
+        minutes, seconds = divmod(i, 60)
+        rows.append(f"05/{day:02d}/2024 08:{minutes:02d}:{seconds:02d}.000,{45 + i * 1e-6:.9f},{7.5 + i * 1e-6:.9f},{400 + i * 0.01:.4f}\n")
+    return rows
+
+
+@pytest.mark.parametrize('count', [30, 3000])
+def test_windowed_load_of_out_of_order_log(tmp_path, count):
+    # Day 2 written before day 1, in logs below and above the bisection resolution
+    path = tmp_path / 'ppk.csv'
+    path.write_text(HEADER + ''.join(_day_rows(15, count) + _day_rows(14, count)))
+    start = ppk_epoch('05/14/2024', '08:00:10.000')
+    window = (start, start + count // 2)
+
+    full = load_ppk(str(path), use_sidecar=False)
+    windowed = load_ppk(str(path), use_sidecar=False, windows=[window])
+
+    expected = full.time[(full.time >= window[0]) & (full.time <= window[1])]
+    assert len(expected) > 0
+    np.testing.assert_array_equal(windowed.time, expected)
+
+
+def test_windowed_load_of_sorted_log(tmp_path):
+    path = tmp_path / 'ppk.csv'
+    path.write_text(HEADER + ''.join(_day_rows(14, 3000) + _day_rows(15, 3000)))
+    start = ppk_epoch('05/15/2024', '08:10:00.000')
+    window = (start, start + 60)
+
+    full = load_ppk(str(path), use_sidecar=False)
+    windowed = load_ppk(str(path), use_sidecar=False, windows=[window])
+
+    np.testing.assert_array_equal(windowed.time, full.time[(full.time >= window[0]) & (full.time <= window[1])])
+    np.testing.assert_array_equal(windowed.lat, full.lat[(full.time >= window[0]) & (full.time <= window[1])])
+
+
+def test_windowed_load_writes_sidecar(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'cache'))
+    path = tmp_path / 'ppk.csv'
+    path.write_text(HEADER + ''.join(_day_rows(14, 3000)))
+    start = ppk_epoch('05/14/2024', '08:10:00.000')
+    window = (start, start + 60)
+
+    expected = load_ppk(str(path), use_sidecar=False, windows=[window])
+    first = load_ppk(str(path), windows=[window])
+    assert list((tmp_path / 'cache').rglob('*.npy'))
+    # The CSV is no longer parsed once the sidecar exists
+    monkeypatch.setattr(ppk, '_read_columns', None)
+    second = load_ppk(str(path), windows=[window])
+
+    for track in (first, second):
+        np.testing.assert_array_equal(track.time, expected.time)
+        np.testing.assert_array_equal(track.height, expected.height)
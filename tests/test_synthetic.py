@@ -0,0 +1,17 @@
+import struct
+
+import pytest
+
+from shiftcore.synthetic import _dms
+
+
+@pytest.mark.parametrize('value, expected', [
+    (45.5, ((45, 1), (30, 1), (0, 10000))),
+    (7.25 + 1.2345 / 3600, ((7, 1), (15, 1), (12345, 10000))),
+    # Seconds that round up to 60 carry into the minutes and degrees
+    (45 + 59 / 60 + 59.99999 / 3600, ((46, 1), (0, 1), (0, 10000))),
+    (7 + 12 / 60 + 59.99996 / 3600, ((7, 1), (13, 1), (0, 10000))),
+])
+def test_dms_carries_rounded_seconds(value, expected):
+    values = struct.unpack('<6L', _dms(value))
+    assert tuple(zip(values[::2], values[1::2])) == expected